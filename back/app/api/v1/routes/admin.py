@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import List, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
@@ -16,7 +16,6 @@ from app.models import (
     PaymentAccount,
     PaymentTransaction,
     SubscriptionPlan,
-    AppSetting,
     OTPVerification,
     Review,
 )
@@ -24,7 +23,17 @@ from app.core.security import get_current_user, get_password_hash
 from app.core.responses import create_response
 from app.services.dictionary_service import dictionary_service
 from app.services.admin_service import admin_service
+from app.services.application_matching import match_car_to_applications, queue_renter_notifications
+from app.services.car_events import mark_car_changed, mark_cars_changed, mark_dictionaries_renamed
+from app.services.car_facets_service import facets_cache
+from app.services.car_listing_service import listing_ids_for_author
+from app.services.car_search_service import update_search_document
+from app.services.dictionary_cache import DictionaryEntry, DictionarySnapshot, dictionary_cache
 from app.services.email_service import email_service
+from app.services.entitlements import ALL_OWNERS, mark_entitlements_changed
+from app.services.image_loader import load_images
+from app.services.response_cache import response_cache
+from app.services.settings_cache import settings_cache, update_settings
 from fastapi.responses import StreamingResponse
 from fastapi import UploadFile, File
 
@@ -41,24 +50,14 @@ def check_admin(current_user: User = Depends(get_current_user)):
 # --- Глобальные настройки (подписки вкл/выкл) ---
 
 @router.get("/settings")
-def get_admin_settings(db: Session = Depends(get_db), admin: User = Depends(check_admin)):
-    items = db.query(AppSetting).all()
-    data = {item.key: item.value for item in items}
-    if "subscriptions_enabled" not in data:
-        data["subscriptions_enabled"] = "true"
-    return create_response(data=data)
+def get_admin_settings(admin: User = Depends(check_admin)):
+    return create_response(data=settings_cache.snapshot().as_dict())
 
 @router.patch("/settings")
 def update_admin_settings(payload: dict, db: Session = Depends(get_db), admin: User = Depends(check_admin)):
-    for key, value in payload.items():
-        row = db.query(AppSetting).filter(AppSetting.key == key).first()
-        if row:
-            row.value = str(value).lower() if isinstance(value, bool) else str(value)
-        else:
-            db.add(AppSetting(key=key, value=str(value).lower() if isinstance(value, bool) else str(value)))
+    update_settings(db, payload)
     db.commit()
-    items = db.query(AppSetting).all()
-    return create_response(data={item.key: item.value for item in items})
+    return create_response(data=settings_cache.snapshot().as_dict())
 
 
 @router.post("/sync/defaults")
@@ -75,22 +74,17 @@ async def trigger_sync(db: Session = Depends(get_db), admin: User = Depends(chec
 
 # --- Управление справочниками (Dictionaries) ---
 
-from sqlalchemy.orm import joinedload
-
-def _dict_item_to_response(d: Dictionary) -> dict:
-    """Collect dictionary item with translations from joined object."""
-    by_lang = {t.lang: t.name for t in d.translations}
-    parent_name = None
-    if d.parent:
-        parent_trans = next((t for t in d.parent.translations if t.lang == "ru"), None)
-        parent_name = parent_trans.name if parent_trans else d.parent.name
+def _dict_item_to_response(d: DictionaryEntry, dicts: DictionarySnapshot) -> dict:
+    """Collect dictionary item with translations from the snapshot."""
+    parent = dicts.get(d.parent_id)
+    parent_name = parent.localized("ru") if parent else None
 
     return {
         "id": d.id,
         "name": d.name,
-        "name_ru": by_lang.get("ru", d.name or ""),
-        "name_en": by_lang.get("en", ""),
-        "name_kk": by_lang.get("kk", ""),
+        "name_ru": d.names.get("ru", d.name or ""),
+        "name_en": d.names.get("en", ""),
+        "name_kk": d.names.get("kk", ""),
         "code": d.code,
         "type": d.type,
         "parent_id": d.parent_id,
@@ -109,30 +103,23 @@ def list_dictionaries(
     q: str | None = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
     admin: User = Depends(check_admin),
 ):
     """
     List dictionary items for admin panel with translations and pagination.
     """
-    query = db.query(Dictionary).options(joinedload(Dictionary.translations))
-    if type:
-        query = query.filter(Dictionary.type == type)
-    if parent_id:
-        query = query.filter(Dictionary.parent_id == parent_id)
+    dicts = dictionary_cache.snapshot()
+    entries = list(dicts.items(type=type, parent_id=parent_id))
     if q:
-        search_term = f"%{q.lower()}%"
-        query = query.join(DictionaryTranslation, isouter=True).filter(
-            or_(
-                Dictionary.name.ilike(search_term),
-                Dictionary.code.ilike(search_term),
-                DictionaryTranslation.name.ilike(search_term)
-            )
-        ).distinct()
-        
-    total = query.count()
-    items = query.order_by(Dictionary.display_order.asc(), Dictionary.id.asc()).offset(skip).limit(limit).all()
-    data = [_dict_item_to_response(d) for d in items]
+        term = q.lower()
+        entries = [
+            e for e in entries
+            if term in e.code.lower() or any(term in n.lower() for n in e.all_names())
+        ]
+
+    total = len(entries)
+    entries.sort(key=lambda e: (e.display_order, e.id))
+    data = [_dict_item_to_response(d, dicts) for d in entries[skip:skip + limit]]
     return create_response(data={"items": data, "total": total})
 
 
@@ -167,9 +154,11 @@ def create_dictionary_item(payload: dict, db: Session = Depends(get_db), admin:
 
     for lang, name in [("ru", name_ru), ("en", name_en), ("kk", name_kk)]:
         db.add(DictionaryTranslation(dictionary_id=new_item.id, lang=lang, name=name))
+    dictionary_cache.invalidate(db)
     db.commit()
 
-    return create_response(data=_dict_item_to_response(new_item, db))
+    dicts = dictionary_cache.snapshot()
+    return create_response(data=_dict_item_to_response(dicts.get(new_item.id), dicts))
 
 
 @router.patch("/dictionaries/{item_id}")
@@ -209,9 +198,14 @@ def update_dictionary_item(item_id: int, payload: dict, db: Session = Depends(ge
         if name_ru is not None and (name_ru if isinstance(name_ru, str) else "").strip():
             item.name = (name_ru if isinstance(name_ru, str) else "").strip()
 
+    dictionary_cache.invalidate(db)
+    if name_ru is not None or name_en is not None or name_kk is not None:
+        # Поисковые документы и строки каталога — по новым названиям, в той же транзакции
+        mark_dictionaries_renamed(db, [item_id])
     db.commit()
-    db.refresh(item)
-    return create_response(data=_dict_item_to_response(item, db))
+
+    dicts = dictionary_cache.snapshot()
+    return create_response(data=_dict_item_to_response(dicts.get(item_id), dicts))
 
 
 @router.delete("/dictionaries/{item_id}")
@@ -221,9 +215,19 @@ def delete_dictionary_item(item_id: int, db: Session = Depends(get_db), admin: U
         raise HTTPException(404)
     db.query(DictionaryTranslation).filter(DictionaryTranslation.dictionary_id == item_id).delete()
     db.delete(item)
+    dictionary_cache.invalidate(db)
     db.commit()
     return create_response(data={"success": True})
 
+@router.get("/cache/stats")
+def get_cache_stats(admin: User = Depends(check_admin)):
+    """Попадания/промахи кеша ответов каталога (по текущему воркеру) и размер кеша фасетов."""
+    return create_response(data={
+        "responses": response_cache.stats(),
+        "facets": {"entries": len(facets_cache)},
+    })
+
+
 @router.get("/stats")
 def get_stats(db: Session = Depends(get_db), admin: User = Depends(check_admin)):
     from sqlalchemy import func
@@ -357,6 +361,8 @@ def update_user(user_id: int, payload: dict, db: Session = Depends(get_db), admi
                 user.is_active = bool(payload[key])
             else:
                 setattr(user, key, payload[key])
+    if "name" in payload:
+        mark_cars_changed(db, listing_ids_for_author(db, user.id))
     db.commit()
     db.refresh(user)
     return create_response(data={"id": user.id, "is_active": user.is_active})
@@ -456,18 +462,22 @@ def list_cars_admin(db: Session = Depends(get_db), admin: User = Depends(check_a
     } for c in cars])
 
 @router.post("/cars/{car_id}/approve")
-async def approve_car(car_id: int, db: Session = Depends(get_db), admin: User = Depends(check_admin)):
-    """Одобрить объявление — статус ACTIVE (показывается в каталоге)."""
+def approve_car(
+    car_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    admin: User = Depends(check_admin),
+):
+    """Одобрить объявление — статус ACTIVE (показывается в каталоге) и подбор к открытым заявкам."""
     car = db.query(Car).filter(Car.id == car_id).first()
     if not car:
         raise HTTPException(404)
     car.status = "ACTIVE"
     car.update_date = datetime.utcnow()
-    try:
-        await email_service.send_new_car_for_applications(car)
-    except Exception as e:
-        logger.error(f"Error sending new car for applications: {e}")
+    mark_car_changed(db, car)
+    renters = match_car_to_applications(db, car)
     db.commit()
+    queue_renter_notifications(background_tasks, db, car, renters.keys())
     return create_response(data={"id": car.id, "status": car.status})
 
 @router.post("/cars/{car_id}/reject")
@@ -478,21 +488,34 @@ def reject_car(car_id: int, db: Session = Depends(get_db), admin: User = Depends
         raise HTTPException(404)
     car.status = "REJECT"
     car.update_date = datetime.utcnow()
+    mark_car_changed(db, car)
     db.commit()
     return create_response(data={"id": car.id, "status": car.status})
 
 
 @router.patch("/cars/{car_id}")
-def update_car_admin(car_id: int, payload: dict, db: Session = Depends(get_db), admin: User = Depends(check_admin)):
+def update_car_admin(
+    car_id: int,
+    payload: dict,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    admin: User = Depends(check_admin),
+):
     """Редактирование объявления админом (статус и др.)."""
     car = db.query(Car).filter(Car.id == car_id).first()
     if not car:
         raise HTTPException(404)
+    was_active = car.status == "ACTIVE"
     for key in ("status", "name", "price_per_day"):
         if key in payload:
             setattr(car, key, payload[key])
+    if "name" in payload:
+        update_search_document(db, car)
     car.update_date = datetime.utcnow()
+    mark_car_changed(db, car)
+    renters = {} if was_active else match_car_to_applications(db, car)
     db.commit()
+    queue_renter_notifications(background_tasks, db, car, renters.keys())
     return create_response(data={"id": car.id, "status": car.status})
 
 
@@ -506,6 +529,8 @@ def delete_car_admin(car_id: int, db: Session = Depends(get_db), admin: User = D
     car.update_date = datetime.utcnow()
     if hasattr(car, "delete_date"):
         car.delete_date = datetime.utcnow()
+    mark_car_changed(db, car)
+    mark_entitlements_changed(db, [car.author_id])
     db.commit()
     return create_response(data={"id": car.id, "status": "DELETED"})
 
@@ -529,7 +554,8 @@ def list_applications_admin(
         
     total = query.count()
     apps = query.order_by(Application.create_date.desc()).offset(skip).limit(limit).all()
-    
+    images = load_images(db, "APPLICATION", [app.id for app in apps])
+
     result = []
     for app in apps:
         ac_count = db.query(ApplicationCar).filter(ApplicationCar.application_id == app.id).count()
@@ -542,7 +568,7 @@ def list_applications_admin(
             "create_date": app.create_date.isoformat() if app.create_date else None,
             "views_count": app.views_count,
             "matching_cars_count": ac_count,
-            "images": [{"url": img.url} for img in app.application_images]
+            "images": [{"url": img.url} for img in images.get(app.id, [])]
         })
     return create_response(data={"items": result, "total": total})
 
@@ -631,7 +657,7 @@ def get_car_detail_admin(car_id: int, db: Session = Depends(get_db), admin: User
     return create_response(data={
         "id": car.id,
         "name": car.name,
-        "images": [{"url": i.url, "id": i.id} for i in car.car_images],
+        "images": [{"url": i.url, "id": i.id} for i in load_images(db, "CAR", [car.id]).get(car.id, [])],
         "status": car.status,
         "views": car.views_count,
         "create_date": car.create_date.isoformat() if car.create_date else None,
@@ -742,6 +768,7 @@ def list_subscription_plans(db: Session = Depends(get_db), admin: User = Depends
 def create_subscription_plan(payload: dict, db: Session = Depends(get_db), admin: User = Depends(check_admin)):
     plan = SubscriptionPlan(**payload)
     db.add(plan)
+    mark_entitlements_changed(db, ALL_OWNERS)
     db.commit()
     db.refresh(plan)
     return create_response(data=_plan_to_dict(plan))
@@ -754,6 +781,8 @@ def update_subscription_plan(plan_id: int, payload: dict, db: Session = Depends(
     for key, value in payload.items():
         if hasattr(plan, key):
             setattr(plan, key, value)
+    # max_cars / is_active тарифа входят в кешированные права владельцев
+    mark_entitlements_changed(db, ALL_OWNERS)
     db.commit()
     db.refresh(plan)
     return create_response(data=_plan_to_dict(plan))
@@ -765,5 +794,6 @@ def delete_subscription_plan(plan_id: int, db: Session = Depends(get_db), admin:
     if not plan:
         raise HTTPException(404)
     plan.is_active = False
+    mark_entitlements_changed(db, ALL_OWNERS)
     db.commit()
     return create_response(data={"id": plan_id, "is_active": False})
@@ -2,15 +2,21 @@ from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, Request, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
 
 from app.core.responses import create_response
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app import models
-from app.services.cloudinary_service import CloudinaryService
-from app.services.subscriptions_service import get_active_subscription_for_owner
+from app.services.application_links import add_application_cars, add_selected_cars
+from app.services.car_match_index import match_cars
+from app.services.dictionary_cache import dictionary_cache
+from app.services.image_loader import load_first_images, load_images
+from app.services.image_variants import image_size_param, image_urls
+from app.services.entitlements import get_entitlement
+from app.services.owner_inbox import get_owner_inbox, mark_owner_inbox_read
+from app.services.upload_executor import upload_images
 from app.services.email_service import email_service
 from app.services.whatsapp_service import whatsapp_service
 from app.schemas.applications import ApplicationUpdateStatus
@@ -19,15 +25,22 @@ from app.core.config import settings
 router = APIRouter()
 
 
-def _dict_name(d: Optional[models.Dictionary], lang: str = "ru") -> Optional[str]:
-    if not d:
-        return None
-    trans = next((t for t in d.translations if t.lang == lang), None)
-    return trans.name if trans else d.name
-
-
-def _application_payload(app: models.Application, lang: str, include_cars: bool = False, cars_list=None):
+def _application_payload(
+    app: models.Application,
+    lang: str,
+    include_cars: bool = False,
+    cars_list=None,
+    images: list[models.Image] | None = None,
+    car_thumbs: dict[int, models.Image] | None = None,
+    image_size: str | None = None,
+):
+    """
+    images — фото заявки, car_thumbs — {car_id: первое фото}; загружаются пачкой
+    для всех заявок ответа (см. _load_payload_images).
+    """
     cars_list = cars_list or []
+    car_thumbs = car_thumbs or {}
+    dicts = dictionary_cache.snapshot()
     payload = {
         "id": app.id,
         "user_id": app.user_id,
@@ -42,11 +55,11 @@ def _application_payload(app: models.Application, lang: str, include_cars: bool
         "create_date": app.create_date.isoformat() if app.create_date else None,
         "update_date": app.update_date.isoformat() if app.update_date else None,
         "completed_at": app.completed_at.isoformat() if app.completed_at else None,
-        "city_name": _dict_name(app.city, lang),
-        "category_name": _dict_name(app.category, lang),
-        "mark_name": _dict_name(app.mark, lang),
-        "model_name": _dict_name(app.model, lang),
-        "images": [{"url": img.url, "id": img.id} for img in app.application_images],
+        "city_name": dicts.name(app.city_id, lang),
+        "category_name": dicts.name(app.category_id, lang),
+        "mark_name": dicts.name(app.vehicle_mark_id, lang),
+        "model_name": dicts.name(app.vehicle_model_id, lang),
+        "images": [{**image_urls(img.url, image_size), "id": img.id} for img in images or []],
         "matching_cars_count": len(cars_list),
         "matching_cars": include_cars and [
             {
@@ -57,7 +70,7 @@ def _application_payload(app: models.Application, lang: str, include_cars: bool
                 "author_phone": c.author.phone_number if c.author else None,
                 "price_per_day": c.price_per_day,
                 "release_year": c.release_year,
-                "images": [{"url": img.url} for img in c.car_images[:1]],
+                "images": [image_urls(car_thumbs[c.id].url, image_size)] if c.id in car_thumbs else [],
             }
             for c in cars_list
         ] or [],
@@ -65,6 +78,14 @@ def _application_payload(app: models.Application, lang: str, include_cars: bool
     return payload
 
 
+def _load_payload_images(db: Session, apps, cars=()) -> tuple[dict[int, list], dict[int, models.Image]]:
+    """Фото заявок и миниатюры машин для _application_payload — по одному запросу."""
+    return (
+        load_images(db, "APPLICATION", [app.id for app in apps]),
+        load_first_images(db, "CAR", [c.id for c in cars]),
+    )
+
+
 def _applicant_contact(user: models.User, has_subscription: bool) -> Optional[dict]:
     if not has_subscription:
         return None
@@ -80,6 +101,7 @@ async def create_application(
     request: Request,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
+    image_size: str | None = Depends(image_size_param),
     current_user: models.User = Depends(get_current_user),
     city_id: int = Form(...),
     category_id: Optional[int] = Form(None),
@@ -123,46 +145,42 @@ async def create_application(
     db.add(app)
     db.flush()
 
-    for idx, img_file in enumerate(images):
-        if img_file and img_file.filename:
-            url, public_id = CloudinaryService.upload_image(img_file.file, folder="autopro/applications")
-            if url:
-                db.add(models.Image(
-                    entity_id=app.id,
-                    entity_type="APPLICATION",
-                    url=url,
-                    image_id=public_id,
-                    position=idx,
-                ))
-
-    # Matching cars: ACTIVE, same city, category; mark/model optional, NOT OWN
-    q = db.query(models.Car).filter(
-        models.Car.status == "ACTIVE",
-        models.Car.delete_date.is_(None),
-        models.Car.city_id == app.city_id,
-        models.Car.author_id != current_user.id,
+    # Позиция — индекс файла в запросе (пустые поля формы пропускаются)
+    files = [(idx, img_file) for idx, img_file in enumerate(images) if img_file and img_file.filename]
+    uploaded = await upload_images([img_file.file for _, img_file in files], folder="autopro/applications")
+    for (idx, _), (url, public_id) in zip(files, uploaded):
+        if url:
+            db.add(models.Image(
+                entity_id=app.id,
+                entity_type="APPLICATION",
+                url=url,
+                image_id=public_id,
+                position=idx,
+            ))
+
+    # Matching cars: ACTIVE, same city, category; mark/model optional, NOT OWN (индекс в памяти)
+    car_ids, _ = match_cars(
+        app.city_id, app.category_id, app.vehicle_mark_id, app.vehicle_model_id,
+        exclude_author_id=current_user.id,
     )
-    if app.category_id is not None:
-        q = q.filter(models.Car.category_id == app.category_id)
-    if app.vehicle_mark_id is not None:
-        q = q.filter(models.Car.vehicle_mark_id == app.vehicle_mark_id)
-    if app.vehicle_model_id is not None:
-        q = q.filter(models.Car.vehicle_model_id == app.vehicle_model_id)
-
-    matching_cars = q.all()
-    for car in matching_cars:
-        db.add(models.ApplicationCar(application_id=app.id, car_id=car.id))
+    # Индекс другого воркера может отставать — статус перепроверяем по первичному ключу
+    if car_ids:
+        car_ids = [cid for (cid,) in db.query(models.Car.id).filter(
+            models.Car.id.in_(car_ids),
+            models.Car.status == "ACTIVE",
+            models.Car.delete_date.is_(None),
+        )]
+    add_application_cars(db, app.id, car_ids)
 
     db.commit()
     db.refresh(app)
 
-    # Notifications
-    owner_dict = {}
-    for car in matching_cars:
-        owner = db.query(models.User).filter(models.User.id == car.author_id).first()
-        if owner and owner.id not in owner_dict:
-            owner_dict[owner.id] = owner
-    
+    # Машины с владельцами одним запросом (для уведомлений и ответа)
+    matching_cars = db.query(models.Car).options(joinedload(models.Car.author)).filter(
+        models.Car.id.in_(car_ids)
+    ).order_by(models.Car.id).all() if car_ids else []
+    owner_dict = {car.author.id: car.author for car in matching_cars if car.author}
+
     for owner in owner_dict.values():
         text_whatsapp = (
             f"🚀 *Новая возможность для вас в AutoPro!*\n\n"
@@ -185,7 +203,11 @@ async def create_application(
             background_tasks.add_task(whatsapp_service.send_notification, phone_number=owner.phone_number, text=text_whatsapp)
 
     lang = getattr(request.state, "lang", "ru")
-    payload = _application_payload(app, lang, include_cars=True, cars_list=matching_cars)
+    images, thumbs = _load_payload_images(db, [app], matching_cars)
+    payload = _application_payload(
+        app, lang, include_cars=True, cars_list=matching_cars, images=images.get(app.id), car_thumbs=thumbs,
+        image_size=image_size,
+    )
     return create_response(data=payload, message="Заявка создана", lang=lang)
 
 
@@ -193,6 +215,7 @@ async def create_application(
 def list_my_applications(
     request: Request,
     db: Session = Depends(get_db),
+    image_size: str | None = Depends(image_size_param),
     current_user: models.User = Depends(get_current_user),
     status: Optional[str] = None,
 ):
@@ -202,33 +225,41 @@ def list_my_applications(
     q = q.order_by(models.Application.create_date.desc())
     apps = q.all()
 
+    # Связи всех заявок с машинами и их владельцами — одним запросом (подбор — application_matching)
+    links: dict[int, list[models.ApplicationCar]] = {}
+    if apps:
+        for ac in (
+            db.query(models.ApplicationCar)
+            .options(joinedload(models.ApplicationCar.car).joinedload(models.Car.author))
+            .filter(models.ApplicationCar.application_id.in_([app.id for app in apps]))
+            .order_by(models.ApplicationCar.id)
+        ):
+            if ac.car and ac.car.author_id != current_user.id:
+                links.setdefault(ac.application_id, []).append(ac)
+
     lang = getattr(request.state, "lang", "ru")
-    result = []
+    rows = []
     for app in apps:
-        ac_list = db.query(models.ApplicationCar).filter(models.ApplicationCar.application_id == app.id).all()
-        if len(ac_list) == 0:
-            new_ac_list = db.query(models.Car).filter(
-                models.Car.status == "ACTIVE",
-                models.Car.delete_date.is_(None),
-                models.Car.city_id == app.city_id,
-                models.Car.author_id != current_user.id,
-            ).all()
-            for car in new_ac_list:
-                db.add(models.ApplicationCar(application_id=app.id, car_id=car.id))
-            db.commit()
-            ac_list = db.query(models.ApplicationCar).filter(models.ApplicationCar.application_id == app.id).all()
-        cars = [ac.car for ac in ac_list if ac.car and ac.car.author_id != current_user.id]
-        
-        view_history = []
-        for ac in ac_list:
-            if ac.owner_read_at and ac.car and ac.car.author and ac.car.author_id != current_user.id:
-                view_history.append({
-                    "date": ac.owner_read_at.isoformat(),
-                    "name": ac.car.author.name,
-                    "phone": ac.car.author.phone_number
-                })
-                
-        payload = _application_payload(app, lang, include_cars=True, cars_list=cars)
+        ac_list = links.get(app.id, [])
+        cars = [ac.car for ac in ac_list]
+        view_history = [
+            {
+                "date": ac.owner_read_at.isoformat(),
+                "name": ac.car.author.name,
+                "phone": ac.car.author.phone_number,
+            }
+            for ac in ac_list
+            if ac.owner_read_at and ac.car.author
+        ]
+        rows.append((app, cars, view_history))
+
+    images, thumbs = _load_payload_images(db, apps, [c for _, cars, _ in rows for c in cars])
+    result = []
+    for app, cars, view_history in rows:
+        payload = _application_payload(
+            app, lang, include_cars=True, cars_list=cars, images=images.get(app.id), car_thumbs=thumbs,
+            image_size=image_size,
+        )
         payload["viewers"] = view_history
         result.append(payload)
     return create_response(data=result, lang=lang)
@@ -240,21 +271,8 @@ def count_to_my_ads(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    my_car_ids = [r[0] for r in db.query(models.Car.id).filter(models.Car.author_id == current_user.id).all()]
-    if not my_car_ids:
-        return create_response(data={"count": 0}, lang=getattr(request.state, "lang", "ru"))
-
-    city_id = getattr(current_user, "city_id", None)
-    subq = (
-        db.query(models.ApplicationCar.application_id)
-        .filter(models.ApplicationCar.car_id.in_(my_car_ids), models.ApplicationCar.owner_read_at.is_(None))
-        .distinct()
-    )
-    q = db.query(models.Application).filter(models.Application.id.in_(subq))
-    if city_id is not None:
-        q = q.filter(models.Application.city_id == city_id)
-    count = q.count()
-    return create_response(data={"count": count}, lang=getattr(request.state, "lang", "ru"))
+    unread, total = get_owner_inbox(db, current_user.id)
+    return create_response(data={"count": unread, "total": total}, lang=getattr(request.state, "lang", "ru"))
 
 
 @router.post("/to-my-ads/mark-read")
@@ -263,15 +281,7 @@ def mark_to_my_ads_read(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    my_car_ids = [r[0] for r in db.query(models.Car.id).filter(models.Car.author_id == current_user.id).all()]
-    if not my_car_ids:
-        return create_response(message="OK", lang=getattr(request.state, "lang", "ru"))
-
-    now = datetime.utcnow()
-    db.query(models.ApplicationCar).filter(
-        models.ApplicationCar.car_id.in_(my_car_ids),
-        models.ApplicationCar.owner_read_at.is_(None),
-    ).update({models.ApplicationCar.owner_read_at: now}, synchronize_session=False)
+    mark_owner_inbox_read(db, current_user.id)
     db.commit()
     return create_response(message="OK", lang=getattr(request.state, "lang", "ru"))
 
@@ -280,10 +290,11 @@ def mark_to_my_ads_read(
 def list_to_my_ads(
     request: Request,
     db: Session = Depends(get_db),
+    image_size: str | None = Depends(image_size_param),
     current_user: models.User = Depends(get_current_user),
 ):
     my_car_ids = [r[0] for r in db.query(models.Car.id).filter(models.Car.author_id == current_user.id).all()]
-    if my_car_ids:
+    if not my_car_ids:
         return create_response(data=[], lang=getattr(request.state, "lang", "ru"))
 
     app_ids = [r[0] for r in db.query(models.ApplicationCar.application_id).filter(
@@ -298,13 +309,32 @@ def list_to_my_ads(
         q = q.filter(models.Application.city_id == city_id)
     apps = q.all()
 
-    has_subscription = get_active_subscription_for_owner(db, current_user.id) is not None
+    # Связи заявок с моими машинами — одним запросом, как в list_my_applications
+    links: dict[int, list[models.Car]] = {}
+    if apps:
+        for ac in (
+            db.query(models.ApplicationCar)
+            .options(joinedload(models.ApplicationCar.car).joinedload(models.Car.author))
+            .filter(
+                models.ApplicationCar.application_id.in_([app.id for app in apps]),
+                models.ApplicationCar.car_id.in_(my_car_ids),
+            )
+            .order_by(models.ApplicationCar.id)
+        ):
+            if ac.car:
+                links.setdefault(ac.application_id, []).append(ac.car)
+
+    has_subscription = get_entitlement(db, current_user.id).has_subscription
     lang = getattr(request.state, "lang", "ru")
+    rows = [(app, links.get(app.id, [])) for app in apps]
+
+    images, thumbs = _load_payload_images(db, apps, [c for _, cars in rows for c in cars])
     result = []
-    for app in apps:
-        ac_list = db.query(models.ApplicationCar).filter(models.ApplicationCar.application_id == app.id, models.ApplicationCar.car_id.in_(my_car_ids)).all()
-        cars = [ac.car for ac in ac_list if ac.car]
-        payload = _application_payload(app, lang, include_cars=True, cars_list=cars)
+    for app, cars in rows:
+        payload = _application_payload(
+            app, lang, include_cars=True, cars_list=cars, images=images.get(app.id), car_thumbs=thumbs,
+            image_size=image_size,
+        )
         payload["applicant_contact"] = _applicant_contact(app.user, has_subscription)
         result.append(payload)
     return create_response(data=result, lang=lang)
@@ -314,6 +344,7 @@ def list_to_my_ads(
 def list_other_applications(
     request: Request,
     db: Session = Depends(get_db),
+    image_size: str | None = Depends(image_size_param),
     current_user: models.User = Depends(get_current_user),
 ):
     my_car_ids = [r[0] for r in db.query(models.Car.id).filter(models.Car.author_id == current_user.id).all()]
@@ -331,11 +362,12 @@ def list_other_applications(
         q = q.filter(~models.Application.id.in_(subq))
 
     apps = q.order_by(models.Application.create_date.desc()).limit(100).all()
-    has_subscription = get_active_subscription_for_owner(db, current_user.id) is not None
+    has_subscription = get_entitlement(db, current_user.id).has_subscription
     lang = getattr(request.state, "lang", "ru")
+    images, _ = _load_payload_images(db, apps)
     result = []
     for app in apps:
-        payload = _application_payload(app, lang)
+        payload = _application_payload(app, lang, images=images.get(app.id), image_size=image_size)
         payload["applicant_contact"] = _applicant_contact(app.user, has_subscription)
         result.append(payload)
     return create_response(data=result, lang=lang)
@@ -346,6 +378,7 @@ def get_application(
     application_id: int,
     request: Request,
     db: Session = Depends(get_db),
+    image_size: str | None = Depends(image_size_param),
     current_user: models.User = Depends(get_current_user),
 ):
     app = db.query(models.Application).filter(models.Application.id == application_id).first()
@@ -365,10 +398,8 @@ def get_application(
 
     if is_owner:
         app.views_count = (app.views_count or 0) + 1
-        now = datetime.utcnow()
-        for ac in acs:
-            if ac.owner_read_at is None:
-                ac.owner_read_at = now
+        if any(ac.owner_read_at is None for ac in acs):
+            mark_owner_inbox_read(db, current_user.id, app.id)
         db.commit()
         db.refresh(app)
 
@@ -381,7 +412,11 @@ def get_application(
         selected_car_ids = [s.car_id for s in sel]
 
     lang = getattr(request.state, "lang", "ru")
-    payload = _application_payload(app, lang, include_cars=True, cars_list=cars)
+    images, thumbs = _load_payload_images(db, [app], cars)
+    payload = _application_payload(
+        app, lang, include_cars=True, cars_list=cars, images=images.get(app.id), car_thumbs=thumbs,
+        image_size=image_size,
+    )
     payload["selected_car_ids"] = selected_car_ids
     return create_response(data=payload, lang=lang)
 
@@ -409,10 +444,12 @@ def update_application_status(
         )
 
     is_author = app.user_id == current_user.id
-    my_car_ids = [r[0] for r in db.query(models.Car.id).filter(models.Car.author_id == current_user.id).all()]
-    ac_list = db.query(models.ApplicationCar).filter(models.ApplicationCar.application_id == app.id).all()
-    allowed_car_ids = [ac.car_id for ac in ac_list]
-    is_owner = any(cid in my_car_ids for cid in allowed_car_ids)
+    # Совпавшие машины заявки с владельцами — без загрузки объектов
+    matched = db.query(models.ApplicationCar.car_id, models.Car.author_id).join(
+        models.Car, models.Car.id == models.ApplicationCar.car_id
+    ).filter(models.ApplicationCar.application_id == app.id).all()
+    allowed_car_ids = {car_id for car_id, _ in matched}
+    is_owner = any(author_id == current_user.id for _, author_id in matched)
 
     if status == "REJECTED":
         if not is_author and not is_owner:
@@ -443,12 +480,7 @@ def update_application_status(
                     message="Недопустимые объявления",
                     lang=getattr(request.state, "lang", "ru"),
                 )
-        for cid in selected_car_ids:
-            if not db.query(models.ApplicationSelectedCar).filter(
-                models.ApplicationSelectedCar.application_id == app.id,
-                models.ApplicationSelectedCar.car_id == cid,
-            ).first():
-                db.add(models.ApplicationSelectedCar(application_id=app.id, car_id=cid))
+        add_selected_cars(db, app.id, selected_car_ids)
         app.status = "COMPLETED"
         app.completed_at = datetime.utcnow()
         app.update_date = datetime.utcnow()
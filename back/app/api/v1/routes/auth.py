@@ -19,7 +19,10 @@ from app.schemas.auth import OwnerLoginRequest, OwnerRegisterRequest, Token, Use
 from app.core.responses import create_response
 from pydantic import BaseModel, EmailStr
 import re
+from app.services.car_events import mark_cars_changed
+from app.services.car_listing_service import listing_ids_for_author
 from app.services.email_service import email_service
+from app.services.owner_inbox import mark_owner_inbox_changed
 from app.services.whatsapp_service import whatsapp_service
 
 router = APIRouter()
@@ -436,6 +439,8 @@ def update_profile(
 ):
     if payload.name:
         current_user.name = payload.name
+        # Имя автора хранится в строках каталога
+        mark_cars_changed(db, listing_ids_for_author(db, current_user.id))
     if payload.email:
         current_user.email = payload.email
     if payload.phone_number:
@@ -445,8 +450,10 @@ def update_profile(
     if payload.date_birth:
         from datetime import datetime as dt
         current_user.date_birth = dt.fromisoformat(payload.date_birth)
-    if payload.city_id is not None:
+    if payload.city_id is not None and payload.city_id != current_user.city_id:
         current_user.city_id = payload.city_id
+        # Входящие заявки владельца считаются по его городу
+        mark_owner_inbox_changed(db, [current_user.id])
     if payload.notify_by_email is not None:
         current_user.notify_by_email = payload.notify_by_email
     if payload.notify_by_whatsapp is not None:
@@ -457,7 +464,7 @@ def update_profile(
 
 
 from fastapi import File, UploadFile
-from app.services.cloudinary_service import CloudinaryService
+from app.services.upload_executor import upload_image
 
 @router.post("/avatar")
 async def upload_avatar(
@@ -467,7 +474,7 @@ async def upload_avatar(
     db: Session = Depends(get_db)
 ):
     # Upload to Cloudinary
-    url, public_id = CloudinaryService.upload_image(file.file, folder="avatars")
+    url, public_id = await upload_image(file.file, folder="avatars")
     if not url:
         return create_response(code=500, message_key="upload_error", lang=request.state.lang)
     
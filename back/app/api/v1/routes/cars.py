@@ -1,21 +1,25 @@
 from typing import List
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, Request
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile, Request
 from sqlalchemy.orm import Session
 
 from app.core.security import get_current_owner, get_current_user_optional
 from app.db.session import get_db
-from app.models import Car, Image, User, AppSetting, Dictionary
+from app.models import Car, Image, User
 from app.schemas.cars import CarResponse
-from sqlalchemy import or_, String, cast
-from sqlalchemy.orm import aliased
-from app.services.cloudinary_service import CloudinaryService
-from app.services.subscriptions_service import (
-    get_active_subscription_for_owner,
-    owner_cars_count,
-)
+from app.services.car_events import mark_car_changed
+from app.services.car_listing_service import InvalidCursor, fetch_cars_after, fetch_cars_page
+from app.services.car_facets_service import get_facets
+from app.services.car_search_service import update_search_document
+from app.services.dictionary_cache import dictionary_cache
+from app.services.response_cache import CARS, response_cache
+from app.services.settings_cache import settings_cache
+from app.services.entitlements import get_entitlement, mark_entitlements_changed
 from app.services.telegram import send_new_application_message
+from app.services.image_loader import load_images
+from app.services.image_pipeline import add_car_images, car_images_status
+from app.services.image_variants import image_size_param, image_urls
 from app.core.responses import create_response
 from app.core.i18n import get_message
 from app.core.config import settings
@@ -26,8 +30,8 @@ router = APIRouter()
 @router.get("")
 def list_cars(
     request: Request,
-    skip: int = 0,
-    limit: int = 15,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(15, ge=1, le=100),
     q: str = None,
     marka_id: int = None,
     model_id: int = None,
@@ -38,85 +42,82 @@ def list_cars(
     city_id: int = None,
     city_name: str = None,
     sort: str = "new",
+    cursor: str | None = None,
+    image_size: str | None = Depends(image_size_param),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_optional),
 ):
+    """
+    Каталог объявлений.
+    По умолчанию — skip/limit c total. Если передан `cursor` (для первой страницы — пустой,
+    `?cursor=`), включается keyset-пагинация: в ответе `next_cursor` вместо `total`.
+    Анонимные ответы кешируются (см. response_cache).
+    """
+    anonymous = current_user is None
+    if anonymous:
+        cached = response_cache.get(CARS, request)
+        if cached is not None:
+            return cached
+
     # Показываем только опубликованные объявления (ACTIVE)
-    query = db.query(Car).filter(
-        Car.status == "ACTIVE",
-        Car.delete_date.is_(None),
+    filters = dict(
+        q=q,
+        city_id=city_id,
+        marka_id=marka_id,
+        model_id=model_id,
+        release_year=release_year,
+        category_id=category_id,
+        color_id=color_id,
+        car_class_id=car_class_id,
     )
-    
-    if city_id:
-        query = query.filter(Car.city_id == city_id)
-        
-    if marka_id:
-        query = query.filter(Car.vehicle_mark_id == marka_id)
-        
-    if model_id:
-        query = query.filter(Car.vehicle_model_id == model_id)
-        
-    if release_year:
-        query = query.filter(Car.release_year == release_year)
-        
-    if category_id:
-        query = query.filter(Car.category_id == category_id)
-
-    if color_id:
-        query = query.filter(Car.color_id == color_id)
-
-    if car_class_id:
-        query = query.filter(Car.car_class_id == car_class_id)
-        
-    if q:
-        search_term = f"%{q.lower()}%"
-        CityAlias = aliased(Dictionary)
-        query = query.outerjoin(Dictionary, Car.vehicle_mark_id == Dictionary.id).outerjoin(CityAlias, Car.city_id == CityAlias.id)
-        query = query.filter(
-            or_(
-                Car.name.ilike(search_term),
-                Car.description.ilike(search_term),
-                Dictionary.name.ilike(search_term),
-                CityAlias.name.ilike(search_term),
-                cast(Car.release_year, String).ilike(search_term),
-            )
-        )
-        
-    total = query.count()
 
-    if sort == "cheap":
-        query = query.order_by(Car.price_per_day.asc())
-    elif sort == "new":
-        query = query.order_by(Car.create_date.desc())
+    if cursor is not None:
+        try:
+            result, next_cursor = fetch_cars_after(
+                db, cursor=cursor, limit=limit, sort=sort, lang=request.state.lang, image_size=image_size, **filters
+            )
+        except InvalidCursor:
+            return create_response(code=400, message_key="invalid_cursor", lang=request.state.lang)
+        response = create_response(data={"items": result, "next_cursor": next_cursor}, lang=request.state.lang)
     else:
-        query = query.order_by(Car.create_date.desc())
+        result, total = fetch_cars_page(
+            db, skip=skip, limit=limit, sort=sort, lang=request.state.lang, image_size=image_size, **filters
+        )
+        response = create_response(data={"items": result, "total": total}, lang=request.state.lang)
 
-    cars = query.offset(skip).limit(limit).all()
+    return response_cache.store(CARS, request, response) if anonymous else response
 
-    result = []
-    for c in cars:
-        result.append({
-            "id": c.id,
-            "name": c.name,
-            "release_year": c.release_year,
-            "price_per_day": c.price_per_day,
-            "views_count": c.views_count,
-            "is_top": c.is_top,
-            "mark": c.mark.name if c.mark else None,
-            "model": c.model.name if c.model else None,
-            "category_name": c.category.name if c.category else None,
-            "car_class": c.car_class.name if c.car_class else None,
-            "color": c.color.name if c.color else None,
-            "transmission": c.transmission.name if c.transmission else None,
-            "images": [{"url": img.url} for img in c.car_images],
-            "city": c.city.name if c.city else "Алматы",
-            "author": {
-                "name": c.author.name if c.author else "Без имени",
-                "address": c.author.address if c.author else None
-            }
-        })
 
-    return create_response(data={"items": result, "total": total}, lang=request.state.lang)
+@router.get("/facets")
+def get_car_facets(
+    request: Request,
+    q: str = None,
+    marka_id: int = None,
+    model_id: int = None,
+    release_year: int = None,
+    category_id: int = None,
+    color_id: int = None,
+    car_class_id: int = None,
+    city_id: int = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Количество объявлений по марке, модели, городу, категории, цвету, классу и году
+    для боковой панели фильтров. Принимает те же фильтры, что и GET /cars.
+    """
+    data = get_facets(
+        db,
+        request.state.lang,
+        q=q,
+        city_id=city_id,
+        marka_id=marka_id,
+        model_id=model_id,
+        release_year=release_year,
+        category_id=category_id,
+        color_id=color_id,
+        car_class_id=car_class_id,
+    )
+    return create_response(data=data, lang=request.state.lang)
 
 
 @router.post("")
@@ -153,30 +154,22 @@ async def create_car(
     Если включены — первое объявление бесплатно, далее для публикации нужна активная подписка.
     Черновики (DRAFT) можно сохранять всегда, даже без подписки.
     """
-    setting = db.query(AppSetting).filter(AppSetting.key == "subscriptions_enabled").first()
-    subscriptions_enabled = (setting and setting.value and setting.value.lower() == "true")
+    subscriptions_enabled = settings_cache.snapshot().subscriptions_enabled
 
     status = "DRAFT" if save_as_draft else "AWAIT"
 
-    current_cars = owner_cars_count(db, current_owner.id)
-
     if subscriptions_enabled and status != "DRAFT":
-        # Первое объявление бесплатно (не требуем подписку)
-        if current_cars >= 1:
-            subscription = get_active_subscription_for_owner(db, current_owner.id)
-            if not subscription:
-                return create_response(
-                    code=403,
-                    message_key="no_subscription",
-                    lang=request.state.lang
-                )
-            plan = subscription.plan
-            if plan.max_cars is not None and current_cars >= plan.max_cars:
-                return create_response(
-                    code=403,
-                    message_key="car_limit_reached",
-                    lang=request.state.lang
-                )
+        # Первое объявление бесплатно, дальше — подписка и лимит max_cars тарифа
+        denial = get_entitlement(db, current_owner.id).publish_denial()
+        if denial:
+            # Кеш другого воркера мог ещё не увидеть оплату или удаление машины
+            denial = get_entitlement(db, current_owner.id, fresh=True).publish_denial()
+        if denial:
+            return create_response(
+                code=403,
+                message_key=denial,
+                lang=request.state.lang
+            )
     # Если подписки выключены или это черновик — лимиты не проверяем
 
     car = Car(
@@ -204,20 +197,13 @@ async def create_car(
     )
     db.add(car)
     db.flush()
+    update_search_document(db, car)
+    mark_car_changed(db, car)
+    mark_entitlements_changed(db, [current_owner.id])
 
-    # Save photos to Cloudinary
+    # Фото: в Cloudinary сразу или через очередь (IMAGE_UPLOAD_MODE)
     if images:
-        for idx, photo in enumerate(images):
-            url, public_id = CloudinaryService.upload_image(photo.file, folder="autopro/cars")
-            if url:
-                img_record = Image(
-                    entity_id=car.id,
-                    entity_type='CAR',
-                    url=url,
-                    image_id=public_id,
-                    position=idx
-                )
-                db.add(img_record)
+        await add_car_images(db, car, images)
 
     db.commit()
     db.refresh(car)
@@ -229,12 +215,10 @@ async def create_car(
         dt_str = created_at.strftime("%d.%m.%Y %H:%M:%S")
 
         # Марка / модель / цвет из справочников
-        def dict_name(d):
-            return d.name if d else ""
-
-        mark_name = dict_name(car.mark)
-        model_name = dict_name(car.model)
-        color_name = dict_name(car.color)
+        dicts = dictionary_cache.snapshot()
+        mark_name = dicts.name(car.vehicle_mark_id) or ""
+        model_name = dicts.name(car.vehicle_model_id) or ""
+        color_name = dicts.name(car.color_id) or ""
 
         frontend_base = (settings.FRONTEND_BASE_URL or "http://localhost:3000").rstrip("/")
         admin_url = f"{frontend_base}/dashboard/cars/{car.id}"
@@ -267,6 +251,7 @@ async def create_car(
 @router.get("/my")
 def get_my_cars(
     request: Request,
+    image_size: str | None = Depends(image_size_param),
     db: Session = Depends(get_db),
     current_owner: User = Depends(get_current_owner),
 ):
@@ -278,6 +263,7 @@ def get_my_cars(
         Car.delete_date.is_(None),
         Car.status != "DELETED",
     ).all()
+    images = load_images(db, "CAR", [c.id for c in cars])
 
     result = []
     for c in cars:
@@ -290,7 +276,7 @@ def get_my_cars(
             "views_count": c.views_count,
             "create_date": c.create_date.isoformat(),
             "update_date": c.update_date.isoformat() if c.update_date else None,
-            "images": [{"url": img.url} for img in c.car_images],
+            "images": [{**image_urls(img.url, image_size), "status": img.status} for img in images.get(c.id, [])],
         })
 
     return create_response(data=result, lang=request.state.lang)
@@ -300,10 +286,17 @@ def get_my_cars(
 def get_car(
     car_id: int,
     request: Request,
+    image_size: str | None = Depends(image_size_param),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_optional),
 ):
     """Публичное получение объявления по id. Только со статусом ACTIVE/DRAFT/AWAIT."""
+    anonymous = current_user is None
+    if anonymous:
+        cached = response_cache.get(CARS, request)
+        if cached is not None:
+            return cached
+
     car = db.query(Car).filter(
         Car.id == car_id,
         Car.status.in_(["ACTIVE", "DRAFT", "AWAIT"]),
@@ -318,12 +311,9 @@ def get_car(
         if not current_user or (car.author_id != current_user.id and not is_admin):
             raise HTTPException(status_code=403, detail=get_message("not_authorized", lang=request.state.lang))
 
-    def dict_name(d):
-        if not d:
-            return None
-        return d.name
+    dicts = dictionary_cache.snapshot()
 
-    return create_response(data={
+    response = create_response(data={
         "id": car.id,
         "name": car.name,
         "description": car.description,
@@ -333,25 +323,25 @@ def get_car(
         "mileage": car.mileage,
         "body_type": car.body_type,
         "engine_volume": car.engine_volume,
-        "city": dict_name(car.city),
+        "city": dicts.name(car.city_id),
         "city_id": car.city_id,
-        "steering": dict_name(car.steering),
+        "steering": dicts.name(car.steering_id),
         "steering_id": car.steering_id,
-        "condition": dict_name(car.condition),
+        "condition": dicts.name(car.condition_id),
         "condition_id": car.condition_id,
-        "car_class": dict_name(car.car_class),
+        "car_class": dicts.name(car.car_class_id),
         "car_class_id": car.car_class_id,
-        "transmission": dict_name(car.transmission),
+        "transmission": dicts.name(car.transmission_id),
         "transmission_id": car.transmission_id,
-        "fuel_type": dict_name(car.fuel_type),
+        "fuel_type": dicts.name(car.fuel_type_id),
         "fuel_type_id": car.fuel_type_id,
-        "color": dict_name(car.color),
+        "color": dicts.name(car.color_id),
         "color_id": car.color_id,
-        "mark": dict_name(car.mark),
+        "mark": dicts.name(car.vehicle_mark_id),
         "vehicle_mark_id": car.vehicle_mark_id,
-        "model": dict_name(car.model),
+        "model": dicts.name(car.vehicle_model_id),
         "vehicle_model_id": car.vehicle_model_id,
-        "category": dict_name(car.category),
+        "category": dicts.name(car.category_id),
         "category_id": car.category_id,
         "views_count": car.views_count,
         "status": car.status,
@@ -361,10 +351,15 @@ def get_car(
             "address": car.author.address if car.author else None,
             "phone_number": car.author.phone_number if car.author else None,
         },
-        "images": [{"url": img.url, "id": img.id} for img in car.car_images],
+        "images": [
+            {**image_urls(img.url, image_size), "id": img.id, "status": img.status}
+            for img in load_images(db, "CAR", [car.id]).get(car.id, [])
+        ],
         "create_date": car.create_date.isoformat() if car.create_date else None,
         "update_date": car.update_date.isoformat() if car.update_date else None,
     }, lang=request.state.lang)
+    # Анонимно доступны только ACTIVE — остальные сюда не доходят
+    return response_cache.store(CARS, request, response) if anonymous else response
 
 
 @router.delete("/{car_id}")
@@ -388,6 +383,8 @@ def delete_car(
     car.status = "DELETED"
     car.delete_date = datetime.utcnow()
     car.update_date = datetime.utcnow()
+    mark_car_changed(db, car)
+    mark_entitlements_changed(db, [car.author_id])
     db.commit()
     
     return create_response(
@@ -450,21 +447,12 @@ async def update_car(
     car.description = description
     car.status = "DRAFT" if save_as_draft else "AWAIT"
     car.update_date = datetime.utcnow()
+    update_search_document(db, car)
+    mark_car_changed(db, car)
 
     # Если загружены новые фото
     if images:
-        for idx, photo in enumerate(images):
-            url, public_id = CloudinaryService.upload_image(photo.file, folder="autopro/cars")
-            if url:
-                pos = len(car.car_images) + idx
-                img_record = Image(
-                    entity_id=car.id,
-                    entity_type='CAR',
-                    url=url,
-                    image_id=public_id,
-                    position=pos
-                )
-                db.add(img_record)
+        await add_car_images(db, car, images, start_position=len(car.car_images))
 
     db.commit()
     db.refresh(car)
@@ -475,6 +463,24 @@ async def update_car(
         lang=request.state.lang if hasattr(request.state, 'lang') else "ru"
     )
 
+@router.get("/{car_id}/images")
+def get_car_images_status(
+    car_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_owner: User = Depends(get_current_owner),
+):
+    """Статусы фото объявления (PENDING/READY/FAILED) — для опроса после создания в режиме deferred."""
+    car = db.query(Car).filter(Car.id == car_id).first()
+    if not car or car.author_id != current_owner.id:
+        raise HTTPException(status_code=403, detail=get_message("not_authorized", lang=request.state.lang))
+    images = car_images_status(db, car_id)
+    return create_response(
+        data={"images": images, "pending": sum(1 for img in images if img["status"] == "PENDING")},
+        lang=request.state.lang,
+    )
+
+
 @router.delete("/{car_id}/images/{image_id}")
 async def delete_car_image(
     car_id: int,
@@ -489,10 +495,9 @@ async def delete_car_image(
     image = db.query(Image).filter(Image.id == image_id, Image.entity_id == car_id, Image.entity_type == 'CAR').first()
     if not image:
         raise HTTPException(status_code=404, detail=get_message("error", lang=request.state.lang))
-        
-    from app.services.cloudinary_service import CloudinaryService
-    if image.image_id:
-        CloudinaryService.delete_image(image.image_id)
+
+    # Ассет в Cloudinary удалится в фоне (outbox media_deletions)
     db.delete(image)
+    mark_car_changed(db, car)
     db.commit()
     return create_response(message_key="ok", lang=request.state.lang if hasattr(request.state, 'lang') else "kk")
@@ -1,138 +1,86 @@
-from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
-from app.db.session import get_db
-from app.models import Dictionary, DictionaryTranslation
+from typing import Iterable
+
+from fastapi import APIRouter, Request
+
 from app.core.responses import create_response
+from app.services.dictionary_cache import DictionaryEntry, dictionary_cache
 
 router = APIRouter()
 
-def _get_localized_items(query, lang, limit=None, offset=None):
+def _get_localized_items(entries: Iterable[DictionaryEntry], lang, q=None, limit=None, offset=None):
     """
-    Helper to execute query and format items with localization.
+    Helper to search, sort, paginate and localize snapshot entries.
     """
+    entries = [e for e in entries if e.is_active]
+
+    if q:
+        # Search in default name or ANY translation
+        term = q.lower()
+        entries = [e for e in entries if any(term in n.lower() for n in e.all_names())]
+
+    # Сортировка по DisplayOrder (по убыванию) и по названию
+    entries.sort(key=lambda e: (-e.display_order, e.name))
+
     if limit:
-        query = query.limit(limit).offset(offset)
-        
-    items = query.all()
-    
-    result = []
-    for item in items:
-        # Find translation for requested language
-        trans = next((t for t in item.translations if t.lang == lang), None)
-        name = trans.name if trans else item.name
-        
-        result.append({
-            "id": item.id, 
-            "name": name, 
-            "code": item.code,
-            "icon": item.icon,
-            "color": item.color,
-            "parent_id": item.parent_id,
-            "display_order": item.display_order
-        })
-    return result
+        entries = entries[offset or 0:(offset or 0) + limit]
+
+    return [
+        {
+            "id": e.id,
+            "name": e.localized(lang),
+            "code": e.code,
+            "icon": e.icon,
+            "color": e.color,
+            "parent_id": e.parent_id,
+            "display_order": e.display_order,
+        }
+        for e in entries
+    ]
 
 @router.get("")
 def list_dictionaries(
-    type: str = None, 
-    parent_id: int = None, 
+    type: str = None,
+    parent_id: int = None,
     q: str = None,
     limit: int = 100,
     offset: int = 0,
-    request: Request = None, 
-    db: Session = Depends(get_db)
+    request: Request = None,
 ):
     """
     Универсальный эндпоинт для получения справочников с поддержкой поиска, пагинации и сортировки.
     """
     lang = getattr(request.state, "lang", "kk")
-    
-    # Eager load translations to avoid N+1
-    query = db.query(Dictionary).options(joinedload(Dictionary.translations)).filter(Dictionary.is_active == True)
-    
-    if type:
-        query = query.filter(Dictionary.type == type)
-    if parent_id:
-        query = query.filter(Dictionary.parent_id == parent_id)
-        
-    if q:
-        search_term = f"%{q.lower()}%"
-        # Search in default name or ANY translation
-        query = query.join(Dictionary.translations, isouter=True).filter(
-            or_(
-                Dictionary.name.ilike(search_term),
-                DictionaryTranslation.name.ilike(search_term)
-            )
-        ).distinct()
-    
-    # Сортировка по DisplayOrder (по умолчанию 0) и по названию
-    query = query.order_by(Dictionary.display_order.desc(), Dictionary.name.asc())
-    
-    result = _get_localized_items(query, lang, limit, offset)
+    entries = dictionary_cache.snapshot().items(type=type, parent_id=parent_id)
+    result = _get_localized_items(entries, lang, q, limit, offset)
     return create_response(data=result, lang=lang)
 
 @router.get("/marka")
 def get_markas(
-    request: Request, 
+    request: Request,
     q: str = None,
     limit: int = 100,
     offset: int = 0,
-    db: Session = Depends(get_db)
 ):
     """
     Получение списка марок машин с поддержкой поиска и пагинации.
     """
     lang = request.state.lang
-    query = db.query(Dictionary).options(joinedload(Dictionary.translations)).filter(
-        Dictionary.type == "MARKA", 
-        Dictionary.is_active == True
-    )
-    
-    if q:
-        search_term = f"%{q.lower()}%"
-        query = query.join(Dictionary.translations, isouter=True).filter(
-            or_(
-                Dictionary.name.ilike(search_term),
-                DictionaryTranslation.name.ilike(search_term)
-            )
-        ).distinct()
-        
-    query = query.order_by(Dictionary.display_order.desc(), Dictionary.name.asc())
-    
-    result = _get_localized_items(query, lang, limit, offset)
+    entries = dictionary_cache.snapshot().items(type="MARKA")
+    result = _get_localized_items(entries, lang, q, limit, offset)
     return create_response(data=result, lang=lang)
 
 @router.get("/model/{marka_id}")
 def get_models(
-    marka_id: int, 
-    request: Request, 
+    marka_id: int,
+    request: Request,
     q: str = None,
     limit: int = 100,
     offset: int = 0,
-    db: Session = Depends(get_db)
 ):
     """
     Получение списка моделей для конкретной марки с поддержкой поиска и пагинации.
     """
     lang = request.state.lang
-    query = db.query(Dictionary).options(joinedload(Dictionary.translations)).filter(
-        Dictionary.type == "MODEL", 
-        Dictionary.parent_id == marka_id,
-        Dictionary.is_active == True
-    )
-    
-    if q:
-        search_term = f"%{q.lower()}%"
-        query = query.join(Dictionary.translations, isouter=True).filter(
-            or_(
-                Dictionary.name.ilike(search_term),
-                DictionaryTranslation.name.ilike(search_term)
-            )
-        ).distinct()
-
-    query = query.order_by(Dictionary.display_order.desc(), Dictionary.name.asc())
-    
-    result = _get_localized_items(query, lang, limit, offset)
+    entries = dictionary_cache.snapshot().items(type="MODEL", parent_id=marka_id)
+    result = _get_localized_items(entries, lang, q, limit, offset)
     return create_response(data=result, lang=lang)
-
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, UploadFile, File, Request
-from app.services.cloudinary_service import CloudinaryService
+from app.services.media_storage import storage_for
 from app.core.responses import create_response
+from app.services.upload_executor import upload_image
 
 router = APIRouter()
 
@@ -9,7 +10,7 @@ async def upload_car_image(request: Request, file: UploadFile = File(...)):
     if not file.content_type.startswith("image/"):
         return create_response(code=400, message="File must be an image", lang=request.state.lang)
 
-    url, public_id = CloudinaryService.upload_image(file.file, folder="autopro/cars")
+    url, public_id = await upload_image(file.file, folder="autopro/cars")
     if not url:
         return create_response(code=500, message="Upload failed", lang=request.state.lang)
     
@@ -17,7 +18,7 @@ async def upload_car_image(request: Request, file: UploadFile = File(...)):
 
 @router.delete("/{image_id}")
 async def delete_car_image(request: Request, image_id: str):
-    success = CloudinaryService.delete_image(image_id)
+    success = storage_for(image_id).delete(image_id)
     if not success:
         return create_response(code=400, message="Delete failed", lang=request.state.lang)
     
@@ -0,0 +1,45 @@
+"""
+Раздача фото из локального хранилища (MEDIA_STORAGE_BACKEND=local).
+
+Подключается в main.py по MEDIA_URL_PREFIX, вне API_V1_STR. Файлы адресуются по содержимому
+и не меняются, поэтому кешируются клиентом и CDN навсегда. FileResponse отдаёт файл через
+sendfile, если сервер это поддерживает, без чтения в память процесса.
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse
+
+from app.core.responses import create_response
+from app.services.media_storage import VARIANTS, local_storage
+
+router = APIRouter()
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _file_response(path) -> FileResponse:
+    return FileResponse(path, headers={"Cache-Control": CACHE_CONTROL})
+
+
+@router.get("/{shard}/{name}")
+def get_media(shard: str, name: str, request: Request):
+    try:
+        path = local_storage.path(f"{shard}/{name}")
+    except ValueError:
+        return create_response(code=404, message="Not found", lang=request.state.lang)
+    if not path.is_file():
+        return create_response(code=404, message="Not found", lang=request.state.lang)
+    return _file_response(path)
+
+
+@router.get("/{variant}/{shard}/{name}")
+def get_media_variant(variant: str, shard: str, name: str, request: Request):
+    """Вариант под размер: при первом запросе создаётся из оригинала и сохраняется на диск."""
+    if variant not in VARIANTS:
+        return create_response(code=404, message="Not found", lang=request.state.lang)
+    try:
+        path = local_storage.variant_file(f"{shard}/{name}", variant)
+    except ValueError:
+        path = None
+    if path is None:
+        return create_response(code=404, message="Not found", lang=request.state.lang)
+    return _file_response(path)
@@ -1,21 +1,14 @@
 """Публичные настройки приложения (без авторизации)."""
-from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request
 
-from app.db.session import get_db
-from app.models import AppSetting
 from app.core.responses import create_response
+from app.services.settings_cache import settings_cache
 
 router = APIRouter()
 
 
-def _get_setting(db: Session, key: str, default: str = "") -> str:
-    row = db.query(AppSetting).filter(AppSetting.key == key).first()
-    return row.value if row else default
-
-
 @router.get("")
-def get_public_settings(request: Request, db: Session = Depends(get_db)):
+def get_public_settings(request: Request):
     """Публичный endpoint: включены ли подписки (для отображения шага подписки при добавлении объявления)."""
-    subscriptions_enabled = _get_setting(db, "subscriptions_enabled", "true").lower() == "true"
+    subscriptions_enabled = settings_cache.snapshot().subscriptions_enabled
     return create_response(data={"subscriptions_enabled": subscriptions_enabled}, lang=request.state.lang)
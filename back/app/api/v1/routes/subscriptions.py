@@ -12,10 +12,8 @@ from app.models import (
 )
 from app.schemas.subscriptions import BuySubscriptionRequest
 from app.services.tiptoppay_service import TipTopPayError, create_tiptoppay_payment
-from app.services.subscriptions_service import (
-    activate_subscription_after_success_payment,
-    get_active_subscription_for_owner,
-)
+from app.services.entitlements import get_entitlement
+from app.services.settings_cache import settings_cache
 from app.core.responses import create_response
 
 router = APIRouter()
@@ -43,17 +41,10 @@ def subscription_check(
     """
     Для страницы добавления объявления: включены ли подписки, первое ли объявление бесплатно, есть ли активная подписка, список планов.
     """
-    from app.models import AppSetting
-
-    setting = db.query(AppSetting).filter(AppSetting.key == "subscriptions_enabled").first()
-    subscriptions_enabled = setting and setting.value and setting.value.lower() == "true"
-
-    from app.services.subscriptions_service import owner_cars_count
-    current_cars = owner_cars_count(db, current_owner.id)
-    first_ad_free = subscriptions_enabled and current_cars == 0
+    subscriptions_enabled = settings_cache.snapshot().subscriptions_enabled
 
-    subscription = get_active_subscription_for_owner(db, current_owner.id)
-    has_active_subscription = subscription is not None
+    entitlement = get_entitlement(db, current_owner.id)
+    first_ad_free = subscriptions_enabled and entitlement.cars_count == 0
 
     plans = (
         db.query(SubscriptionPlan)
@@ -66,13 +57,13 @@ def subscription_check(
     return create_response(data={
         "subscriptions_enabled": subscriptions_enabled,
         "first_ad_free": first_ad_free,
-        "has_active_subscription": has_active_subscription,
-        "current_cars_count": current_cars,
+        "has_active_subscription": entitlement.has_subscription,
+        "current_cars_count": entitlement.cars_count,
         "my_subscription": {
-            "plan_name": subscription.plan.name,
-            "status": subscription.status,
-            "valid_until": subscription.valid_until.isoformat() if subscription and subscription.valid_until else None,
-        } if subscription else None,
+            "plan_name": entitlement.plan_name,
+            "status": entitlement.subscription_status,
+            "valid_until": entitlement.valid_until.isoformat() if entitlement.valid_until else None,
+        } if entitlement.has_subscription else None,
         "plans": plans_data,
     }, lang=request.state.lang)
 
@@ -82,14 +73,14 @@ def my_subscription_status(
     request: Request,
     db: Session = Depends(get_db), current_owner=Depends(get_current_owner)
 ):
-    subscription = get_active_subscription_for_owner(db, current_owner.id)
-    if not subscription:
+    entitlement = get_entitlement(db, current_owner.id)
+    if not entitlement.has_subscription:
         return create_response(data=None, lang=request.state.lang)
 
     return create_response(data={
-        "plan_name": subscription.plan.name,
-        "status": subscription.status,
-        "valid_until": subscription.valid_until.isoformat() if subscription.valid_until else None,
+        "plan_name": entitlement.plan_name,
+        "status": entitlement.subscription_status,
+        "valid_until": entitlement.valid_until.isoformat() if entitlement.valid_until else None,
     }, lang=request.state.lang)
 
 
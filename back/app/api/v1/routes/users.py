@@ -1,26 +1,33 @@
 from fastapi import APIRouter, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from app.db.session import get_db
 from app.core.security import get_current_user
 from app.models import User, UserLike, UserEvent, Car
 from app.core.responses import create_response
+from app.services.dictionary_cache import dictionary_cache
+from app.services.image_loader import load_first_images
+from app.services.image_variants import image_size_param, image_urls
+from app.services.view_counter import view_counter
 
 router = APIRouter()
 
 @router.get("/likes")
 def get_user_likes(
     request: Request,
+    image_size: str | None = Depends(image_size_param),
     current_user: User = Depends(get_current_user),
 
     db: Session = Depends(get_db)
 ):
     """Получить избранные объявления пользователя"""
-    likes = db.query(UserLike).filter(UserLike.user_id == current_user.id).all()
-    
+    likes = db.query(UserLike).options(joinedload(UserLike.car)).filter(UserLike.user_id == current_user.id).all()
+    dicts = dictionary_cache.snapshot()
+    thumbs = load_first_images(db, "CAR", [like.car_id for like in likes])
+
     result = []
     for like in likes:
         car = like.car
-        car_image = car.car_images[0].url if car and hasattr(car, 'car_images') and len(car.car_images) > 0 else None
+        car_image = thumbs[car.id].url if car and car.id in thumbs else None
         
         result.append({
             "id": like.id,
@@ -29,9 +36,9 @@ def get_user_likes(
                 "name": car.name if car else None,
                 "price_per_day": car.price_per_day if car else None,
                 "release_year": car.release_year if car else None,
-                "mark": car.mark.name if car and car.mark else None,
-                "model": car.model.name if car and car.model else None,
-                "images": [{"url": car_image}] if car_image else []
+                "mark": dicts.name(car.vehicle_mark_id) if car else None,
+                "model": dicts.name(car.vehicle_model_id) if car else None,
+                "images": [image_urls(car_image, image_size)] if car_image else []
             },
             "car_id": car.id if car else None,
             "car_name": car.name if car else None,
@@ -90,20 +97,23 @@ def get_user_events(
     request: Request,
     skip: int = 0,
     limit: int = 10,
+    image_size: str | None = Depends(image_size_param),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Получить историю событий пользователя"""
-    events = db.query(UserEvent).filter(
+    events = db.query(UserEvent).options(joinedload(UserEvent.car)).filter(
         UserEvent.user_id == current_user.id
     ).order_by(UserEvent.created_at.desc()).offset(skip).limit(limit).all()
-    
+    dicts = dictionary_cache.snapshot()
+    thumbs = load_first_images(db, "CAR", [event.car_id for event in events])
+
     result = []
     for event in events:
         car = event.car
         # Машина может быть удалена (delete_date или status DELETED) — отдаём данные для отображения ссылки серым
         car_deleted = car is None or (getattr(car, "delete_date", None) is not None) or (getattr(car, "status", None) == "DELETED")
-        car_image = car.car_images[0].url if car and hasattr(car, 'car_images') and len(car.car_images) > 0 else None
+        car_image = thumbs[car.id].url if car and car.id in thumbs else None
 
         result.append({
             "id": event.id,
@@ -113,10 +123,10 @@ def get_user_events(
                 "name": car.name if car else None,
                 "price_per_day": car.price_per_day if car else None,
                 "release_year": car.release_year if car else None,
-                "mark": car.mark.name if car and car.mark else None,
-                "model": car.model.name if car and car.model else None,
+                "mark": dicts.name(car.vehicle_mark_id) if car else None,
+                "model": dicts.name(car.vehicle_model_id) if car else None,
                 "delete_date": car.delete_date.isoformat() if car and getattr(car, "delete_date", None) else None,
-                "images": [{"url": car_image}] if car_image else []
+                "images": [image_urls(car_image, image_size)] if car_image else []
             } if car else None,
             "car_id": event.car_id,
             "car_name": car.name if car else None,
@@ -132,15 +142,8 @@ def track_car_view(
     car_id: int,
     request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
 ):
-    """Отследить просмотр объявления"""
-    event = UserEvent(
-        user_id=current_user.id,
-        car_id=car_id,
-        event_type="view"
-    )
-    db.add(event)
-    db.commit()
-    
+    """Отследить просмотр объявления (записывается в БД пачками, см. view_counter)"""
+    view_counter.record(car_id, user_id=current_user.id)
+
     return create_response(message="Просмотр зафиксирован", lang=request.state.lang)
@@ -56,6 +56,72 @@ class Settings(BaseSettings):
     WHATSAPP_ALT_API_URL: str | None = None
     WHATSAPP_ALT_API_TOKEN: str | None = None
 
+    # Как часто (сек) воркер сверяет версию кеша справочников с БД
+    DICTIONARY_CACHE_CHECK_SECONDS: int = 30
+    # Как часто воркер сверяет версию кеша настроек (app_settings)
+    APP_SETTINGS_CACHE_CHECK_SECONDS: int = 30
+
+    # Кеш фасетов каталога (/cars/facets)
+    FACETS_CACHE_TTL_SECONDS: int = 60
+    FACETS_CACHE_MAX_ENTRIES: int = 2000
+
+    # Кеш ответов GET /cars и GET /cars/{id} для анонимных запросов
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_BACKEND: str = "memory"  # memory | redis (общий для нескольких воркеров)
+    RESPONSE_CACHE_URL: str | None = None  # например, redis://localhost:6379/0
+    RESPONSE_CACHE_TTL_SECONDS: int = 30
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+
+    # Кеш прав арендодателя (подписка, лимит и число машин); TTL не дольше valid_until подписки
+    ENTITLEMENT_CACHE_TTL_SECONDS: int = 120
+    ENTITLEMENT_CACHE_MAX_ENTRIES: int = 10000
+
+    # Индекс ACTIVE-машин для подбора под заявки: как часто сверять версию с другими воркерами
+    CAR_MATCH_INDEX_CHECK_SECONDS: int = 30
+    # Фоновая досверка открытых заявок с машинами: период и размер пачки заявок
+    APPLICATION_REMATCH_INTERVAL_SECONDS: int = 600
+    APPLICATION_REMATCH_BATCH_SIZE: int = 500
+
+    # Буфер просмотров объявлений: как часто сбрасывать в БД и сколько строк в одном запросе
+    VIEW_FLUSH_INTERVAL_SECONDS: int = 10
+    VIEW_FLUSH_BATCH_SIZE: int = 1000
+
+    # Хранилище фото: cloudinary | local (файлы в MEDIA_LOCAL_DIR, отдаются по MEDIA_URL_PREFIX)
+    MEDIA_STORAGE_BACKEND: str = "cloudinary"
+    MEDIA_LOCAL_DIR: str = "media"
+    MEDIA_URL_PREFIX: str = "/media"
+    MEDIA_PUBLIC_URL: str = ""  # например, https://autopro.kz — если фронтенд на другом домене
+
+    # Ограничения загрузки фото (проверяются по мере приёма тела запроса, см. core/upload_limits.py)
+    UPLOAD_MAX_FILE_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_MAX_REQUEST_BYTES: int = 60 * 1024 * 1024
+    UPLOAD_ALLOWED_IMAGE_TYPES: str = "jpeg,png,webp,heic"  # через запятую
+
+    # Сколько загрузок в хранилище одновременно выполняет один воркер
+    UPLOAD_MAX_WORKERS: int = 8
+
+    # Фото объявлений: sync — загрузка в хранилище внутри запроса,
+    # deferred — файлы сохраняются в IMAGE_SPOOL_DIR и загружаются фоновым воркером
+    IMAGE_UPLOAD_MODE: str = "sync"
+    IMAGE_SPOOL_DIR: str = "spool/images"
+    IMAGE_UPLOAD_POLL_SECONDS: int = 2
+    IMAGE_UPLOAD_BATCH_SIZE: int = 16
+    IMAGE_UPLOAD_MAX_ATTEMPTS: int = 5
+    # Сколько фото остаются за воркером, который их взял (потом их может взять другой)
+    IMAGE_UPLOAD_LEASE_SECONDS: int = 300
+
+    # Подготовка фото объявлений перед загрузкой (размер, формат, без EXIF)
+    IMAGE_NORMALIZE_ENABLED: bool = True
+    IMAGE_MAX_DIMENSION: int = 2048
+    IMAGE_OUTPUT_FORMAT: str = "WEBP"  # WEBP | JPEG
+    IMAGE_QUALITY: int = 82
+    IMAGE_NORMALIZE_WORKERS: int = 2
+
+    # Как часто воркер разбирает outbox удалений из хранилища (media_deletions)
+    MEDIA_DELETION_INTERVAL_SECONDS: int = 30
+    # Сколько дней хранить фото удалённых машин/заявок/пользователей (python -m app.services.image_gc)
+    IMAGE_GC_RETENTION_DAYS: int = 30
+
     # Базовый URL фронтенда (для ссылок в Telegram)
     FRONTEND_BASE_URL: str | None = None  # например, https://autopro.kz или http://localhost:3000
 
@@ -29,6 +29,10 @@ MESSAGES = {
         "email_reset_only": "Сброс пароля возможен только по email",
         "upload_error": "Ошибка загрузки файла",
         "application_already_exists": "У вас уже есть активная заявка с такими параметрами",
+        "invalid_cursor": "Некорректный курсор пагинации",
+        "file_too_large": "Файл слишком большой",
+        "request_too_large": "Слишком большой объём загружаемых файлов",
+        "unsupported_image_type": "Допустимы только изображения JPEG, PNG, WebP или HEIC",
     },
     "kk": {
         "success": "Сәтті",
@@ -60,6 +64,10 @@ MESSAGES = {
         "email_reset_only": "Парольді тек email арқылы қалпына келтіруге болады",
         "upload_error": "Файлды жүктеу қатесі",
         "application_already_exists": "Сізде осындай параметрлері бар белсенді өтінім бар",
+        "invalid_cursor": "Беттеу курсоры қате",
+        "file_too_large": "Файл тым үлкен",
+        "request_too_large": "Жүктелетін файлдардың көлемі тым үлкен",
+        "unsupported_image_type": "Тек JPEG, PNG, WebP немесе HEIC суреттеріне рұқсат етіледі",
     },
     "en": {
         "success": "Success",
@@ -91,6 +99,10 @@ MESSAGES = {
         "email_reset_only": "Password reset is only possible via email",
         "upload_error": "File upload error",
         "application_already_exists": "You already have an active application with these parameters",
+        "invalid_cursor": "Invalid pagination cursor",
+        "file_too_large": "File is too large",
+        "request_too_large": "Total upload size is too large",
+        "unsupported_image_type": "Only JPEG, PNG, WebP or HEIC images are allowed",
     }
 }
 
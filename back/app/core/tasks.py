@@ -0,0 +1,63 @@
+"""
+Периодические фоновые задачи процесса (по одной петле asyncio на задачу).
+
+Сервисы регистрируют задачи при импорте, приложение запускает их в lifespan.
+Синхронные функции выполняются в пуле потоков, чтобы не блокировать event loop.
+При остановке петли отменяются, а задачи с run_on_shutdown выполняются ещё раз
+(например, чтобы сбросить буферы в БД).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from app.core.logger import logger
+
+
+@dataclass(frozen=True)
+class PeriodicTask:
+    name: str
+    interval: float
+    func: Callable[[], None]
+    run_on_shutdown: bool = False
+
+
+_registry: list[PeriodicTask] = []
+
+
+def register_periodic_task(
+    name: str,
+    interval: float,
+    func: Callable[[], None],
+    run_on_shutdown: bool = False,
+) -> None:
+    _registry.append(PeriodicTask(name, interval, func, run_on_shutdown))
+
+
+async def _run(task: PeriodicTask) -> None:
+    try:
+        await asyncio.to_thread(task.func)
+    except Exception as e:
+        logger.error(f"Periodic task {task.name} failed: {e}")
+
+
+async def _loop(task: PeriodicTask) -> None:
+    while True:
+        await asyncio.sleep(task.interval)
+        await _run(task)
+
+
+@asynccontextmanager
+async def run_periodic_tasks():
+    runners = [asyncio.create_task(_loop(task), name=task.name) for task in _registry]
+    logger.info(f"Periodic tasks started: {[task.name for task in _registry]}")
+    try:
+        yield
+    finally:
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        for task in _registry:
+            if task.run_on_shutdown:
+                await _run(task)
+        logger.info("Periodic tasks stopped")
@@ -0,0 +1,197 @@
+"""
+Ограничение загрузок фото на уровне ASGI, пока тело запроса ещё принимается.
+
+Starlette сохраняет все файлы multipart-запроса во временные файлы до вызова обработчика,
+поэтому слишком большой или не-графический файл раньше отклонялся только после полной
+загрузки (ошибкой Cloudinary). UploadLimitMiddleware пропускает каждый чанк тела через
+потоковый парсер python-multipart до того, как его получит Starlette, и прерывает приём:
+  - 413, если файл больше UPLOAD_MAX_FILE_BYTES или запрос больше UPLOAD_MAX_REQUEST_BYTES
+    (по Content-Length — сразу, без чтения тела);
+  - 415, если первые байты файла не совпадают с сигнатурой разрешённого формата.
+Принятые чанки без задержки передаются дальше — в разбор формы и затем в нормализацию фото.
+Проверяются только пути из `paths` (эндпоинты загрузки фото).
+"""
+import re
+from typing import Iterable
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.responses import create_response
+
+try:
+    from multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # pragma: no cover - python-multipart в requirements
+    MultipartParser = parse_options_header = None
+
+# Сколько первых байт файла нужно для определения формата
+SNIFF_BYTES = 16
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Формат изображения по сигнатуре: jpeg, png, gif, webp, heic или None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIF_BRANDS:
+        return "heic"
+    return None
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, message_key: str):
+        super().__init__(message_key)
+        self.status_code = status_code
+        self.message_key = message_key
+
+
+class _MultipartLimiter:
+    """Потоковая проверка тела multipart/form-data; feed() бросает UploadRejected."""
+
+    def __init__(self, boundary: bytes, max_file_bytes: int, max_request_bytes: int, allowed_types: set[str]):
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.allowed_types = allowed_types
+        self.total = 0
+        self._reset_part()
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._reset_part,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes) -> None:
+        self.total += len(chunk)
+        if self.total > self.max_request_bytes:
+            raise UploadRejected(413, "request_too_large")
+        if chunk:
+            self.parser.write(chunk)
+
+    def _reset_part(self) -> None:
+        self.headers: dict[bytes, bytes] = {}
+        self.header_field = self.header_value = b""
+        self.is_file = self.checked = False
+        self.size = 0
+        self.head = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self.header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self.header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        # Пустое поле файла в форме приходит с filename="" — его пропускают обработчики
+        self.is_file = bool(options.get(b"filename"))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self.is_file:
+            return
+        self.size += end - start
+        if self.size > self.max_file_bytes:
+            raise UploadRejected(413, "file_too_large")
+        if not self.checked:
+            self.head += data[start:min(end, start + SNIFF_BYTES)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._check_type()
+
+    def _on_part_end(self) -> None:
+        if self.is_file and self.size and not self.checked:
+            self._check_type()
+
+    def _check_type(self) -> None:
+        self.checked = True
+        if sniff_image_type(self.head) not in self.allowed_types:
+            raise UploadRejected(415, "unsupported_image_type")
+
+
+class UploadLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str],
+        max_file_bytes: int,
+        max_request_bytes: int,
+        allowed_types: Iterable[str],
+    ):
+        self.app = app
+        self.paths = re.compile("|".join(f"(?:{p})" for p in paths))
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.allowed_types = {t.strip().lower() for t in allowed_types if t.strip()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("POST", "PUT", "PATCH")
+            or not self.paths.fullmatch(scope["path"])
+            or MultipartParser is None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_type, params = parse_options_header(headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_request_bytes:
+            await self._reject(scope, receive, send, UploadRejected(413, "request_too_large"))
+            return
+
+        limiter = _MultipartLimiter(
+            params[b"boundary"], self.max_file_bytes, self.max_request_bytes, self.allowed_types
+        )
+        rejected: UploadRejected | None = None
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal rejected
+            message = await receive()
+            if message["type"] == "http.request" and rejected is None:
+                try:
+                    limiter.feed(message.get("body", b""))
+                except UploadRejected as e:
+                    # Дальше тело не читаем: разбор формы падает, ответ подменяем ниже
+                    rejected = e
+                    raise
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            if rejected is not None and not response_started:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if rejected is None or response_started:
+                raise
+        if rejected is not None and not response_started:
+            await self._reject(scope, receive, send, rejected)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, error: UploadRejected) -> None:
+        lang = scope.get("state", {}).get("lang", "kk")
+        response = create_response(code=error.status_code, message_key=error.message_key, lang=lang)
+        response.headers["Connection"] = "close"
+        await response(scope, receive, send)
@@ -0,0 +1,53 @@
+"""
+Идемпотентные изменения схемы для уже существующих баз.
+
+`Base.metadata.create_all` создаёт только отсутствующие таблицы, поэтому новые
+колонки и индексы на старых таблицах добавляются здесь. Запускается из init_db.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.logger import logger
+
+# Расширения нужны ещё до create_all (индексы с gin_trgm_ops).
+REQUIRED_EXTENSIONS = ["pg_trgm"]
+
+# Выполняются по порядку; каждое выражение должно быть безопасно при повторном запуске.
+SCHEMA_UPGRADES: list[str] = [
+    # Полнотекстовый поиск по объявлениям
+    "ALTER TABLE cars ADD COLUMN IF NOT EXISTS search_text TEXT",
+    # Каталог читается из car_listings: индексы и tsvector на cars больше не нужны
+    "DROP INDEX IF EXISTS ix_cars_active_create_date_id",
+    "DROP INDEX IF EXISTS ix_cars_active_price_id",
+    "DROP INDEX IF EXISTS ix_cars_search_vector",
+    "DROP INDEX IF EXISTS ix_cars_search_text_trgm",
+    "ALTER TABLE cars DROP COLUMN IF EXISTS search_vector",
+    # Отложенная загрузка фото
+    "ALTER TABLE images ALTER COLUMN url DROP NOT NULL",
+    "ALTER TABLE images ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'READY'",
+    "ALTER TABLE images ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE images ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP",
+    "ALTER TABLE images ADD COLUMN IF NOT EXISTS local_path VARCHAR(500)",
+    "ALTER TABLE images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+]
+
+
+def ensure_extensions(engine: Engine) -> None:
+    with engine.begin() as conn:
+        for name in REQUIRED_EXTENSIONS:
+            conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {name}"))
+
+
+def apply_schema_upgrades(engine: Engine) -> None:
+    from app.db.session import Base
+
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+    # Индексы из __table_args__ моделей, которых ещё нет в БД
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    logger.info("Schema upgrades applied")
@@ -1,10 +1,14 @@
 import sys
 import asyncio
 from app.db.session import Base, engine, SessionLocal
+from app.db.upgrades import apply_schema_upgrades, ensure_extensions
 from app import models
 from app.core.security import get_password_hash
 from app.services.dictionary_service import dictionary_service
-from app.models import AppSetting, Dictionary, User
+from app.services.car_listing_service import rebuild_car_listings
+from app.services.car_search_service import backfill_search_documents
+from app.services.owner_inbox import rebuild_owner_inbox
+from app.models import AppSetting, CarListing, Dictionary, OwnerInbox, User
 
 def init_db(recreate: bool = False) -> None:
     if recreate:
@@ -12,7 +16,9 @@ def init_db(recreate: bool = False) -> None:
         Base.metadata.drop_all(bind=engine)
     
     print("Creating tables...")
+    ensure_extensions(engine)
     Base.metadata.create_all(bind=engine)
+    apply_schema_upgrades(engine)
     
     db = SessionLocal()
     try:
@@ -44,7 +50,22 @@ def init_db(recreate: bool = False) -> None:
         if "--sync-cars" in sys.argv:
             print("Syncing marks/models (this may take 1-2 mins)...")
             asyncio.run(dictionary_service.sync_from_json(db))
-            
+
+        # 5. Поисковые документы объявлений (новые/после миграции; --reindex-search — все)
+        print("Backfilling car search documents...")
+        reindexed = backfill_search_documents(db, only_missing="--reindex-search" not in sys.argv)
+
+        # 6. Read model каталога (car_listings): при первом запуске, после переиндексации
+        #    или по --rebuild-listings (например, после массовой синхронизации справочников)
+        if "--rebuild-listings" in sys.argv or reindexed or not db.query(CarListing.car_id).first():
+            print("Rebuilding car listings...")
+            rebuild_car_listings(db)
+
+        # 7. Счётчики входящих заявок владельцев: при первом запуске или по --rebuild-owner-inbox
+        if "--rebuild-owner-inbox" in sys.argv or not db.query(OwnerInbox.owner_id).first():
+            print("Rebuilding owner inbox counters...")
+            rebuild_owner_inbox(db)
+
     finally:
         db.close()
     print("Done.")
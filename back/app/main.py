@@ -1,12 +1,26 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.router import api_router
+from app.api.v1.routes import media
 from app.core.config import settings
 from app.core.logger import setup_logging
+from app.core.tasks import run_periodic_tasks
+from app.core.upload_limits import UploadLimitMiddleware
+from app.services import media_outbox  # noqa: F401  (регистрирует фоновую задачу)
 
 setup_logging()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновые задачи (сброс буферов и т.п.); при остановке — финальный прогон
+    async with run_periodic_tasks():
+        yield
+
+
 def create_app() -> FastAPI:
     """
     Фабрика FastAPI‑приложения.
@@ -20,6 +34,17 @@ def create_app() -> FastAPI:
         openapi_url=f"{settings.API_V1_STR}/openapi.json",
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
+    )
+
+    # Эндпоинты загрузки фото; добавляется до CORS, чтобы ответы 413/415 получали CORS-заголовки
+    api = settings.API_V1_STR
+    app.add_middleware(
+        UploadLimitMiddleware,
+        paths=[f"{api}/cars", rf"{api}/cars/\d+", f"{api}/applications", f"{api}/images/upload", f"{api}/auth/avatar"],
+        max_file_bytes=settings.UPLOAD_MAX_FILE_BYTES,
+        max_request_bytes=settings.UPLOAD_MAX_REQUEST_BYTES,
+        allowed_types=settings.UPLOAD_ALLOWED_IMAGE_TYPES.split(","),
     )
 
     app.add_middleware(
@@ -48,6 +73,8 @@ def create_app() -> FastAPI:
         return response
 
     app.include_router(api_router, prefix=settings.API_V1_STR)
+    if settings.MEDIA_STORAGE_BACKEND == "local":
+        app.include_router(media.router, prefix=settings.MEDIA_URL_PREFIX, tags=["media"])
 
     return app
 
@@ -1,14 +1,15 @@
 from .user import User, CarOwner
-from .car import Car, Image, UserLike, Review
+from .car import Car, CarListing, Image, UserLike, Review
 from .dictionary import Dictionary, DictionaryTranslation
-from .application import Application, ApplicationCar, ApplicationSelectedCar
+from .application import Application, ApplicationCar, ApplicationSelectedCar, OwnerInbox
 from .payment import PaymentAccount, SubscriptionPlan, OwnerSubscription, PaymentTransaction
-from .system import UserEvent, AppSetting, OTPVerification
+from .system import UserEvent, AppSetting, OTPVerification, CacheVersion, CarMatchChange, MediaDeletion
 
 __all__ = [
     "User",
     "CarOwner",
     "Car",
+    "CarListing",
     "Image",
     "UserLike",
     "Review",
@@ -17,6 +18,7 @@ __all__ = [
     "Application",
     "ApplicationCar",
     "ApplicationSelectedCar",
+    "OwnerInbox",
     "PaymentAccount",
     "SubscriptionPlan",
     "OwnerSubscription",
@@ -24,4 +26,7 @@ __all__ = [
     "UserEvent",
     "AppSetting",
     "OTPVerification",
+    "CacheVersion",
+    "CarMatchChange",
+    "MediaDeletion",
 ]
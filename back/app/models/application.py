@@ -1,11 +1,25 @@
 from datetime import datetime
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
 
 class Application(Base):
     __tablename__ = "applications"
+    __table_args__ = (
+        # Обратный подбор машины к открытым заявкам (application_matching)
+        Index(
+            "ix_applications_open_match",
+            "city_id", "category_id", "vehicle_mark_id", "vehicle_model_id",
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        # Досверка заявок, изменённых с прошлого прохода (application_matching.sweep_open_applications)
+        Index(
+            "ix_applications_open_changed",
+            text("coalesce(update_date, create_date)"),
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
@@ -61,3 +75,13 @@ class ApplicationSelectedCar(Base):
 
     application: Mapped["Application"] = relationship("Application")
     car: Mapped["Car"] = relationship("Car")
+
+
+class OwnerInbox(Base):
+    """Счётчики заявок, совпавших с машинами владельца (см. app/services/owner_inbox.py)."""
+    __tablename__ = "owner_inbox"
+
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    unread_count: Mapped[int] = mapped_column(Integer, default=0)
+    total_count: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
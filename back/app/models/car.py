@@ -1,13 +1,27 @@
 from datetime import datetime
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text, event
+from sqlalchemy import Boolean, Computed, DateTime, ForeignKey, Index, Integer, String, Text, event, func, insert, select, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
-from app.services.cloudinary_service import CloudinaryService
+from app.models.system import MediaDeletion
 
 class Car(Base):
     __tablename__ = "cars"
-
+    __table_args__ = (
+        # Досверка заявок с машинами (application_matching.rematch_applications)
+        Index(
+            "ix_cars_active_match",
+            "city_id", "category_id", "vehicle_mark_id", "vehicle_model_id",
+            postgresql_where=text("status = 'ACTIVE' AND delete_date IS NULL"),
+        ),
+        # Досверка машин, изменённых с прошлого прохода (application_matching.sweep_open_applications)
+        Index(
+            "ix_cars_active_changed",
+            text("coalesce(update_date, create_date)"),
+            postgresql_where=text("status = 'ACTIVE' AND delete_date IS NULL"),
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255))
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -39,6 +53,9 @@ class Car(Base):
     update_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     delete_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
+    # Поисковый документ (копируется в car_listings): см. app/services/car_search_service.py
+    search_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+
     author: Mapped["User"] = relationship("User")
     car_images: Mapped[list["Image"]] = relationship(
         "Image", 
@@ -60,22 +77,106 @@ class Car(Base):
     city: Mapped["Dictionary | None"] = relationship("Dictionary", foreign_keys=[city_id])
 
 
+class CarListing(Base):
+    """
+    Read model каталога: одна плоская строка на опубликованную машину (ACTIVE, не удалена).
+    Поддерживается в той же транзакции, что меняет машину (app/services/car_events.py),
+    полная пересборка — `python -m app.init_db --rebuild-listings`.
+    """
+    __tablename__ = "car_listings"
+    __table_args__ = (
+        # Сортировки и keyset-пагинация: (create_date, car_id) для sort=new, (price_per_day, car_id) для sort=cheap
+        Index("ix_car_listings_create_date_car_id", "create_date", "car_id"),
+        Index("ix_car_listings_price_car_id", "price_per_day", "car_id"),
+        # Поиск по q: полнотекстовый (tsvector) и подстрочный (pg_trgm)
+        Index("ix_car_listings_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_car_listings_search_text_trgm", "search_text",
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+    )
+
+    car_id: Mapped[int] = mapped_column(ForeignKey("cars.id", ondelete="CASCADE"), primary_key=True)
+    name: Mapped[str] = mapped_column(String(255))
+    release_year: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    price_per_day: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    views_count: Mapped[int] = mapped_column(Integer, default=0)
+    is_top: Mapped[bool] = mapped_column(Boolean, default=False)
+    create_date: Mapped[datetime] = mapped_column(DateTime)
+
+    # Фильтры каталога (id из справочников)
+    vehicle_mark_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    vehicle_model_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    category_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    color_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    car_class_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    transmission_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    city_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+
+    # Названия по умолчанию и переводы: {"ru": {"mark": "...", "city": "..."}, "kk": {...}}
+    mark: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    model: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    category_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    car_class: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    color: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    transmission: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    city: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    names: Mapped[dict] = mapped_column(JSONB, default=dict)
+
+    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    author_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    author_address: Mapped[str | None] = mapped_column(String(500), nullable=True)
+
+    search_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', coalesce(search_text, ''))", persisted=True),
+        nullable=True,
+    )
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (
+        # Очередь отложенных загрузок (app/services/image_pipeline.py)
+        Index("ix_images_pending", "next_attempt_at", "id", postgresql_where=text("status = 'PENDING'")),
+        # Дедупликация загрузок и подсчёт ссылок на ассет в хранилище
+        Index("ix_images_content_hash", "content_hash"),
+        Index("ix_images_image_id", "image_id"),
+        # Пакетная загрузка фото сущностей (app/services/image_loader.py)
+        Index("ix_images_entity_position", "entity_type", "entity_id", "position"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    url: Mapped[str] = mapped_column(String(500))
+    url: Mapped[str | None] = mapped_column(String(500), nullable=True)  # пусто, пока фото PENDING
     image_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
     
     entity_id: Mapped[int] = mapped_column(Integer, index=True)
     entity_type: Mapped[str] = mapped_column(String(50), index=True)  # 'CAR', 'USER', 'APPLICATION'
     position: Mapped[int] = mapped_column(Integer, default=0)
 
+    # READY — загружено в хранилище; PENDING — лежит в spool и ждёт воркера; FAILED — попытки исчерпаны
+    status: Mapped[str] = mapped_column(String(20), default="READY", server_default="READY")
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    local_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    # SHA-256 нормализованного файла: одинаковые фото используют один ассет (url/image_id)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
 
 @event.listens_for(Image, 'after_delete')
 def receive_after_delete(mapper, connection, target):
-    if target.image_id:
-        CloudinaryService.delete_image(target.image_id)
+    if not target.image_id:
+        return
+    # Ассет может быть общим у нескольких строк (дедупликация) — удаляем с последней ссылкой
+    images = Image.__table__
+    still_used = connection.execute(
+        select(func.count()).select_from(images).where(images.c.image_id == target.image_id)
+    ).scalar()
+    if not still_used:
+        # Само удаление из хранилища — в фоне, после commit (app/services/media_outbox.py)
+        connection.execute(insert(MediaDeletion.__table__).values(public_id=target.image_id))
 
 
 class UserLike(Base):
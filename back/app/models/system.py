@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.session import Base
@@ -35,3 +35,40 @@ class OTPVerification(Base):
     is_used: Mapped[bool] = mapped_column(Boolean, default=False)
     expires_at: Mapped[datetime] = mapped_column(DateTime)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class CacheVersion(Base):
+    """Версии in-memory кешей (справочники, настройки) для инвалидации между воркерами."""
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CarMatchChange(Base):
+    """
+    Журнал машин, у которых изменились поля индекса подбора (app/services/car_match_index.py):
+    пишется в транзакции, меняющей машину, воркеры применяют записи к своему индексу.
+    """
+    __tablename__ = "car_match_changes"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    car_id: Mapped[int] = mapped_column(Integer)
+    # Время записи, а не начала транзакции: запись попадает в журнал непосредственно перед commit
+    changed_at: Mapped[datetime] = mapped_column(DateTime, server_default=text("clock_timestamp()"), index=True)
+
+
+class MediaDeletion(Base):
+    """
+    Outbox удалений из хранилища (Cloudinary или локальный диск): пишется в транзакции, удаляющей Image,
+    разбирается фоновым воркером (app/services/media_outbox.py).
+    """
+    __tablename__ = "media_deletions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    public_id: Mapped[str] = mapped_column(String(255))
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,68 @@
+"""
+Пакетная запись связей заявки с машинами: application_cars (совпадения) и
+application_selected_cars (выбранные автором при завершении).
+
+Вместо объекта ORM на каждую строку — один
+    INSERT ... SELECT :application_id, unnest(:car_ids) ON CONFLICT DO NOTHING
+с массивом id одним параметром: размер запроса не зависит от числа машин, дубликаты
+отсекают уникальные ограничения uq_application_car / uq_application_selected_car,
+поэтому предварительная проверка существования не нужна. Объекты в сессию не загружаются.
+Новые совпадения прибавляются к счётчикам owner_inbox владельцев машин.
+"""
+from typing import Iterable
+
+from sqlalchemy import Integer, bindparam, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+
+from app.models import ApplicationCar, ApplicationSelectedCar, Car
+from app.services.owner_inbox import add_owner_inbox_deltas, lock_owner_inbox, match_deltas
+
+
+def _car_ids_rows(application_id: int, car_ids: Iterable[int]):
+    return select(
+        literal(application_id, Integer),
+        func.unnest(bindparam("car_ids", sorted(set(car_ids)), type_=ARRAY(Integer))),
+    )
+
+
+def insert_matches(db: Session, rows) -> int:
+    """
+    INSERT в application_cars из SELECT (application_id, car_id), пропуская существующие.
+    Не делает commit. Возвращает число добавленных строк.
+    """
+    candidates = rows.subquery()
+    lock_owner_inbox(db, db.scalars(
+        select(Car.author_id).where(Car.id.in_(select(candidates.c[1]))).distinct()
+    ))
+    inserted = (
+        insert(ApplicationCar)
+        .from_select(["application_id", "car_id"], rows)
+        .on_conflict_do_nothing(index_elements=["application_id", "car_id"])
+        .returning(ApplicationCar.application_id, ApplicationCar.car_id)
+        .cte("inserted")
+    )
+    by_owner = db.execute(match_deltas(inserted)).all()
+    add_owner_inbox_deltas(db, [(owner_id, unread, total) for owner_id, _, unread, total in by_owner])
+    return sum(added for _, added, _, _ in by_owner)
+
+
+def add_application_cars(db: Session, application_id: int, car_ids: Iterable[int]) -> int:
+    """Связать заявку с машинами. Не делает commit. Возвращает число добавленных строк."""
+    car_ids = list(car_ids)
+    if not car_ids:
+        return 0
+    return insert_matches(db, _car_ids_rows(application_id, car_ids))
+
+
+def add_selected_cars(db: Session, application_id: int, car_ids: Iterable[int]) -> int:
+    """Отметить машины, выбранные автором заявки. Не делает commit. Возвращает число добавленных строк."""
+    car_ids = list(car_ids)
+    if not car_ids:
+        return 0
+    stmt = (
+        insert(ApplicationSelectedCar)
+        .from_select(["application_id", "car_id"], _car_ids_rows(application_id, car_ids))
+        .on_conflict_do_nothing(index_elements=["application_id", "car_id"])
+    )
+    return db.execute(stmt).rowcount
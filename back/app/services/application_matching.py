@@ -0,0 +1,200 @@
+"""
+Подбор машин к открытым заявкам (application_cars) вне запроса на создание заявки.
+
+Обратный подбор: машина стала ACTIVE -> открытые заявки, которым она подходит.
+Одним выражением
+    INSERT INTO application_cars ... SELECT ... FROM applications ... ON CONFLICT DO NOTHING
+находятся ACTIVE-заявки того же города (пустые категория/марка/модель заявки — любые)
+и добавляются связи; уже существующие пропускаются. Поиск идёт по частичному индексу
+ix_applications_open_match (только ACTIVE), поэтому не зависит от числа закрытых заявок.
+Авторам заявок уходит одно уведомление на человека, сколько бы заявок ни совпало.
+
+Фоновая досверка: раз в APPLICATION_REMATCH_INTERVAL_SECONDS открытые заявки и
+ACTIVE-машины, изменённые с прошлого прохода этого воркера (coalesce(update_date,
+create_date), с запасом SWEEP_OVERLAP_SECONDS на долгие транзакции; индексы
+ix_applications_open_changed и ix_cars_active_changed), проходятся пачками по
+APPLICATION_REMATCH_BATCH_SIZE (keyset по id), и для каждой пачки одним
+INSERT ... SELECT ... ON CONFLICT DO NOTHING добавляются недостающие связи. Первый проход
+после старта воркера сверяет все открытые заявки (заявки — FOR UPDATE SKIP LOCKED, воркеры
+uvicorn делят пачки между собой). Досверка догоняет то, что пропустили быстрые пути:
+отстающий индекс машин при создании заявки, прерванный запрос. Уведомления при досверке
+не отправляются.
+"""
+from datetime import datetime, timedelta
+
+from fastapi import BackgroundTasks
+from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tasks import register_periodic_task
+from app.db.session import SessionLocal
+from app.models import Application, ApplicationCar, Car, User
+from app.services.application_links import insert_matches
+from app.services.email_service import email_service
+from app.services.owner_inbox import add_owner_inbox_deltas, adds_to_inbox, lock_owner_inbox
+from app.services.whatsapp_service import whatsapp_service
+
+SWEEP_OVERLAP_SECONDS = 300
+# Начало последнего успешного прохода досверки в этом воркере (None — ещё не было)
+_last_sweep_at: datetime | None = None
+
+
+def _fits_application(city_id, category_id, vehicle_mark_id, vehicle_model_id, author_id):
+    """Условие «машина с такими полями подходит открытой заявке» (значения или колонки Car)."""
+    return and_(
+        Application.status == "ACTIVE",
+        Application.city_id == city_id,
+        Application.user_id != author_id,
+        or_(Application.category_id.is_(None), Application.category_id == category_id),
+        or_(Application.vehicle_mark_id.is_(None), Application.vehicle_mark_id == vehicle_mark_id),
+        or_(Application.vehicle_model_id.is_(None), Application.vehicle_model_id == vehicle_model_id),
+    )
+
+
+def _open_applications_for(car: Car):
+    """SELECT (id заявки, id машины) для заявок, которым подходит машина (кроме заявок её владельца)."""
+    return select(Application.id, literal(car.id)).where(
+        _fits_application(car.city_id, car.category_id, car.vehicle_mark_id, car.vehicle_model_id, car.author_id)
+    )
+
+
+def match_car_to_applications(db: Session, car: Car) -> dict[int, list[int]]:
+    """
+    Связать ACTIVE-машину с подходящими открытыми заявками. Не делает commit.
+    Возвращает {user_id автора заявки: [id заявок]} только по новым связям.
+    """
+    if car.status != "ACTIVE" or car.delete_date is not None or car.city_id is None:
+        return {}
+    db.flush()
+    lock_owner_inbox(db, [car.author_id])
+
+    inserted = (
+        insert(ApplicationCar)
+        .from_select(["application_id", "car_id"], _open_applications_for(car))
+        .on_conflict_do_nothing(index_elements=["application_id", "car_id"])
+        .returning(ApplicationCar.application_id)
+        .cte("inserted")
+    )
+    rows = db.execute(
+        select(
+            Application.user_id,
+            Application.id,
+            adds_to_inbox(car.author_id, unread=True),
+            adds_to_inbox(car.author_id),
+        ).join(inserted, inserted.c.application_id == Application.id)
+    ).all()
+
+    renters: dict[int, list[int]] = {}
+    for user_id, application_id, _, _ in rows:
+        renters.setdefault(user_id, []).append(application_id)
+    if rows:
+        add_owner_inbox_deltas(db, [(car.author_id, sum(row[2] for row in rows), sum(row[3] for row in rows))])
+        logger.info(f"Car {car.id} matched {len(rows)} open applications of {len(renters)} renters")
+    return renters
+
+
+def queue_renter_notifications(
+    background_tasks: BackgroundTasks, db: Session, car: Car, renter_ids: list[int] | set[int]
+) -> None:
+    """Одно уведомление (email и/или WhatsApp по настройкам) каждому автору совпавших заявок."""
+    if not renter_ids:
+        return
+    car_name = car.name
+    action_url = f"{settings.FRONTEND_BASE_URL}/applications"
+    text_whatsapp = (
+        f"🚗 *По вашей заявке в AutoPro появился автомобиль!*\n\n"
+        f"{car_name}\n\n"
+        f"👉 Откройте в приложении раздел 'Мои заявки', чтобы посмотреть объявление.\n\n"
+        f"_Команда AutoPro_"
+    )
+    for user in db.query(User).filter(User.id.in_(list(renter_ids)), User.delete_date.is_(None)):
+        if getattr(user, "notify_by_email", True) and user.email:
+            background_tasks.add_task(
+                email_service.send_new_car_for_application, email=user.email, car_name=car_name, action_url=action_url
+            )
+        if getattr(user, "notify_by_whatsapp", True) and user.phone_number:
+            background_tasks.add_task(whatsapp_service.send_notification, phone_number=user.phone_number, text=text_whatsapp)
+
+
+def _matching_pairs():
+    """SELECT (id заявки, id машины) для всех подходящих пар открытая заявка — ACTIVE-машина."""
+    return (
+        select(Application.id, Car.id)
+        .select_from(Application)
+        .join(Car, _fits_application(Car.city_id, Car.category_id, Car.vehicle_mark_id, Car.vehicle_model_id, Car.author_id))
+        .where(Car.status == "ACTIVE", Car.delete_date.is_(None))
+    )
+
+
+def rematch_applications(db: Session, application_ids: list[int]) -> int:
+    """Добавить заявкам все подходящие ACTIVE-машины. Не делает commit. Возвращает число новых связей."""
+    if not application_ids:
+        return 0
+    return insert_matches(db, _matching_pairs().where(Application.id.in_(application_ids)))
+
+
+def rematch_cars(db: Session, car_ids: list[int]) -> int:
+    """Связать ACTIVE-машины со всеми подходящими открытыми заявками. Не делает commit."""
+    if not car_ids:
+        return 0
+    return insert_matches(db, _matching_pairs().where(Car.id.in_(car_ids)))
+
+
+def _sweep_batches(db: Session, id_column, conditions: list, rematch, lock: bool) -> tuple[int, int]:
+    """Пройти строки пачками (keyset по id), досверяя каждую отдельной транзакцией. (новых связей, пачек)."""
+    last_id, batches, added = 0, 0, 0
+    while True:
+        query = (
+            db.query(id_column)
+            .filter(*conditions, id_column > last_id)
+            .order_by(id_column.asc())
+            .limit(settings.APPLICATION_REMATCH_BATCH_SIZE)
+        )
+        if lock:
+            query = query.with_for_update(skip_locked=True)
+        ids = [row_id for (row_id,) in query]
+        if not ids:
+            db.rollback()
+            return added, batches
+        added += rematch(db, ids)
+        db.commit()
+        last_id, batches = ids[-1], batches + 1
+
+
+def sweep_open_applications() -> int:
+    """
+    Один проход досверки: заявки и машины, изменённые с прошлого прохода (первый проход —
+    все открытые заявки). Возвращает число новых связей.
+    """
+    global _last_sweep_at
+    started = datetime.utcnow()
+    since = _last_sweep_at - timedelta(seconds=SWEEP_OVERLAP_SECONDS) if _last_sweep_at else None
+    applications = [Application.status == "ACTIVE"]
+    if since is not None:
+        applications.append(func.coalesce(Application.update_date, Application.create_date) >= since)
+    db = SessionLocal()
+    try:
+        added, batches = _sweep_batches(db, Application.id, applications, rematch_applications, lock=True)
+        if since is not None:
+            cars = [
+                Car.status == "ACTIVE",
+                Car.delete_date.is_(None),
+                func.coalesce(Car.update_date, Car.create_date) >= since,
+            ]
+            car_added, car_batches = _sweep_batches(db, Car.id, cars, rematch_cars, lock=False)
+            added, batches = added + car_added, batches + car_batches
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    _last_sweep_at = started
+    if added:
+        logger.info(f"Application re-match: {added} new matches in {batches} batches")
+    return added
+
+
+register_periodic_task("sweep_open_applications", settings.APPLICATION_REMATCH_INTERVAL_SECONDS, sweep_open_applications)
@@ -0,0 +1,29 @@
+"""
+Счётчики версий для in-memory кешей.
+
+Кеш хранит версию, с которой он загружен. Запись, меняющая исходные данные, увеличивает
+версию в той же транзакции (`bump_version`), а другие воркеры раз в несколько секунд
+сверяют её (`get_version`) и перезагружают кеш при расхождении.
+"""
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import CacheVersion
+
+
+def get_version(db: Session, name: str) -> int:
+    version = db.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
+
+
+def bump_version(db: Session, name: str) -> int:
+    """Увеличить версию кеша и вернуть новую. Вступает в силу вместе с commit вызывающей транзакции."""
+    now = datetime.utcnow()
+    stmt = insert(CacheVersion).values(name=name, version=1, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.name],
+        set_={"version": CacheVersion.version + 1, "updated_at": now},
+    )
+    return db.execute(stmt.returning(CacheVersion.version)).scalar_one()
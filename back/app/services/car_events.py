@@ -0,0 +1,65 @@
+"""
+Изменения объявлений, влияющие на публичный каталог.
+
+Обработчики машин вызывают `mark_car_changed` в той же транзакции, что меняет машину
+(до commit). Перед commit в этой же транзакции пересобираются строки read model
+car_listings, после успешного commit сбрасываются кеш ответов каталога и кеш фасетов;
+при rollback отметка просто забывается.
+
+Переименование записей справочника — `mark_dictionaries_renamed` в той же транзакции:
+поисковые документы и строки каталога пересобираются по новым названиям до commit.
+"""
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models import Car
+from app.services.car_facets_service import facets_cache
+from app.services.car_listing_service import listing_ids_for_dictionaries, sync_car_listings
+from app.services.car_search_service import refresh_search_documents
+from app.services.response_cache import CARS, response_cache
+
+_CHANGED_KEY = "changed_car_ids"
+
+
+def mark_car_changed(db: Session, car: Car) -> None:
+    mark_cars_changed(db, [car.id])
+
+
+def mark_cars_changed(db: Session, car_ids: Iterable[int]) -> None:
+    db.info.setdefault(_CHANGED_KEY, set()).update(car_ids)
+
+
+def mark_dictionaries_renamed(db: Session, dict_ids: Iterable[int]) -> None:
+    """Вызывать после dictionary_cache.invalidate, до commit."""
+    dict_ids = set(dict_ids)
+    if not dict_ids:
+        return
+    refresh_search_documents(db, dict_ids)
+    mark_cars_changed(db, listing_ids_for_dictionaries(db, dict_ids))
+
+
+def changed_car_ids(db: Session) -> set[int]:
+    """Машины, отмеченные в текущей транзакции (для других before_commit-обработчиков)."""
+    return db.info.get(_CHANGED_KEY, set())
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _sync_listings_before_commit(session: Session) -> None:
+    car_ids = session.info.get(_CHANGED_KEY)
+    if car_ids:
+        sync_car_listings(session, car_ids)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED_KEY, None):
+        response_cache.invalidate(CARS)
+        facets_cache.clear()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,107 @@
+"""
+Фасеты каталога: количество объявлений по марке, модели, городу, категории, цвету,
+классу и году выпуска с учётом тех же фильтров, что и GET /cars.
+
+Счётчики фасета считаются без его собственного фильтра: при выбранной марке в фасете
+марок видны и остальные марки с их количеством (с учётом прочих фильтров), а не нули.
+Все счётчики — один запрос к car_listings с GROUP BY GROUPING SETS: для каждого выбранного
+фасетного фильтра добавляется count(*) FILTER (остальные фильтры), WHERE отбирает строки,
+которые проходят все фильтры, кроме, может быть, одного. Результат кешируется
+на комбинацию фильтров и язык.
+"""
+from sqlalchemy import and_, func, or_, true, tuple_
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models import CarListing
+from app.services.car_listing_service import listing_conditions
+from app.services.dictionary_cache import dictionary_cache
+
+# Порядок важен: от него зависят биты в GROUPING(...)
+FACET_COLUMNS = {
+    "mark": CarListing.vehicle_mark_id,
+    "model": CarListing.vehicle_model_id,
+    "city": CarListing.city_id,
+    "category": CarListing.category_id,
+    "color": CarListing.color_id,
+    "car_class": CarListing.car_class_id,
+    "release_year": CarListing.release_year,
+}
+
+# Фасет -> параметр фильтра каталога, который он задаёт
+FACET_FILTERS = {
+    "mark": "marka_id",
+    "model": "model_id",
+    "city": "city_id",
+    "category": "category_id",
+    "color": "color_id",
+    "car_class": "car_class_id",
+    "release_year": "release_year",
+}
+
+facets_cache = TTLCache(
+    max_entries=settings.FACETS_CACHE_MAX_ENTRIES,
+    ttl=settings.FACETS_CACHE_TTL_SECONDS,
+)
+
+
+def _cache_key(lang: str, filters: dict) -> tuple:
+    normalized = tuple(sorted((k, v.strip().lower() if isinstance(v, str) else v) for k, v in filters.items() if v))
+    return lang, normalized
+
+
+def compute_facets(db: Session, lang: str, **filters) -> dict:
+    conditions = listing_conditions(**filters)
+    # Выбранные фасетные фильтры: счётчик такого фасета считается без его условия
+    own = [facet for facet, param in FACET_FILTERS.items() if param in conditions]
+
+    def all_but(param: str | None):
+        return and_(true(), *[c for name, c in conditions.items() if name != param])
+
+    counts = [func.count().filter(all_but(None))]
+    counts += [func.count().filter(all_but(FACET_FILTERS[facet])) for facet in own]
+    where = or_(*[all_but(FACET_FILTERS[facet]) for facet in own]) if own else all_but(None)
+
+    columns = list(FACET_COLUMNS.values())
+    grouping = func.grouping(*columns)
+    query = db.query(grouping, *columns, *counts).select_from(CarListing).filter(where)
+    # (mark), (model), ..., () — последний набор даёт общее количество
+    rows = query.group_by(func.grouping_sets(*[tuple_(c) for c in columns], tuple_())).all()
+
+    dicts = dictionary_cache.snapshot()
+    names = list(FACET_COLUMNS)
+    count_index = {facet: 1 + i for i, facet in enumerate(own)}
+    result: dict = {name: [] for name in names}
+    result["total"] = 0
+    last_bit = len(names) - 1
+
+    for row in rows:
+        mask, values, row_counts = row[0], row[1:1 + len(columns)], row[1 + len(columns):]
+        # Бит колонки = 0, если строка сгруппирована по ней
+        grouped = [i for i in range(len(names)) if not (mask >> (last_bit - i)) & 1]
+        if not grouped:
+            result["total"] = row_counts[0]
+            continue
+        i = grouped[0]
+        value = values[i]
+        count = row_counts[count_index.get(names[i], 0)]
+        if value is None or not count:
+            continue
+        if names[i] == "release_year":
+            result["release_year"].append({"value": value, "count": count})
+        else:
+            result[names[i]].append({"id": value, "name": dicts.name(value, lang), "count": count})
+
+    for name in names:
+        result[name].sort(key=lambda item: -item["count"])
+    return result
+
+
+def get_facets(db: Session, lang: str, **filters) -> dict:
+    key = _cache_key(lang, filters)
+    data = facets_cache.get(key)
+    if data is None:
+        data = compute_facets(db, lang, **filters)
+        facets_cache.set(key, data)
+    return data
@@ -0,0 +1,329 @@
+"""
+Слой чтения каталога объявлений (GET /cars).
+
+Каталог читается из read model `car_listings` — одна плоская строка на опубликованную
+машину с готовыми названиями из справочников (включая переводы), первым фото, автором
+и ключами сортировки. Страница каталога — это один индексированный скан одной таблицы
+(плюс COUNT для skip/limit), без JOIN-ов и дополнительных запросов.
+
+Строки поддерживаются при записи: обработчики вызывают car_events.mark_car_changed,
+а перед commit той же транзакции sync_car_listings пересобирает строки изменённых машин.
+Полная пересборка — rebuild_car_listings (`python -m app.init_db --rebuild-listings`).
+
+Кроме skip/limit поддерживается keyset-пагинация (курсор): страница строится по
+(create_date, car_id) для sort=new и по (price_per_day, car_id) для sort=cheap, поэтому
+глубокие страницы стоят столько же, сколько первая, и COUNT не выполняется.
+
+Поиск `q` и сортировка sort=relevance — см. car_search_service.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from typing import Iterable
+
+from sqlalchemy import ColumnElement, and_, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
+
+from app.core.logger import logger
+from app.models import Car, CarListing
+from app.services.car_search_service import search_filter, search_rank
+from app.services.dictionary_cache import DictionarySnapshot, dictionary_cache
+from app.services.image_variants import image_urls
+
+# Связи, которые нужны для построения строки car_listings.
+LISTING_LOAD_OPTIONS = (
+    joinedload(Car.author),
+    selectinload(Car.car_images),
+)
+
+# Поле карточки -> колонка машины со ссылкой на справочник
+LISTING_NAME_FIELDS = {
+    "mark": "vehicle_mark_id",
+    "model": "vehicle_model_id",
+    "category_name": "category_id",
+    "car_class": "car_class_id",
+    "color": "color_id",
+    "transmission": "transmission_id",
+    "city": "city_id",
+}
+
+
+def listing_conditions(
+    *,
+    city_id: int | None = None,
+    marka_id: int | None = None,
+    model_id: int | None = None,
+    release_year: int | None = None,
+    category_id: int | None = None,
+    color_id: int | None = None,
+    car_class_id: int | None = None,
+    q: str | None = None,
+) -> dict[str, ColumnElement]:
+    """Условия фильтров каталога по car_listings: {имя параметра: условие} для заданных фильтров."""
+    conditions: dict[str, ColumnElement] = {}
+    if city_id:
+        conditions["city_id"] = CarListing.city_id == city_id
+    if marka_id:
+        conditions["marka_id"] = CarListing.vehicle_mark_id == marka_id
+    if model_id:
+        conditions["model_id"] = CarListing.vehicle_model_id == model_id
+    if release_year:
+        conditions["release_year"] = CarListing.release_year == release_year
+    if category_id:
+        conditions["category_id"] = CarListing.category_id == category_id
+    if color_id:
+        conditions["color_id"] = CarListing.color_id == color_id
+    if car_class_id:
+        conditions["car_class_id"] = CarListing.car_class_id == car_class_id
+
+    if q and q.strip():
+        conditions["q"] = search_filter(q)
+    return conditions
+
+
+def filter_listings(query: Query, **filters) -> Query:
+    """Фильтры каталога по car_listings (там только опубликованные объявления)."""
+    conditions = listing_conditions(**filters)
+    return query.filter(*conditions.values()) if conditions else query
+
+
+def car_listing_item(row: CarListing, lang: str | None = None, image_size: str | None = None) -> dict:
+    """Карточка объявления для каталога из строки car_listings."""
+    names = row.names.get(lang, {}) if lang and row.names else {}
+    return {
+        "id": row.car_id,
+        "name": row.name,
+        "release_year": row.release_year,
+        "price_per_day": row.price_per_day,
+        "views_count": row.views_count,
+        "is_top": row.is_top,
+        "mark": names.get("mark", row.mark),
+        "model": names.get("model", row.model),
+        "category_name": names.get("category_name", row.category_name),
+        "car_class": names.get("car_class", row.car_class),
+        "color": names.get("color", row.color),
+        "transmission": names.get("transmission", row.transmission),
+        "images": [image_urls(row.image_url, image_size)] if row.image_url else [],
+        "city": names.get("city", row.city) or "Алматы",
+        "author": {
+            "name": row.author_name or "Без имени",
+            "address": row.author_address,
+        },
+    }
+
+
+def _listing_values(car: Car, dicts: DictionarySnapshot) -> dict:
+    names: dict[str, dict[str, str]] = {}
+    values = {}
+    for field, column in LISTING_NAME_FIELDS.items():
+        entry = dicts.get(getattr(car, column))
+        values[field] = entry.name if entry else None
+        if entry:
+            for lang, name in entry.names.items():
+                names.setdefault(lang, {})[field] = name
+
+    ready = [img for img in car.car_images if img.status == "READY"]
+    first_image = min(ready, key=lambda img: (img.position or 0, img.id), default=None)
+    return {
+        "car_id": car.id,
+        "name": car.name,
+        "release_year": car.release_year,
+        "price_per_day": car.price_per_day,
+        "views_count": car.views_count or 0,
+        "is_top": bool(car.is_top),
+        "create_date": car.create_date or datetime.utcnow(),
+        **{column: getattr(car, column) for column in LISTING_NAME_FIELDS.values()},
+        **values,
+        "names": names,
+        "image_url": first_image.url if first_image else None,
+        "author_name": car.author.name if car.author else None,
+        "author_address": car.author.address if car.author else None,
+        "search_text": car.search_text,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def sync_car_listings(db: Session, car_ids: Iterable[int]) -> None:
+    """
+    Привести строки car_listings для указанных машин в соответствие с cars:
+    опубликованные — вставить/обновить, остальные — удалить. Не делает commit.
+    """
+    car_ids = set(car_ids)
+    if not car_ids:
+        return
+    db.flush()
+    cars = (
+        db.query(Car)
+        .filter(Car.id.in_(car_ids), Car.status == "ACTIVE", Car.delete_date.is_(None))
+        .options(*LISTING_LOAD_OPTIONS)
+        .populate_existing()
+        .all()
+    )
+    if cars:
+        dicts = dictionary_cache.snapshot_for(db)
+        stmt = insert(CarListing).values([_listing_values(car, dicts) for car in cars])
+        updated = {c.name: stmt.excluded[c.name] for c in CarListing.__table__.columns
+                   if c.name != "car_id" and not c.computed}
+        db.execute(stmt.on_conflict_do_update(index_elements=[CarListing.car_id], set_=updated))
+
+    hidden = car_ids - {car.id for car in cars}
+    if hidden:
+        db.query(CarListing).filter(CarListing.car_id.in_(hidden)).delete(synchronize_session=False)
+
+
+def rebuild_car_listings(db: Session, batch_size: int = 500) -> int:
+    """Пересобрать car_listings целиком пачками по id. Возвращает число опубликованных машин."""
+    total = 0
+    last_id = 0
+    while True:
+        ids = [
+            car_id for (car_id,) in db.query(Car.id)
+            .filter(Car.id > last_id, Car.status == "ACTIVE", Car.delete_date.is_(None))
+            .order_by(Car.id.asc())
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        sync_car_listings(db, ids)
+        db.commit()
+        total += len(ids)
+        last_id = ids[-1]
+        logger.info(f"Car listings rebuilt: {total}")
+
+    # Строки машин, снятых с публикации мимо обработчиков
+    active = db.query(Car.id).filter(Car.status == "ACTIVE", Car.delete_date.is_(None))
+    removed = db.query(CarListing).filter(CarListing.car_id.notin_(active)).delete(synchronize_session=False)
+    db.commit()
+    if removed:
+        logger.info(f"Stale car listings removed: {removed}")
+    return total
+
+
+def listing_ids_for_dictionaries(db: Session, dict_ids: Iterable[int]) -> list[int]:
+    """Машины в каталоге, в строках которых есть названия этих записей справочника."""
+    dict_ids = list(dict_ids)
+    columns = [getattr(CarListing, column) for column in LISTING_NAME_FIELDS.values()]
+    return [car_id for (car_id,) in db.query(CarListing.car_id).filter(or_(*[c.in_(dict_ids) for c in columns]))]
+
+
+def listing_ids_for_author(db: Session, user_id: int) -> list[int]:
+    """Машины автора, которые сейчас есть в каталоге."""
+    return [
+        car_id for (car_id,) in db.query(CarListing.car_id)
+        .join(Car, Car.id == CarListing.car_id)
+        .filter(Car.author_id == user_id)
+    ]
+
+
+def fetch_cars_page(
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 15,
+    sort: str = "new",
+    lang: str | None = None,
+    image_size: str | None = None,
+    **filters,
+) -> tuple[list[dict], int]:
+    """Возвращает (карточки страницы, общее количество)."""
+    query = filter_listings(db.query(CarListing), **filters)
+    total = query.count()
+
+    q = filters.get("q")
+    if sort == "cheap":
+        query = query.order_by(CarListing.price_per_day.asc())
+    elif sort == "relevance" and q and q.strip():
+        query = query.order_by(search_rank(q).desc(), CarListing.create_date.desc())
+    else:
+        query = query.order_by(CarListing.create_date.desc())
+
+    rows = query.offset(skip).limit(limit).all()
+    return [car_listing_item(row, lang, image_size) for row in rows], total
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, value, car_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps({"s": sort, "v": value, "id": car_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """Возвращает (значение ключа сортировки, id) или бросает InvalidCursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["s"] != sort or not isinstance(data["id"], int):
+            raise InvalidCursor(cursor)
+        value = data["v"]
+        if sort != "cheap":
+            value = datetime.fromisoformat(value)
+        elif value is not None and not isinstance(value, int):
+            raise InvalidCursor(cursor)
+        return value, data["id"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def _after_cursor(query: Query, sort: str, value, car_id: int) -> Query:
+    if sort == "cheap":
+        # Цена может быть пустой: такие объявления идут в конце (NULLS LAST)
+        if value is None:
+            return query.filter(CarListing.price_per_day.is_(None), CarListing.car_id > car_id)
+        return query.filter(
+            or_(
+                CarListing.price_per_day > value,
+                and_(CarListing.price_per_day == value, CarListing.car_id > car_id),
+                CarListing.price_per_day.is_(None),
+            )
+        )
+    return query.filter(
+        or_(
+            CarListing.create_date < value,
+            and_(CarListing.create_date == value, CarListing.car_id < car_id),
+        )
+    )
+
+
+def fetch_cars_after(
+    db: Session,
+    *,
+    cursor: str | None = None,
+    limit: int = 15,
+    sort: str = "new",
+    lang: str | None = None,
+    image_size: str | None = None,
+    **filters,
+) -> tuple[list[dict], str | None]:
+    """
+    Keyset-страница каталога: (карточки, next_cursor).
+    Пустой cursor — первая страница; next_cursor=None — страниц больше нет.
+    """
+    sort = "cheap" if sort == "cheap" else "new"
+    query = filter_listings(db.query(CarListing), **filters)
+
+    if cursor:
+        value, car_id = decode_cursor(cursor, sort)
+        query = _after_cursor(query, sort, value, car_id)
+
+    if sort == "cheap":
+        query = query.order_by(CarListing.price_per_day.asc().nulls_last(), CarListing.car_id.asc())
+    else:
+        query = query.order_by(CarListing.create_date.desc(), CarListing.car_id.desc())
+
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        key = last.price_per_day if sort == "cheap" else last.create_date
+        next_cursor = encode_cursor(sort, key, last.car_id)
+    return [car_listing_item(row, lang, image_size) for row in rows], next_cursor
@@ -0,0 +1,233 @@
+"""
+Индекс ACTIVE-машин в памяти процесса для подбора машин под заявку.
+
+Инвертированный индекс: (поле, значение) -> множество id машин по городу, категории,
+марке и модели; для каждой машины хранится и её владелец. Подбор под заявку — пересечение
+множеств по заданным полям (пустое поле заявки = любое значение), от меньшего к большему;
+машины и их владельцы возвращаются вместе, без запросов к БД.
+
+Обновление:
+  - при flush запоминаются машины, у которых действительно изменились поля индекса,
+    владелец, статус или delete_date (остальные правки машин индекс не трогают);
+  - перед commit такие машины перечитываются и дописываются в журнал car_match_changes
+    (только INSERT — параллельные транзакции не ждут друг друга на общей строке);
+    после успешного commit изменения применяются к индексу этого воркера сразу;
+  - раз в CAR_MATCH_INDEX_CHECK_SECONDS каждый воркер перечитывает машины из записей
+    журнала с момента своей прошлой сверки (с запасом _LOG_OVERLAP_SECONDS на транзакции,
+    записавшие журнал, но закоммиченные позже) и применяет их по одной. Полностью индекс
+    загружается только при старте или если воркер отстал больше чем на срок хранения журнала.
+Поэтому индекс другого воркера может отставать на этот интервал: вызывающий код
+перепроверяет найденные машины по БД, а машины, активированные в это время, добавляет
+обратный подбор при активации.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import DateTime, cast, event, func, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tasks import register_periodic_task
+from app.db.session import SessionLocal
+from app.models import Car, CarMatchChange
+
+_CHANGED_KEY = "car_match_changed_ids"
+_STAGED_KEY = "car_match_index_staged"
+FIELDS = ("city_id", "category_id", "vehicle_mark_id", "vehicle_model_id")
+# Изменение этих атрибутов машины меняет её запись в индексе (или её присутствие в нём)
+TRACKED_ATTRS = (*FIELDS, "author_id", "status", "delete_date")
+_LOG_OVERLAP_SECONDS = 60
+_LOG_RETENTION_SECONDS = 3600
+_EMPTY: frozenset[int] = frozenset()
+
+
+class IndexedCar(NamedTuple):
+    city_id: int | None
+    category_id: int | None
+    vehicle_mark_id: int | None
+    vehicle_model_id: int | None
+    author_id: int
+
+
+def load_active_cars(db: Session, car_ids: Iterable[int] | None = None) -> dict[int, IndexedCar]:
+    """{car_id: IndexedCar} для ACTIVE неудалённых машин (всех или из car_ids)."""
+    query = db.query(Car.id, *(getattr(Car, f) for f in FIELDS), Car.author_id).filter(
+        Car.status == "ACTIVE", Car.delete_date.is_(None)
+    )
+    if car_ids is not None:
+        query = query.filter(Car.id.in_(list(car_ids)))
+    return {row[0]: IndexedCar(*row[1:]) for row in query}
+
+
+class CarMatchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cars: dict[int, IndexedCar] = {}
+        self._postings: dict[tuple[str, int], set[int]] = {}
+        # Время БД, до которого журнал car_match_changes уже применён
+        self.synced_at: datetime | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.synced_at is not None
+
+    def __len__(self) -> int:
+        return len(self._cars)
+
+    def _add(self, car_id: int, car: IndexedCar) -> None:
+        self._cars[car_id] = car
+        for field, value in zip(FIELDS, car):
+            if value is not None:
+                self._postings.setdefault((field, value), set()).add(car_id)
+
+    def _remove(self, car_id: int) -> None:
+        car = self._cars.pop(car_id, None)
+        if car is None:
+            return
+        for field, value in zip(FIELDS, car):
+            posting = self._postings.get((field, value))
+            if posting is not None:
+                posting.discard(car_id)
+                if not posting:
+                    del self._postings[(field, value)]
+
+    def replace_all(self, cars: dict[int, IndexedCar], synced_at: datetime) -> None:
+        fresh = CarMatchIndex()
+        for car_id, car in cars.items():
+            fresh._add(car_id, car)
+        with self._lock:
+            self._cars, self._postings, self.synced_at = fresh._cars, fresh._postings, synced_at
+
+    def apply(self, changes: dict[int, IndexedCar | None], synced_at: datetime | None = None) -> None:
+        """Применить изменения (None — машина больше не ACTIVE) и, если задано, время сверки."""
+        with self._lock:
+            for car_id, car in changes.items():
+                self._remove(car_id)
+                if car is not None:
+                    self._add(car_id, car)
+            if synced_at is not None:
+                self.synced_at = synced_at
+
+    def match(
+        self,
+        city_id: int | None,
+        category_id: int | None = None,
+        vehicle_mark_id: int | None = None,
+        vehicle_model_id: int | None = None,
+        exclude_author_id: int | None = None,
+    ) -> tuple[list[int], set[int]]:
+        """(id подходящих машин по возрастанию, id их владельцев)."""
+        criteria = [
+            (field, value)
+            for field, value in zip(FIELDS, (city_id, category_id, vehicle_mark_id, vehicle_model_id))
+            if value is not None
+        ]
+        with self._lock:
+            cars = self._cars
+            postings = sorted((self._postings.get(c, _EMPTY) for c in criteria), key=len)
+            if not postings:
+                found = cars.keys()
+            elif len(postings) == 1:
+                found = postings[0]
+            else:
+                found = postings[0].intersection(*postings[1:])
+            authors = {car_id: cars[car_id].author_id for car_id in found}
+        car_ids = sorted(car_id for car_id, author_id in authors.items() if author_id != exclude_author_id)
+        return car_ids, {authors[car_id] for car_id in car_ids}
+
+
+car_match_index = CarMatchIndex()
+_reload_lock = threading.Lock()
+
+
+def _db_now(db: Session) -> datetime:
+    return db.execute(select(cast(func.clock_timestamp(), DateTime))).scalar_one()
+
+
+def refresh_car_match_index(force: bool = False) -> None:
+    """
+    Применить к индексу машины из журнала с прошлой сверки; загрузить индекс целиком,
+    если он ещё не загружен, отстал больше чем на срок хранения журнала или force.
+    """
+    with _reload_lock:
+        db = SessionLocal()
+        try:
+            now = _db_now(db)
+            since = car_match_index.synced_at
+            stale = since is None or since < now - timedelta(seconds=_LOG_RETENTION_SECONDS - _LOG_OVERLAP_SECONDS)
+            if force or stale:
+                cars = load_active_cars(db)
+                car_match_index.replace_all(cars, now)
+                logger.info(f"Car match index loaded: {len(cars)} cars")
+            else:
+                car_ids = set(db.scalars(
+                    select(CarMatchChange.car_id)
+                    .where(CarMatchChange.changed_at >= since - timedelta(seconds=_LOG_OVERLAP_SECONDS))
+                    .distinct()
+                ))
+                active = load_active_cars(db, car_ids) if car_ids else {}
+                car_match_index.apply({car_id: active.get(car_id) for car_id in car_ids}, now)
+
+            # Журнал нужен только воркерам, отставшим не больше чем на срок хранения
+            db.query(CarMatchChange).filter(
+                CarMatchChange.changed_at < now - timedelta(seconds=_LOG_RETENTION_SECONDS)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def match_cars(
+    city_id: int | None,
+    category_id: int | None = None,
+    vehicle_mark_id: int | None = None,
+    vehicle_model_id: int | None = None,
+    exclude_author_id: int | None = None,
+) -> tuple[list[int], set[int]]:
+    if not car_match_index.loaded:
+        refresh_car_match_index()
+    return car_match_index.match(city_id, category_id, vehicle_mark_id, vehicle_model_id, exclude_author_id)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_after_flush(session: Session, flush_context) -> None:
+    changed = {obj.id for obj in (*session.new, *session.deleted) if isinstance(obj, Car)}
+    for obj in session.dirty:
+        if isinstance(obj, Car):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in TRACKED_ATTRS):
+                changed.add(obj.id)
+    if changed:
+        session.info.setdefault(_CHANGED_KEY, set()).update(changed)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _stage_before_commit(session: Session) -> None:
+    session.flush()
+    car_ids = session.info.pop(_CHANGED_KEY, None)
+    if not car_ids:
+        return
+    active = load_active_cars(session, car_ids)
+    session.execute(insert(CarMatchChange), [{"car_id": car_id} for car_id in sorted(car_ids)])
+    session.info[_STAGED_KEY] = {car_id: active.get(car_id) for car_id in car_ids}
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    staged = session.info.pop(_STAGED_KEY, None)
+    if staged and car_match_index.loaded:
+        car_match_index.apply(staged)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+    session.info.pop(_STAGED_KEY, None)
+
+
+register_periodic_task("refresh_car_match_index", settings.CAR_MATCH_INDEX_CHECK_SECONDS, refresh_car_match_index)
@@ -0,0 +1,121 @@
+"""
+Полнотекстовый поиск по объявлениям (параметр `q` каталога).
+
+У каждой машины хранится поисковый документ `cars.search_text`: название, описание,
+год выпуска и названия марки, модели и города на всех языках (ru/kk/en).
+Документ копируется в read model каталога `car_listings`, где Postgres поддерживает
+сгенерированную колонку `search_vector` (tsvector, GIN-индекс), а для частичных совпадений
+(`%term%`) на `search_text` есть триграммный GIN-индекс (pg_trgm).
+
+Документ зависит от названий в справочниках: после переименования марки, модели или
+города документы машин пересчитывает refresh_search_documents (см. car_events.mark_dictionaries_renamed).
+"""
+import re
+
+from typing import Iterable
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+from app.models import Car, CarListing
+from app.services.dictionary_cache import dictionary_cache
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _dictionary_names(db: Session, ids: set[int]) -> dict[int, list[str]]:
+    """{dictionary_id: [name, перевод_ru, перевод_kk, ...]} из снимка справочников (с изменениями транзакции)."""
+    dicts = dictionary_cache.snapshot_for(db)
+    return {i: dicts.by_id[i].all_names() for i in ids if i in dicts.by_id}
+
+
+def _search_text(car: Car, names: dict[int, list[str]]) -> str:
+    parts: list[str] = [car.name or "", car.description or ""]
+    if car.release_year:
+        parts.append(str(car.release_year))
+    for dict_id in (car.vehicle_mark_id, car.vehicle_model_id, car.city_id):
+        parts.extend(names.get(dict_id, []))
+    # Убираем повторы (одинаковые переводы), сохраняя порядок
+    seen = set()
+    unique = [p for p in parts if p and not (p.lower() in seen or seen.add(p.lower()))]
+    return " ".join(unique)
+
+
+def update_search_document(db: Session, car: Car) -> None:
+    """Пересчитать поисковый документ машины. Вызывать после изменения полей, до commit."""
+    ids = {i for i in (car.vehicle_mark_id, car.vehicle_model_id, car.city_id) if i}
+    car.search_text = _search_text(car, _dictionary_names(db, ids))
+
+
+def backfill_search_documents(db: Session, batch_size: int = 500, only_missing: bool = True) -> int:
+    """Заполнить search_text у существующих машин пачками по id. Возвращает число обновлённых."""
+    updated = 0
+    last_id = 0
+    while True:
+        query = db.query(Car).filter(Car.id > last_id)
+        if only_missing:
+            query = query.filter(Car.search_text.is_(None))
+        cars = query.order_by(Car.id.asc()).limit(batch_size).all()
+        if not cars:
+            break
+
+        ids = {i for c in cars for i in (c.vehicle_mark_id, c.vehicle_model_id, c.city_id) if i}
+        names = _dictionary_names(db, ids)
+        for car in cars:
+            car.search_text = _search_text(car, names)
+        db.commit()
+
+        updated += len(cars)
+        last_id = cars[-1].id
+        logger.info(f"Search documents backfilled: {updated}")
+    return updated
+
+
+def refresh_search_documents(db: Session, dict_ids: Iterable[int]) -> int:
+    """
+    Пересчитать search_text машин с маркой, моделью или городом из dict_ids
+    (после их переименования, до commit). Возвращает число машин.
+    """
+    dict_ids = list(dict_ids)
+    if not dict_ids:
+        return 0
+    cars = db.query(
+        Car.id, Car.name, Car.description, Car.release_year, Car.vehicle_mark_id, Car.vehicle_model_id, Car.city_id
+    ).filter(
+        or_(Car.vehicle_mark_id.in_(dict_ids), Car.vehicle_model_id.in_(dict_ids), Car.city_id.in_(dict_ids))
+    ).all()
+    if not cars:
+        return 0
+    ids = {i for c in cars for i in (c.vehicle_mark_id, c.vehicle_model_id, c.city_id) if i}
+    names = _dictionary_names(db, ids)
+    db.execute(update(Car), [{"id": car.id, "search_text": _search_text(car, names)} for car in cars])
+    return len(cars)
+
+
+def prefix_tsquery(q: str) -> str | None:
+    """'toyota cam' -> 'toyota:* & cam:*' (каждое слово — как префикс)."""
+    tokens = _TOKEN_RE.findall(q.lower())
+    if not tokens:
+        return None
+    return " & ".join(f"{t}:*" for t in tokens)
+
+
+def search_filter(q: str):
+    """Условие поиска: совпадение по tsvector или подстрока (обслуживается триграммным индексом)."""
+    # % и _ из запроса — обычные символы, а не шаблоны LIKE
+    term = q.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    substring = CarListing.search_text.ilike(f"%{term}%", escape="\\")
+    tsquery = prefix_tsquery(q)
+    if not tsquery:
+        return substring
+    return or_(
+        CarListing.search_vector.op("@@")(func.to_tsquery("simple", tsquery)),
+        substring,
+    )
+
+
+def search_rank(q: str):
+    """Выражение релевантности для ORDER BY."""
+    tsquery = prefix_tsquery(q) or ""
+    return func.ts_rank_cd(CarListing.search_vector, func.to_tsquery("simple", tsquery))
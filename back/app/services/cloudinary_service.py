@@ -1,4 +1,5 @@
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
 from app.core.config import settings
 
@@ -37,3 +38,12 @@ class CloudinaryService:
         except Exception as e:
             print(f"Cloudinary delete error: {e}")
             return False
+
+    @staticmethod
+    def delete_images(public_ids: list[str]) -> dict[str, str]:
+        """
+        Bulk delete (up to 100 public_ids per call).
+        Returns {public_id: status}, e.g. "deleted" or "not_found". Raises on API errors.
+        """
+        response = cloudinary.api.delete_resources(public_ids)
+        return response.get("deleted", {})
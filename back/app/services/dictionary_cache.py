@@ -0,0 +1,194 @@
+"""
+Снимок справочников (dictionaries + dictionary_translations) в памяти процесса.
+
+Снимок неизменяемый: при изменении справочников (админка, DictionaryService) версия
+увеличивается в БД, локальный снимок сбрасывается после commit, а остальные воркеры
+подхватывают новую версию не позже чем через DICTIONARY_CACHE_CHECK_SECONDS.
+В остальное время запросы к таблицам справочников не выполняются.
+
+Код, который в той же транзакции пересобирает данные по названиям (поисковые документы,
+car_listings), берёт снимок через `snapshot_for(db)`: после invalidate он читается
+из самой транзакции, поэтому переименование и пересборка сохраняются одним commit.
+"""
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.session import SessionLocal
+from app.models import Dictionary, DictionaryTranslation
+from app.services.cache_versions import bump_version, get_version
+from app.services.response_cache import CARS, response_cache
+
+CACHE_NAME = "dictionaries"
+_DIRTY_KEY = "dictionaries_changed"
+_TX_SNAPSHOT_KEY = "dictionaries_snapshot"
+
+
+class DictionaryEntry(NamedTuple):
+    id: int
+    name: str
+    code: str
+    type: str
+    parent_id: int | None
+    icon: str | None
+    color: str | None
+    display_order: int
+    is_active: bool
+    names: Mapping[str, str]  # {lang: name}
+
+    def localized(self, lang: str | None) -> str:
+        return self.names.get(lang, self.name) if lang else self.name
+
+    def all_names(self) -> list[str]:
+        return [self.name, *self.names.values()]
+
+
+class DictionarySnapshot:
+    def __init__(self, version: int, entries: Iterable[DictionaryEntry]):
+        self.version = version
+        by_id = {e.id: e for e in entries}
+        groups: dict[tuple[str, int | None], list[DictionaryEntry]] = {}
+        types: dict[str, list[DictionaryEntry]] = {}
+        for e in by_id.values():
+            groups.setdefault((e.type, e.parent_id), []).append(e)
+            types.setdefault(e.type, []).append(e)
+        self.by_id: Mapping[int, DictionaryEntry] = MappingProxyType(by_id)
+        self.by_type: Mapping[str, tuple[DictionaryEntry, ...]] = MappingProxyType(
+            {key: tuple(items) for key, items in types.items()}
+        )
+        self.by_type_parent: Mapping[tuple[str, int | None], tuple[DictionaryEntry, ...]] = MappingProxyType(
+            {key: tuple(items) for key, items in groups.items()}
+        )
+
+    def get(self, dict_id: int | None) -> DictionaryEntry | None:
+        return self.by_id.get(dict_id) if dict_id else None
+
+    def name(self, dict_id: int | None, lang: str | None = None) -> str | None:
+        entry = self.get(dict_id)
+        return entry.localized(lang) if entry else None
+
+    def items(self, type: str | None = None, parent_id: int | None = None) -> Iterable[DictionaryEntry]:
+        """Записи по типу и/или родителю (без фильтра — все)."""
+        if type and parent_id:
+            return self.by_type_parent.get((type, parent_id), ())
+        if type:
+            return self.by_type.get(type, ())
+        entries = self.by_id.values()
+        if parent_id:
+            entries = [e for e in entries if e.parent_id == parent_id]
+        return entries
+
+
+def _load(db: Session) -> DictionarySnapshot:
+    version = get_version(db, CACHE_NAME)
+    names: dict[int, dict[str, str]] = {}
+    for dict_id, lang, name in db.query(
+        DictionaryTranslation.dictionary_id, DictionaryTranslation.lang, DictionaryTranslation.name
+    ):
+        names.setdefault(dict_id, {})[lang] = name
+
+    entries = [
+        DictionaryEntry(
+            id=d.id,
+            name=d.name,
+            code=d.code,
+            type=d.type,
+            parent_id=d.parent_id,
+            icon=d.icon,
+            color=d.color,
+            display_order=d.display_order or 0,
+            is_active=bool(d.is_active),
+            names=MappingProxyType(names.get(d.id, {})),
+        )
+        for d in db.query(
+            Dictionary.id, Dictionary.name, Dictionary.code, Dictionary.type, Dictionary.parent_id,
+            Dictionary.icon, Dictionary.color, Dictionary.display_order, Dictionary.is_active,
+        )
+    ]
+    return DictionarySnapshot(version, entries)
+
+
+class DictionaryCache:
+    def __init__(self, check_interval: int):
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: DictionarySnapshot | None = None
+        self._checked_at = 0.0
+
+    def snapshot(self) -> DictionarySnapshot:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self._check_interval:
+            return snap
+
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self._check_interval:
+                return self._snapshot
+            db = SessionLocal()
+            try:
+                if self._snapshot is None or get_version(db, CACHE_NAME) != self._snapshot.version:
+                    self._snapshot = _load(db)
+                    logger.info(
+                        f"Dictionary snapshot loaded: {len(self._snapshot.by_id)} items, "
+                        f"version {self._snapshot.version}"
+                    )
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def snapshot_for(self, db: Session) -> DictionarySnapshot:
+        """Снимок с учётом изменений транзакции db (если она уже вызвала invalidate)."""
+        if not db.info.get(_DIRTY_KEY):
+            return self.snapshot()
+        snap = db.info.get(_TX_SNAPSHOT_KEY)
+        if snap is None:
+            db.flush()
+            snap = db.info[_TX_SNAPSHOT_KEY] = _load(db)
+        return snap
+
+    def invalidate(self, db: Session) -> None:
+        """
+        Вызывать в транзакции, которая меняет справочники (до commit).
+        Версия в БД увеличится вместе с commit, локальный снимок сбросится после него.
+        """
+        bump_version(db, CACHE_NAME)
+        db.info[_DIRTY_KEY] = True
+        db.info.pop(_TX_SNAPSHOT_KEY, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+dictionary_cache = DictionaryCache(settings.DICTIONARY_CACHE_CHECK_SECONDS)
+
+
+def renamed_entries(old: DictionarySnapshot, new: DictionarySnapshot) -> set[int]:
+    """id записей, которые есть в обоих снимках, но с другим названием или переводами."""
+    renamed = set()
+    for dict_id, entry in new.by_id.items():
+        before = old.by_id.get(dict_id)
+        if before is not None and (before.name, dict(before.names)) != (entry.name, dict(entry.names)):
+            renamed.add(dict_id)
+    return renamed
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _reset_after_commit(session: Session) -> None:
+    session.info.pop(_TX_SNAPSHOT_KEY, None)
+    if session.info.pop(_DIRTY_KEY, False):
+        dictionary_cache.reset()
+        # В закешированных ответах каталога — названия из справочников
+        response_cache.invalidate(CARS)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_TX_SNAPSHOT_KEY, None)
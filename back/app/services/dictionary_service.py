@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, delete
 from app.models import Dictionary, DictionaryTranslation, SubscriptionPlan, PaymentAccount
 from app.core.logger import logger
+from app.services.car_events import mark_dictionaries_renamed
+from app.services.dictionary_cache import dictionary_cache, renamed_entries
 
 class DictionaryService:
     @staticmethod
@@ -44,6 +46,7 @@ class DictionaryService:
 
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
+        before = dictionary_cache.snapshot_for(db)
 
         # 1. Загружаем все существующие коды марок и моделей одним запросом для кеша
         existing_items = db.query(Dictionary.code, Dictionary.id, Dictionary.type).filter(
@@ -93,6 +96,8 @@ class DictionaryService:
                     db.add(model)
                     cache[("MODEL", model_code)] = True
 
+        dictionary_cache.invalidate(db)
+        mark_dictionaries_renamed(db, renamed_entries(before, dictionary_cache.snapshot_for(db)))
         db.commit()
         logger.info("Синхронизация завершена успешно.")
         return True
@@ -103,6 +108,7 @@ class DictionaryService:
         if not os.path.exists(path): return False
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
+        before = dictionary_cache.snapshot_for(db)
 
         for cat in data.get("categories", []):
             self.upsert_item(
@@ -139,7 +145,10 @@ class DictionaryService:
         for acc in data.get("payment_accounts", []):
             if not db.query(PaymentAccount).filter(PaymentAccount.provider == acc["provider"]).first():
                 db.add(PaymentAccount(**acc))
-        
+
+        dictionary_cache.invalidate(db)
+        # Переименованные записи (например, город) — в поисковых документах и каталоге
+        mark_dictionaries_renamed(db, renamed_entries(before, dictionary_cache.snapshot_for(db)))
         db.commit()
         return True
 
@@ -0,0 +1,114 @@
+"""
+Права арендодателя на публикацию: активная подписка, лимит машин и их текущее количество.
+
+Entitlement собирается двумя запросами (подписка с тарифом, COUNT машин) и кешируется
+в памяти процесса на ENTITLEMENT_CACHE_TTL_SECONDS, но не дольше valid_until подписки.
+Запись, меняющая подписку или число машин (оплата, создание и удаление объявления,
+правка тарифов), вызывает `mark_entitlements_changed` до commit — записи кеша
+сбрасываются после успешного commit, как в car_events.
+
+Другие воркеры видят изменения не позже чем через TTL. Поэтому отказ из кеша
+перепроверяется по БД (см. publish_denial в create_car): после оплаты пользователь
+не получит 403 из устаревшей записи. Разрешение берётся из кеша без запросов.
+"""
+from datetime import datetime
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.subscriptions_service import get_active_subscription_for_owner, owner_cars_count
+
+_CHANGED_KEY = "changed_entitlement_owner_ids"
+# Отметка «сбросить весь кеш» (например, изменился тариф)
+ALL_OWNERS = None
+
+
+class Entitlement(NamedTuple):
+    owner_id: int
+    cars_count: int
+    subscription_id: int | None
+    subscription_status: str | None
+    plan_id: int | None
+    plan_name: str | None
+    max_cars: int | None
+    valid_until: datetime | None
+
+    @property
+    def has_subscription(self) -> bool:
+        return self.subscription_id is not None
+
+    def publish_denial(self) -> str | None:
+        """Ключ сообщения об отказе в публикации ещё одного объявления или None."""
+        # Первое объявление бесплатно (подписка не нужна)
+        if self.cars_count == 0:
+            return None
+        if not self.has_subscription:
+            return "no_subscription"
+        if self.max_cars is not None and self.cars_count >= self.max_cars:
+            return "car_limit_reached"
+        return None
+
+
+def load_entitlement(db: Session, owner_id: int) -> Entitlement:
+    subscription = get_active_subscription_for_owner(db, owner_id)
+    plan = subscription.plan if subscription else None
+    return Entitlement(
+        owner_id=owner_id,
+        cars_count=owner_cars_count(db, owner_id),
+        subscription_id=subscription.id if subscription else None,
+        subscription_status=subscription.status if subscription else None,
+        plan_id=plan.id if plan else None,
+        plan_name=plan.name if plan else None,
+        max_cars=plan.max_cars if plan else None,
+        valid_until=subscription.valid_until if subscription else None,
+    )
+
+
+_cache = TTLCache(max_entries=settings.ENTITLEMENT_CACHE_MAX_ENTRIES, ttl=settings.ENTITLEMENT_CACHE_TTL_SECONDS)
+
+
+def get_entitlement(db: Session, owner_id: int, fresh: bool = False) -> Entitlement:
+    """Entitlement из кеша; fresh=True — прочитать из БД (и обновить кеш)."""
+    if not fresh:
+        cached = _cache.get(owner_id)
+        if cached is not None:
+            return cached
+
+    entitlement = load_entitlement(db, owner_id)
+    ttl = float(settings.ENTITLEMENT_CACHE_TTL_SECONDS)
+    if entitlement.valid_until:
+        ttl = min(ttl, (entitlement.valid_until - datetime.utcnow()).total_seconds())
+    if ttl > 0 and not db.info.get(_CHANGED_KEY):
+        # В транзакции с несохранёнными изменениями значение ещё не окончательное — не кешируем
+        _cache.set(owner_id, entitlement, ttl=ttl)
+    return entitlement
+
+
+def mark_entitlements_changed(db: Session, owner_ids: Iterable[int] | None) -> None:
+    """Сбросить кеш владельцев после commit; owner_ids=ALL_OWNERS — весь кеш."""
+    changed = db.info.setdefault(_CHANGED_KEY, set())
+    if owner_ids is ALL_OWNERS:
+        changed.add(ALL_OWNERS)
+    else:
+        changed.update(owner_ids)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    owner_ids = session.info.pop(_CHANGED_KEY, None)
+    if not owner_ids:
+        return
+    if ALL_OWNERS in owner_ids:
+        _cache.clear()
+        return
+    for owner_id in owner_ids:
+        _cache.delete(owner_id)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
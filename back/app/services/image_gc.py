@@ -0,0 +1,180 @@
+"""
+Сборка мусора в таблице images.
+
+У images нет внешнего ключа (entity_id + entity_type), поэтому строки и файлы в хранилище
+остаются после удаления машин, заявок и смены аватара. GC проходит по images в порядке id
+пачками (keyset, без OFFSET) и удаляет строки, у которых:
+  - CAR: машины нет или она удалена (delete_date) раньше окна хранения;
+  - APPLICATION: заявки нет или она в статусе DELETED дольше окна хранения;
+  - USER: пользователя нет, он удалён раньше окна хранения, или это не последний аватар.
+PENDING-строки (ещё загружаются, см. image_pipeline) не трогаются.
+Ассеты, на которые больше никто не ссылается, уходят в outbox media_deletions.
+
+Запуск (из каталога back/), по умолчанию — только отчёт:
+    python -m app.services.image_gc
+    python -m app.services.image_gc --apply [--retention-days 30] [--batch-size 1000]
+"""
+import argparse
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.session import SessionLocal
+from app.models import Application, Car, Image, MediaDeletion, User
+
+
+def _orphans(db: Session, images: list[tuple[int, int, str]], cutoff: datetime) -> dict[int, str]:
+    """{image_id: причина} для пачки (id, entity_id, entity_type)."""
+    by_type: dict[str, set[int]] = {}
+    for _, entity_id, entity_type in images:
+        by_type.setdefault(entity_type, set()).add(entity_id)
+
+    cars = dict(
+        db.query(Car.id, Car.delete_date).filter(Car.id.in_(by_type.get("CAR", ())))
+    ) if "CAR" in by_type else {}
+    applications = {
+        app_id: (status, changed) for app_id, status, changed in
+        db.query(Application.id, Application.status, func.coalesce(Application.update_date, Application.create_date))
+        .filter(Application.id.in_(by_type["APPLICATION"]))
+    } if "APPLICATION" in by_type else {}
+    users = dict(
+        db.query(User.id, User.delete_date).filter(User.id.in_(by_type["USER"]))
+    ) if "USER" in by_type else {}
+    # Текущий аватар — последняя загруженная USER-картинка пользователя
+    avatars = dict(
+        db.query(Image.entity_id, func.max(Image.id))
+        .filter(Image.entity_type == "USER", Image.entity_id.in_(by_type["USER"]))
+        .group_by(Image.entity_id)
+    ) if "USER" in by_type else {}
+
+    result: dict[int, str] = {}
+    for image_id, entity_id, entity_type in images:
+        if entity_type == "CAR":
+            if entity_id not in cars:
+                result[image_id] = "car_missing"
+            elif cars[entity_id] and cars[entity_id] < cutoff:
+                result[image_id] = "car_deleted"
+        elif entity_type == "APPLICATION":
+            if entity_id not in applications:
+                result[image_id] = "application_missing"
+            else:
+                status, changed = applications[entity_id]
+                if status == "DELETED" and changed and changed < cutoff:
+                    result[image_id] = "application_deleted"
+        elif entity_type == "USER":
+            if entity_id not in users:
+                result[image_id] = "user_missing"
+            elif users[entity_id] and users[entity_id] < cutoff:
+                result[image_id] = "user_deleted"
+            elif avatars.get(entity_id) != image_id:
+                result[image_id] = "avatar_replaced"
+    return result
+
+
+def _delete_images(db: Session, image_ids: list[int]) -> int:
+    """
+    Удалить строки одним DELETE и поставить в outbox ассеты без оставшихся ссылок
+    (то же, что делает after_delete у Image, но для всей пачки сразу).
+    Возвращает число ассетов, поставленных на удаление.
+    """
+    public_ids = {
+        public_id for public_id in
+        db.execute(delete(Image).where(Image.id.in_(image_ids)).returning(Image.image_id)).scalars()
+        if public_id
+    }
+    if not public_ids:
+        return 0
+    still_used = {
+        public_id for (public_id,) in
+        db.query(Image.image_id).filter(Image.image_id.in_(public_ids)).distinct()
+    }
+    orphaned = sorted(public_ids - still_used)
+    if orphaned:
+        db.execute(insert(MediaDeletion), [{"public_id": p, "attempts": 0} for p in orphaned])
+    return len(orphaned)
+
+
+def collect_images(
+    db: Session,
+    *,
+    retention_days: int | None = None,
+    batch_size: int = 1000,
+    dry_run: bool = True,
+) -> dict:
+    """Пройти по images и удалить (или только посчитать) осиротевшие строки. Возвращает статистику."""
+    retention_days = settings.IMAGE_GC_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    started = time.monotonic()
+
+    scanned = deleted = assets = 0
+    reasons: Counter[str] = Counter()
+    sample: list[int] = []
+    last_id = 0
+    while True:
+        images = (
+            db.query(Image.id, Image.entity_id, Image.entity_type)
+            .filter(Image.id > last_id, Image.status != "PENDING")
+            .order_by(Image.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not images:
+            break
+        last_id = images[-1].id
+        scanned += len(images)
+
+        orphans = _orphans(db, images, cutoff)
+        reasons.update(orphans.values())
+        if dry_run:
+            sample.extend(list(orphans)[: max(0, 20 - len(sample))])
+            db.rollback()
+        elif orphans:
+            assets += _delete_images(db, list(orphans))
+            db.commit()
+            deleted += len(orphans)
+        else:
+            db.rollback()
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Image GC: scanned {scanned} ({scanned / elapsed:.0f} rows/s), orphans {sum(reasons.values())}")
+
+    elapsed = time.monotonic() - started
+    return {
+        "dry_run": dry_run,
+        "retention_days": retention_days,
+        "scanned": scanned,
+        "orphans": sum(reasons.values()),
+        "by_reason": dict(reasons),
+        "deleted": deleted,
+        "assets_queued": assets,
+        "sample_ids": sample if dry_run else [],
+        "elapsed_seconds": round(elapsed, 2),
+        "rows_per_second": round(scanned / elapsed) if elapsed else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Удаление осиротевших строк images и ассетов в хранилище")
+    parser.add_argument("--apply", action="store_true", help="удалять (без флага — только отчёт)")
+    parser.add_argument("--retention-days", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        stats = collect_images(
+            db, retention_days=args.retention_days, batch_size=args.batch_size, dry_run=not args.apply
+        )
+    finally:
+        db.close()
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Пакетная загрузка фото для полиморфной таблицы images (entity_type + entity_id).
+
+Вместо ленивых car.car_images / app.application_images (по запросу на каждую сущность)
+сериализаторы получают фото всех сущностей страницы одним запросом.
+Оба запроса обслуживаются индексом ix_images_entity_position (entity_type, entity_id, position).
+"""
+from typing import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+
+from app.models import Image
+
+
+def load_images(db: Session, entity_type: str, entity_ids: Iterable[int]) -> dict[int, list[Image]]:
+    """{entity_id: [Image, ...]} в порядке position. Сущности без фото в словарь не попадают."""
+    ids = set(entity_ids)
+    if not ids:
+        return {}
+    images = (
+        db.query(Image)
+        .filter(Image.entity_type == entity_type, Image.entity_id.in_(ids))
+        .order_by(Image.entity_id, Image.position, Image.id)
+        .all()
+    )
+    result: dict[int, list[Image]] = {}
+    for image in images:
+        result.setdefault(image.entity_id, []).append(image)
+    return result
+
+
+def load_first_images(db: Session, entity_type: str, entity_ids: Iterable[int]) -> dict[int, Image]:
+    """{entity_id: первое готовое фото} для списков — одна миниатюра на сущность."""
+    ids = set(entity_ids)
+    if not ids:
+        return {}
+    ranked = (
+        select(
+            Image,
+            func.row_number().over(
+                partition_by=Image.entity_id, order_by=(Image.position, Image.id)
+            ).label("rn"),
+        )
+        .where(Image.entity_type == entity_type, Image.entity_id.in_(ids), Image.status == "READY")
+        .subquery()
+    )
+    first = aliased(Image, ranked)
+    return {image.entity_id: image for image in db.query(first).filter(ranked.c.rn == 1)}
@@ -0,0 +1,125 @@
+"""
+Подготовка фото объявлений перед загрузкой: ограничение размеров, пережатие в WebP/JPEG
+и удаление метаданных (EXIF, GPS и т.п.).
+
+Декодирование и кодирование изображений занимают CPU и держат GIL, поэтому выполняются
+в пуле процессов (IMAGE_NORMALIZE_WORKERS), а не в потоках запросов.
+Если файл не удалось разобрать как изображение, он загружается как есть. Так же
+обрабатываются «декомпрессионные бомбы» — файлы, у которых пикселей больше
+PIL.Image.MAX_IMAGE_PIXELS: они не декодируются.
+"""
+import asyncio
+import io
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable
+
+from app.core.config import settings
+from app.core.logger import logger
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _undecodable_errors() -> tuple[type[Exception], ...]:
+    from PIL import Image, UnidentifiedImageError
+
+    return (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError, Image.DecompressionBombWarning)
+
+
+def _open_image(data: bytes):
+    """Image.open, который и на DecompressionBombWarning (пикселей больше лимита) отказывает исключением."""
+    from PIL import Image
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        return Image.open(io.BytesIO(data))
+
+
+def normalize_image(data: bytes, max_dimension: int, output_format: str, quality: int) -> bytes | None:
+    """
+    Вернуть нормализованное изображение или None, если data — не изображение.
+    Функция верхнего уровня: выполняется в дочернем процессе.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with _open_image(data) as img:
+            # Поворот из EXIF применяем к пикселям — сами метаданные не сохраняем
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+            if output_format == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            elif output_format == "WEBP" and img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+            out = io.BytesIO()
+            options = {"quality": quality}
+            if output_format == "JPEG":
+                options.update(optimize=True, progressive=True)
+            else:
+                options.update(method=4)
+            img.save(out, format=output_format, **options)
+            return out.getvalue()
+    except _undecodable_errors():
+        return None
+
+
+def render_variant(data: bytes, crop: str, width: int, height: int, quality: int) -> bytes | None:
+    """
+    Уменьшенная копия для локального хранилища (см. media_storage.VARIANTS) в формате оригинала.
+    crop: fill — заполнить width x height с обрезкой по центру, limit — вписать. None — не изображение.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with _open_image(data) as img:
+            output_format = img.format
+            if output_format not in ("WEBP", "JPEG", "PNG"):
+                return None
+            if crop == "fill":
+                img = ImageOps.fit(img, (width, height), Image.Resampling.LANCZOS)
+            else:
+                img.thumbnail((width, height), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format=output_format, **({} if output_format == "PNG" else {"quality": quality}))
+            return out.getvalue()
+    except _undecodable_errors():
+        return None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_NORMALIZE_WORKERS)
+    return _executor
+
+
+async def normalize_upload(file_obj: BinaryIO) -> BinaryIO:
+    """Нормализовать загруженный файл. Возвращает новый файловый объект (или исходный)."""
+    if not settings.IMAGE_NORMALIZE_ENABLED:
+        return file_obj
+
+    data = await asyncio.to_thread(file_obj.read)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        _get_executor(),
+        normalize_image,
+        data,
+        settings.IMAGE_MAX_DIMENSION,
+        settings.IMAGE_OUTPUT_FORMAT.upper(),
+        settings.IMAGE_QUALITY,
+    )
+    if result is None:
+        logger.warning(f"Image normalization skipped: not an image ({len(data)} bytes)")
+        return io.BytesIO(data)
+
+    logger.info(
+        f"Image normalized: {len(data)} -> {len(result)} bytes "
+        f"(saved {len(data) - len(result)}, {settings.IMAGE_OUTPUT_FORMAT.upper()})"
+    )
+    return io.BytesIO(result)
+
+
+async def normalize_uploads(file_objs: Iterable[BinaryIO]) -> list[BinaryIO]:
+    return await asyncio.gather(*(normalize_upload(f) for f in file_objs))
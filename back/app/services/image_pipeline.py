@@ -0,0 +1,325 @@
+"""
+Фото объявлений: загрузка сразу (IMAGE_UPLOAD_MODE=sync) или отложенная (deferred).
+
+В режиме deferred обработчик только сохраняет файлы в IMAGE_SPOOL_DIR и создаёт строки
+Image со статусом PENDING — время создания машины не зависит от числа фото.
+Фоновый воркер (периодическая задача, см. app/core/tasks.py) берёт PENDING-строки
+через SELECT ... FOR UPDATE SKIP LOCKED (воркеры uvicorn не мешают друг другу) и в той же
+короткой транзакции выдаёт на них аренду: attempts + 1 и next_attempt_at через
+IMAGE_UPLOAD_LEASE_SECONDS. После commit файлы загружаются в хранилище (media_storage)
+без открытой транзакции и блокировок, а url/image_id и статус READY записываются второй
+короткой транзакцией.
+Одинаковые фото (SHA-256 нормализованного файла, images.content_hash) загружаются
+один раз: остальные строки получают те же url/image_id.
+Неудачные попытки повторяются с экспоненциальной задержкой, после
+IMAGE_UPLOAD_MAX_ATTEMPTS фото получает статус FAILED.
+
+Восстановление после падения: очередь — это строки в БД, поэтому после перезапуска
+воркер продолжает с того же места (фото упавшего воркера снова берутся, когда истечёт аренда); файлы в spool без PENDING-строки (запрос упал
+до commit, фото удалили) периодически удаляются. Spool должен быть на диске,
+доступном всем процессам, которые обслуживают API.
+Клиент узнаёт о готовности через GET /cars/{car_id}/images.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Iterable, NamedTuple
+
+from fastapi import UploadFile
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tasks import register_periodic_task
+from app.db.session import SessionLocal
+from app.models import Car, Image
+from app.services.car_events import mark_cars_changed
+from app.services.image_normalizer import normalize_uploads
+from app.services.upload_executor import upload_images, upload_images_blocking
+
+CAR_IMAGES_FOLDER = "autopro/cars"
+SPOOL_DIR = Path(settings.IMAGE_SPOOL_DIR)
+RETRY_BASE_SECONDS = 30
+# Файлы spool без PENDING-строки старше этого возраста считаются брошенными
+ORPHAN_AGE_SECONDS = 3600
+SWEEP_INTERVAL_SECONDS = 600
+
+
+def _spool_one(file_obj: BinaryIO) -> str:
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    path = SPOOL_DIR / uuid.uuid4().hex
+    tmp = path.with_suffix(".part")
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(file_obj, f)
+    # Недописанный файл никогда не окажется под «настоящим» именем
+    os.replace(tmp, path)
+    return str(path)
+
+
+async def spool_files(file_objs: Iterable[BinaryIO]) -> list[str]:
+    return await asyncio.gather(*(asyncio.to_thread(_spool_one, f) for f in file_objs))
+
+
+def _content_hash(file_obj: BinaryIO) -> str:
+    file_obj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file_obj.read(1 << 20), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def _uploaded_by_hash(db: Session, hashes: Iterable[str]) -> dict[str, tuple[str, str]]:
+    """{content_hash: (url, image_id)} для уже загруженных в хранилище файлов."""
+    hashes = {h for h in hashes if h}
+    if not hashes:
+        return {}
+    rows = db.query(Image.content_hash, Image.url, Image.image_id).filter(
+        Image.content_hash.in_(hashes),
+        Image.status == "READY",
+        Image.image_id.isnot(None),
+    )
+    return {h: (url, image_id) for h, url, image_id in rows}
+
+
+async def add_car_images(db: Session, car: Car, files: list[UploadFile], start_position: int = 0) -> None:
+    """
+    Добавить фото к машине в режиме IMAGE_UPLOAD_MODE. Не делает commit.
+    Фото, которые уже есть в хранилище (тот же content_hash), не загружаются повторно.
+    """
+    file_objs = await normalize_uploads([photo.file for photo in files])
+    hashes = await asyncio.gather(*(asyncio.to_thread(_content_hash, f) for f in file_objs))
+    known = _uploaded_by_hash(db, hashes)
+
+    # По одному файлу на каждый новый хеш (одно фото дважды в запросе грузим один раз)
+    new_files: dict[str, BinaryIO] = {}
+    for content_hash, file_obj in zip(hashes, file_objs):
+        if content_hash not in known:
+            new_files.setdefault(content_hash, file_obj)
+    if known:
+        logger.info(f"Car {car.id}: {len(files) - len(new_files)} photos reused by content hash")
+
+    if settings.IMAGE_UPLOAD_MODE == "deferred":
+        spooled = dict(zip(new_files, await spool_files(new_files.values())))
+        for idx, content_hash in enumerate(hashes):
+            image = Image(entity_id=car.id, entity_type="CAR", position=start_position + idx, content_hash=content_hash)
+            if content_hash in known:
+                image.url, image.image_id = known[content_hash]
+            else:
+                image.status, image.local_path = "PENDING", spooled[content_hash]
+            db.add(image)
+        return
+
+    uploaded = dict(zip(new_files, await upload_images(new_files.values(), folder=CAR_IMAGES_FOLDER)))
+    for idx, content_hash in enumerate(hashes):
+        url, public_id = known.get(content_hash) or uploaded[content_hash]
+        if url:
+            db.add(Image(
+                entity_id=car.id,
+                entity_type="CAR",
+                url=url,
+                image_id=public_id,
+                position=start_position + idx,
+                content_hash=content_hash,
+            ))
+
+
+def _remove(path: str | None) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _mark_ready(img: Image, url: str, public_id: str) -> None:
+    img.url, img.image_id = url, public_id
+    img.status, img.local_path, img.next_attempt_at = "READY", None, None
+
+
+class _Claim(NamedTuple):
+    id: int
+    attempts: int
+    key: str
+    local_path: str
+
+
+def _claim_pending(db: Session, now: datetime) -> tuple[list[_Claim], list[str], int]:
+    """
+    Первая транзакция: взять до IMAGE_UPLOAD_BATCH_SIZE готовых к попытке фото и выдать
+    на них аренду (attempts + 1, next_attempt_at = now + IMAGE_UPLOAD_LEASE_SECONDS).
+    Уже загруженные по content_hash и фото без файла завершаются сразу.
+    Делает commit. Возвращает (аренды, файлы к удалению, число строк в пачке).
+    """
+    images = (
+        db.query(Image)
+        .filter(
+            Image.status == "PENDING",
+            or_(Image.next_attempt_at.is_(None), Image.next_attempt_at <= now),
+        )
+        .order_by(Image.id.asc())
+        .limit(settings.IMAGE_UPLOAD_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not images:
+        db.rollback()
+        return [], [], 0
+
+    # Тот же файл уже загружен (другой машиной или предыдущей пачкой) — берём его ассет
+    known = _uploaded_by_hash(db, {img.content_hash for img in images})
+    claims: list[_Claim] = []
+    done: list[str] = []
+    car_ids: set[int] = set()
+    for img in images:
+        if img.content_hash in known:
+            done.append(img.local_path)
+            _mark_ready(img, *known[img.content_hash])
+            car_ids.add(img.entity_id)
+        elif not img.local_path or not os.path.exists(img.local_path):
+            logger.error(f"Spooled file for image {img.id} is missing: {img.local_path}")
+            img.status = "FAILED"
+        elif (img.attempts or 0) >= settings.IMAGE_UPLOAD_MAX_ATTEMPTS:
+            # Аренда истекла после последней попытки (воркер упал во время загрузки)
+            logger.error(f"Image {img.id} upload failed after {img.attempts} attempts")
+            done.append(img.local_path)
+            img.status, img.local_path = "FAILED", None
+        else:
+            img.attempts = (img.attempts or 0) + 1
+            img.next_attempt_at = now + timedelta(seconds=settings.IMAGE_UPLOAD_LEASE_SECONDS)
+            claims.append(_Claim(img.id, img.attempts, img.content_hash or img.local_path, img.local_path))
+
+    # Первое фото в каталоге и закешированные ответы
+    mark_cars_changed(db, car_ids)
+    db.commit()
+    return claims, done, len(images)
+
+
+def _save_results(
+    db: Session, claims: list[_Claim], results: dict[str, tuple[str, str] | tuple[None, None]], now: datetime
+) -> tuple[list[str], int]:
+    """
+    Вторая транзакция: записать результаты загрузки. Строки, которые за это время удалили
+    или повторно взял другой воркер (аренда истекла — attempts уже другой), не трогаются.
+    Делает commit. Возвращает (файлы к удалению, число загруженных фото).
+    """
+    by_id = {claim.id: claim for claim in claims}
+    images = (
+        db.query(Image)
+        .filter(Image.id.in_(list(by_id)), Image.status == "PENDING")
+        .order_by(Image.id.asc())
+        .with_for_update()
+        .all()
+    )
+    done: list[str] = []
+    car_ids: set[int] = set()
+    ready = 0
+    for img in images:
+        claim = by_id[img.id]
+        if img.attempts != claim.attempts:
+            continue
+        url, public_id = results[claim.key]
+        if url:
+            done.append(img.local_path)
+            _mark_ready(img, url, public_id)
+            car_ids.add(img.entity_id)
+            ready += 1
+        elif img.attempts >= settings.IMAGE_UPLOAD_MAX_ATTEMPTS:
+            logger.error(f"Image {img.id} upload failed after {img.attempts} attempts")
+            done.append(img.local_path)
+            img.status, img.local_path, img.next_attempt_at = "FAILED", None, None
+        else:
+            img.next_attempt_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (img.attempts - 1))
+
+    mark_cars_changed(db, car_ids)
+    db.commit()
+    return done, ready
+
+
+def process_pending_images() -> None:
+    """
+    Один проход воркера: загрузить до IMAGE_UPLOAD_BATCH_SIZE фото из очереди.
+    Загрузка в хранилище идёт вне транзакции: строки удерживает аренда, а не блокировка.
+    """
+    db = SessionLocal()
+    try:
+        claims, done, batch = _claim_pending(db, datetime.utcnow())
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    for path in done:
+        _remove(path)
+    if not claims:
+        if batch:
+            logger.info(f"Pending images processed: {batch}, uploaded: 0")
+        return
+
+    # Одинаковые файлы внутри пачки загружаем один раз
+    paths: dict[str, str] = {}
+    for claim in claims:
+        paths.setdefault(claim.key, claim.local_path)
+    results = dict(zip(paths, upload_images_blocking(paths.values(), folder=CAR_IMAGES_FOLDER)))
+
+    db = SessionLocal()
+    try:
+        done, ready = _save_results(db, claims, results, datetime.utcnow())
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for path in done:
+        _remove(path)
+    logger.info(f"Pending images processed: {batch}, uploaded: {ready}")
+
+
+def sweep_spool() -> int:
+    """Удалить брошенные файлы spool. Возвращает число удалённых."""
+    if not SPOOL_DIR.exists():
+        return 0
+    cutoff = time.time() - ORPHAN_AGE_SECONDS
+    candidates = [p for p in SPOOL_DIR.iterdir() if p.is_file() and p.stat().st_mtime < cutoff]
+    if not candidates:
+        return 0
+
+    db = SessionLocal()
+    try:
+        referenced = {
+            path for (path,) in db.query(Image.local_path)
+            .filter(Image.status == "PENDING", Image.local_path.in_([str(p) for p in candidates]))
+        }
+    finally:
+        db.close()
+
+    removed = 0
+    for path in candidates:
+        if str(path) not in referenced:
+            _remove(str(path))
+            removed += 1
+    if removed:
+        logger.info(f"Orphaned spool files removed: {removed}")
+    return removed
+
+
+def car_images_status(db: Session, car_id: int) -> list[dict]:
+    images = (
+        db.query(Image)
+        .filter(Image.entity_id == car_id, Image.entity_type == "CAR")
+        .order_by(Image.position.asc(), Image.id.asc())
+        .all()
+    )
+    return [{"id": img.id, "url": img.url, "status": img.status, "position": img.position} for img in images]
+
+
+if settings.IMAGE_UPLOAD_MODE == "deferred":
+    register_periodic_task("upload_pending_images", settings.IMAGE_UPLOAD_POLL_SECONDS, process_pending_images)
+    register_periodic_task("sweep_image_spool", SWEEP_INTERVAL_SECONDS, sweep_spool)
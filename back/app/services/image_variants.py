@@ -0,0 +1,25 @@
+"""
+Варианты URL фото под размер на клиенте: thumb (списки), card (карточки), full (просмотр).
+
+Размеры вариантов и построение URL — в хранилище (media_storage): для Cloudinary это
+трансформация в URL (ресайз и формат/качество auto на CDN), для локального хранилища —
+уменьшенная копия, которая создаётся при первом запросе. Оригинал при этом не меняется.
+URL, не относящиеся ни к одному хранилищу, возвращаются без изменений.
+Клиент выбирает вариант параметром `image_size`; в ответе также есть все варианты.
+"""
+from fastapi import Query
+
+from app.services.media_storage import VARIANTS, variant_url
+
+
+def image_size_param(
+    image_size: str | None = Query(default=None, pattern="^(thumb|card|full)$"),
+) -> str | None:
+    """Зависимость для эндпоинтов с фото: какой вариант отдать в поле url."""
+    return image_size
+
+
+def image_urls(url: str | None, image_size: str | None = None) -> dict:
+    """{"url": выбранный вариант (без image_size — оригинал), "variants": {thumb, card, full}}."""
+    variants = {name: variant_url(url, name) for name in VARIANTS}
+    return {"url": variants[image_size] if image_size else url, "variants": variants}
@@ -0,0 +1,88 @@
+"""
+Удаление ассетов из хранилища (Cloudinary или локальный диск) через outbox-таблицу media_deletions.
+
+Строка добавляется в той же транзакции, что удаляет последнюю ссылку на ассет
+(after_delete у Image), поэтому запрос не ждёт Cloudinary, а откат транзакции
+отменяет и удаление. Фоновый воркер раз в MEDIA_DELETION_INTERVAL_SECONDS забирает
+до 100 записей (FOR UPDATE SKIP LOCKED), удаляет их одним bulk-вызовом на хранилище
+и повторяет неудачные с экспоненциальной задержкой.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tasks import register_periodic_task
+from app.db.session import SessionLocal
+from app.models import Image, MediaDeletion
+from app.services.media_storage import group_by_storage
+
+# Ограничение Cloudinary Admin API на один вызов delete_resources
+BATCH_SIZE = 100
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 6 * 3600
+
+
+def _retry_at(attempts: int) -> datetime:
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return datetime.utcnow() + timedelta(seconds=delay)
+
+
+def drain_media_deletions() -> int:
+    """Один проход воркера. Возвращает число удалённых ассетов."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        entries = (
+            db.query(MediaDeletion)
+            .filter(or_(MediaDeletion.next_attempt_at.is_(None), MediaDeletion.next_attempt_at <= now))
+            .order_by(MediaDeletion.id.asc())
+            .limit(BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not entries:
+            db.rollback()
+            return 0
+
+        # Пока запись ждала, ассет мог снова понадобиться (дедупликация по content_hash)
+        public_ids = {e.public_id for e in entries}
+        in_use = {
+            public_id for (public_id,) in
+            db.query(Image.image_id).filter(Image.image_id.in_(public_ids)).distinct()
+        }
+        for entry in entries:
+            if entry.public_id in in_use:
+                db.delete(entry)
+        to_delete = [e for e in entries if e.public_id not in in_use]
+
+        deleted = 0
+        statuses: dict[str, str] = {}
+        error = None
+        for storage, public_ids in group_by_storage(sorted({e.public_id for e in to_delete})).items():
+            try:
+                statuses.update(storage.delete_many(public_ids))
+            except Exception as e:
+                error = str(e)
+                logger.error(f"Media bulk delete failed ({storage.name}): {e}")
+        for entry in to_delete:
+            if statuses.get(entry.public_id) in ("deleted", "not_found"):
+                db.delete(entry)
+                deleted += 1
+            else:
+                entry.attempts = (entry.attempts or 0) + 1
+                entry.next_attempt_at = _retry_at(entry.attempts)
+                entry.last_error = error or f"status: {statuses.get(entry.public_id)}"
+
+        db.commit()
+        logger.info(f"Media deletions: {deleted} deleted, {len(to_delete) - deleted} retried, {len(in_use)} skipped")
+        return deleted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+register_periodic_task("drain_media_deletions", settings.MEDIA_DELETION_INTERVAL_SECONDS, drain_media_deletions)
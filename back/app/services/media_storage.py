@@ -0,0 +1,248 @@
+"""
+Хранилище медиафайлов: Cloudinary или локальный диск (MEDIA_STORAGE_BACKEND).
+
+Общий интерфейс MediaStorage: загрузка, удаление (одного и пачкой) и URL варианта
+под размер (thumb/card/full, см. image_variants). Код загрузок и outbox удалений
+работает через media_storage и не зависит от Cloudinary SDK.
+
+Локальное хранилище (local) кладёт файлы по содержимому:
+    {MEDIA_LOCAL_DIR}/ab/<sha256>.webp          — оригинал, public_id = "ab/<sha256>.webp"
+    {MEDIA_LOCAL_DIR}/thumb/ab/<sha256>.webp    — варианты, создаются при первом запросе
+Раскладка совпадает с URL ({MEDIA_URL_PREFIX}/...), поэтому nginx может отдавать файлы
+с того же тома напрямую (try_files), а остальное — роут app/api/v1/routes/media.py
+через FileResponse (sendfile). Одинаковые файлы хранятся один раз.
+
+Строки images, загруженные до смены бэкенда, продолжают работать: удаление и варианты
+определяют хранилище по формату public_id / URL (storage_for, variant_url).
+"""
+import hashlib
+import os
+import re
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# Варианты фото: (режим обрезки, ширина, высота); fill — по размеру с обрезкой, limit — вписать
+VARIANTS: dict[str, tuple[str, int, int]] = {
+    "thumb": ("fill", 320, 240),
+    "card": ("fill", 640, 480),
+    "full": ("limit", 1920, 1920),
+}
+
+# Сигнатуры форматов: расширение локального файла определяется по содержимому
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+def sniff_extension(head: bytes) -> str:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return ".bin"
+
+
+class MediaStorage(ABC):
+    name: str = ""
+
+    @abstractmethod
+    def upload(self, file_obj: BinaryIO | str, folder: str) -> tuple[str, str] | tuple[None, None]:
+        """Сохранить файл (объект или путь). Возвращает (url, public_id) или (None, None)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, public_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_many(self, public_ids: list[str]) -> dict[str, str]:
+        """{public_id: "deleted" | "not_found" | ...}. Ошибки API пробрасываются."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def owns_public_id(self, public_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def variant_url(self, url: str, variant: str) -> str | None:
+        """URL варианта или None, если url не из этого хранилища."""
+        raise NotImplementedError
+
+
+class CloudinaryStorage(MediaStorage):
+    """Варианты — трансформации в URL: ресайз и формат/качество auto выполняет CDN."""
+
+    name = "cloudinary"
+    _UPLOAD_URL_RE = re.compile(r"^(https?://res\.cloudinary\.com/[^/]+/image/upload/)(.+)$")
+
+    @staticmethod
+    def _service():
+        # SDK импортируется только при реальном обращении к Cloudinary
+        from app.services.cloudinary_service import CloudinaryService
+
+        return CloudinaryService
+
+    def upload(self, file_obj: BinaryIO | str, folder: str) -> tuple[str, str] | tuple[None, None]:
+        return self._service().upload_image(file_obj, folder=folder)
+
+    def delete(self, public_id: str) -> bool:
+        return self._service().delete_image(public_id)
+
+    def delete_many(self, public_ids: list[str]) -> dict[str, str]:
+        return self._service().delete_images(public_ids)
+
+    def owns_public_id(self, public_id: str) -> bool:
+        return not LocalStorage.PUBLIC_ID_RE.match(public_id)
+
+    def variant_url(self, url: str, variant: str) -> str | None:
+        match = self._UPLOAD_URL_RE.match(url)
+        if not match:
+            return None
+        crop, width, height = VARIANTS[variant]
+        return f"{match.group(1)}c_{crop},w_{width},h_{height},q_auto,f_auto/{match.group(2)}"
+
+
+class LocalStorage(MediaStorage):
+    """Файлы на диске, адресация по SHA-256 содержимого."""
+
+    name = "local"
+    PUBLIC_ID_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}\.(webp|jpg|png|gif|bin)$")
+
+    def __init__(self, root: str, url_prefix: str, public_url: str = ""):
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.base_url = f"{public_url.rstrip('/')}{self.url_prefix}"
+
+    def path(self, public_id: str, variant: str | None = None) -> Path:
+        if not self.PUBLIC_ID_RE.match(public_id) or (variant and variant not in VARIANTS):
+            raise ValueError(f"Invalid media id: {variant}/{public_id}")
+        return self.root / variant / public_id if variant else self.root / public_id
+
+    def url(self, public_id: str) -> str:
+        return f"{self.base_url}/{public_id}"
+
+    def upload(self, file_obj: BinaryIO | str, folder: str) -> tuple[str, str] | tuple[None, None]:
+        # folder не используется: имя файла определяется содержимым
+        tmp = self.root / f".{uuid.uuid4().hex}.part"
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            src = open(file_obj, "rb") if isinstance(file_obj, str) else file_obj
+            try:
+                head = src.read(16)
+                digest = hashlib.sha256(head)
+                with open(tmp, "wb") as out:
+                    out.write(head)
+                    for chunk in iter(lambda: src.read(1 << 20), b""):
+                        digest.update(chunk)
+                        out.write(chunk)
+            finally:
+                if src is not file_obj:
+                    src.close()
+
+            hexdigest = digest.hexdigest()
+            public_id = f"{hexdigest[:2]}/{hexdigest}{sniff_extension(head)}"
+            target = self.path(public_id)
+            if target.exists():
+                tmp.unlink()
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp, target)
+            return self.url(public_id), public_id
+        except Exception as e:
+            logger.error(f"Local media upload error: {e}")
+            tmp.unlink(missing_ok=True)
+            return None, None
+
+    def delete(self, public_id: str) -> bool:
+        return self.delete_many([public_id]).get(public_id) == "deleted"
+
+    def delete_many(self, public_ids: list[str]) -> dict[str, str]:
+        statuses = {}
+        for public_id in public_ids:
+            try:
+                path = self.path(public_id)
+            except ValueError:
+                statuses[public_id] = "not_found"
+                continue
+            for variant in VARIANTS:
+                self.path(public_id, variant).unlink(missing_ok=True)
+            try:
+                path.unlink()
+                statuses[public_id] = "deleted"
+            except FileNotFoundError:
+                statuses[public_id] = "not_found"
+        return statuses
+
+    def owns_public_id(self, public_id: str) -> bool:
+        return bool(self.PUBLIC_ID_RE.match(public_id))
+
+    def variant_url(self, url: str, variant: str) -> str | None:
+        prefix = f"{self.base_url}/"
+        if not url.startswith(prefix) or not self.PUBLIC_ID_RE.match(url[len(prefix):]):
+            return None
+        return f"{prefix}{variant}/{url[len(prefix):]}"
+
+    def variant_file(self, public_id: str, variant: str) -> Path | None:
+        """Путь к файлу варианта; создаётся при первом запросе. None — нет оригинала."""
+        from app.services.image_normalizer import render_variant
+
+        target = self.path(public_id, variant)
+        if target.exists():
+            return target
+        source = self.path(public_id)
+        if not source.exists():
+            return None
+
+        crop, width, height = VARIANTS[variant]
+        data = render_variant(source.read_bytes(), crop, width, height, settings.IMAGE_QUALITY)
+        if data is None:
+            # Не изображение (или формат без ресайза) — вариант совпадает с оригиналом
+            return source
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{uuid.uuid4().hex}.part")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+        return target
+
+
+cloudinary_storage = CloudinaryStorage()
+local_storage = LocalStorage(settings.MEDIA_LOCAL_DIR, settings.MEDIA_URL_PREFIX, settings.MEDIA_PUBLIC_URL)
+_BACKENDS: dict[str, MediaStorage] = {s.name: s for s in (cloudinary_storage, local_storage)}
+
+if settings.MEDIA_STORAGE_BACKEND not in _BACKENDS:
+    raise ValueError(f"Unknown MEDIA_STORAGE_BACKEND: {settings.MEDIA_STORAGE_BACKEND}")
+
+# Хранилище для новых загрузок
+media_storage: MediaStorage = _BACKENDS[settings.MEDIA_STORAGE_BACKEND]
+
+
+def storage_for(public_id: str) -> MediaStorage:
+    """Хранилище, в котором лежит ассет (по формату public_id)."""
+    return local_storage if local_storage.owns_public_id(public_id) else cloudinary_storage
+
+
+def group_by_storage(public_ids: Iterable[str]) -> dict[MediaStorage, list[str]]:
+    groups: dict[MediaStorage, list[str]] = {}
+    for public_id in public_ids:
+        groups.setdefault(storage_for(public_id), []).append(public_id)
+    return groups
+
+
+def variant_url(url: str | None, variant: str) -> str | None:
+    """URL варианта фото из любого хранилища; чужие URL возвращаются без изменений."""
+    if not url:
+        return url
+    for storage in _BACKENDS.values():
+        result = storage.variant_url(url, variant)
+        if result:
+            return result
+    return url
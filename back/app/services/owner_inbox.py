@@ -0,0 +1,239 @@
+"""
+Счётчики входящих заявок владельца (owner_inbox): сколько заявок совпало с его машинами
+и сколько из них он ещё не просмотрел. Кабинет владельца опрашивает их через
+GET /applications/to-my-ads/count — это чтение одной строки по первичному ключу.
+
+Правило подсчёта — как у прежнего подсчёта на лету: различные заявки по машинам владельца
+(unread — с непросмотренной связью), в городе владельца, если он указан.
+
+Счётчики меняются на разницу, посчитанную по строкам, которые транзакция действительно
+добавила или изменила: новые совпадения (RETURNING в insert_matches) — `match_deltas`,
+отметка о просмотре — `mark_owner_inbox_read`. Перед такой записью строки owner_inbox
+затронутых владельцев блокируются (`lock_owner_inbox`, SELECT ... FOR UPDATE в порядке id)
+до commit: параллельная транзакция с теми же владельцами ждёт, и её выражение уже видит
+закоммиченные связи, поэтому две транзакции не посчитают одну заявку дважды.
+Полный пересчёт агрегатом остаётся только для восстановления: владельцу без строки в таблице,
+при смене города (`mark_owner_inbox_changed`) и в
+`python -m app.init_db --rebuild-owner-inbox`, который заполняет и выравнивает таблицу целиком.
+Если строки ещё нет, GET считает тот же агрегат на лету без записи.
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import Integer, and_, column, distinct, event, func, literal, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from app.core.logger import logger
+from app.db.session import SessionLocal
+from app.models import Application, ApplicationCar, Car, OwnerInbox, User
+
+_CHANGED_KEY = "changed_inbox_owner_ids"
+
+
+def _counts(owner_ids: list[int]):
+    """SELECT owner_id, unread, total по владельцам (без машин и совпадений — нули)."""
+    application_id = distinct(Application.id)
+    return (
+        select(
+            User.id,
+            func.count(application_id).filter(ApplicationCar.owner_read_at.is_(None)),
+            func.count(application_id),
+        )
+        .select_from(User)
+        .outerjoin(Car, Car.author_id == User.id)
+        .outerjoin(ApplicationCar, ApplicationCar.car_id == Car.id)
+        .outerjoin(
+            Application,
+            and_(
+                Application.id == ApplicationCar.application_id,
+                or_(User.city_id.is_(None), Application.city_id == User.city_id),
+            ),
+        )
+        .where(User.id.in_(owner_ids))
+        .group_by(User.id)
+    )
+
+
+def refresh_owner_inbox(db: Session, owner_ids: Iterable[int]) -> None:
+    """Пересчитать счётчики владельцев. Не делает commit."""
+    owner_ids = sorted(set(owner_ids))
+    if not owner_ids:
+        return
+    now = datetime.utcnow()
+    # Сначала блокируем строки (в порядке id — без взаимных блокировок): агрегат следующего
+    # выражения увидит совпадения, закоммиченные параллельными транзакциями до нас
+    lock = insert(OwnerInbox).values(
+        [{"owner_id": owner_id, "unread_count": 0, "total_count": 0, "updated_at": now} for owner_id in owner_ids]
+    )
+    db.execute(lock.on_conflict_do_update(index_elements=[OwnerInbox.owner_id], set_={"updated_at": now}))
+
+    stmt = insert(OwnerInbox).from_select(
+        ["owner_id", "unread_count", "total_count", "updated_at"],
+        _counts(owner_ids).add_columns(literal(now)),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OwnerInbox.owner_id],
+        set_={"unread_count": stmt.excluded.unread_count, "total_count": stmt.excluded.total_count},
+    )
+    db.execute(stmt)
+
+
+def get_owner_inbox(db: Session, owner_id: int) -> tuple[int, int]:
+    """(unread, total) владельца: строка owner_inbox или подсчёт на лету, если её нет."""
+    row = db.query(OwnerInbox.unread_count, OwnerInbox.total_count).filter(OwnerInbox.owner_id == owner_id).first()
+    if row is None:
+        row = db.execute(_counts([owner_id])).first()
+        if row is None:
+            return 0, 0
+        return row[1], row[2]
+    return row[0], row[1]
+
+
+def _in_owner_city(owner_id):
+    owner_city = select(User.city_id).where(User.id == owner_id).scalar_subquery()
+    return or_(owner_city.is_(None), Application.city_id == owner_city)
+
+
+def adds_to_inbox(owner_id, unread: bool = False):
+    """
+    Условие для новой связи заявки (applications в FROM запроса) с машиной владельца: заявка
+    прибавляется к total (unread — к unread) — она в городе владельца, и раньше у неё не было
+    (непросмотренных) связей с его машинами. В INSERT ... RETURNING-CTE подзапрос видит
+    таблицу до вставки.
+    """
+    other, other_car = aliased(ApplicationCar), aliased(Car)
+    earlier = (
+        select(other.id)
+        .join(other_car, other_car.id == other.car_id)
+        .where(other.application_id == Application.id, other_car.author_id == owner_id)
+    )
+    if unread:
+        earlier = earlier.where(other.owner_read_at.is_(None))
+    return and_(_in_owner_city(owner_id), ~earlier.exists())
+
+
+def match_deltas(inserted):
+    """
+    SELECT owner_id, добавлено связей, +unread, +total по строкам inserted (CTE с колонками
+    application_id, car_id из INSERT ... RETURNING в application_cars).
+    """
+    application_id = distinct(Application.id)
+    return (
+        select(
+            Car.author_id,
+            func.count(),
+            func.count(application_id).filter(adds_to_inbox(Car.author_id, unread=True)),
+            func.count(application_id).filter(adds_to_inbox(Car.author_id)),
+        )
+        .select_from(inserted)
+        .join(Car, Car.id == inserted.c.car_id)
+        .join(Application, Application.id == inserted.c.application_id)
+        .group_by(Car.author_id)
+    )
+
+
+def mark_owner_inbox_read(db: Session, owner_id: int, application_id: int | None = None) -> int:
+    """
+    Отметить просмотренными связи заявок (или одной заявки) с машинами владельца и уменьшить
+    unread на число заявок, у которых это были непросмотренные связи. Не делает commit.
+    """
+    lock_owner_inbox(db, [owner_id])
+    conditions = [
+        ApplicationCar.car_id.in_(select(Car.id).where(Car.author_id == owner_id)),
+        ApplicationCar.owner_read_at.is_(None),
+    ]
+    if application_id is not None:
+        conditions.append(ApplicationCar.application_id == application_id)
+    updated = (
+        update(ApplicationCar)
+        .where(*conditions)
+        .values(owner_read_at=datetime.utcnow())
+        .returning(ApplicationCar.application_id)
+        .cte("updated")
+    )
+    # После UPDATE у этих заявок не осталось непросмотренных связей с машинами владельца
+    read = db.execute(
+        select(func.count(distinct(Application.id)))
+        .join(updated, updated.c.application_id == Application.id)
+        .where(_in_owner_city(owner_id))
+    ).scalar_one()
+    add_owner_inbox_deltas(db, [(owner_id, -read, 0)])
+    return read
+
+
+def lock_owner_inbox(db: Session, owner_ids: Iterable[int]) -> None:
+    """
+    Заблокировать строки owner_inbox владельцев до конца транзакции (в порядке id — без
+    взаимных блокировок); недостающие строки создаются пересчётом. Вызывать до изменения
+    связей, по которым считается разница для `add_owner_inbox_deltas`.
+    """
+    owner_ids = sorted(set(owner_ids))
+    if not owner_ids:
+        return
+    present = {
+        owner_id for (owner_id,) in
+        db.query(OwnerInbox.owner_id)
+        .filter(OwnerInbox.owner_id.in_(owner_ids))
+        .order_by(OwnerInbox.owner_id.asc())
+        .with_for_update()
+    }
+    refresh_owner_inbox(db, set(owner_ids) - present)
+
+
+def add_owner_inbox_deltas(db: Session, deltas: Iterable[tuple[int, int, int]]) -> None:
+    """Прибавить (owner_id, unread, total) к счётчикам, заблокированным `lock_owner_inbox`. Не делает commit."""
+    rows = [(owner_id, unread, total) for owner_id, unread, total in deltas if unread or total]
+    if not rows:
+        return
+    delta = values(
+        column("owner_id", Integer), column("unread", Integer), column("total", Integer), name="delta"
+    ).data(rows)
+    db.execute(
+        update(OwnerInbox).where(OwnerInbox.owner_id == delta.c.owner_id)
+        .values(
+            unread_count=OwnerInbox.unread_count + delta.c.unread,
+            total_count=OwnerInbox.total_count + delta.c.total,
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+def mark_owner_inbox_changed(db: Session, owner_ids: Iterable[int]) -> None:
+    """Пересчитать счётчики владельцев агрегатом при commit этой транзакции."""
+    db.info.setdefault(_CHANGED_KEY, set()).update(owner_ids)
+
+
+def rebuild_owner_inbox(db: Session, batch_size: int = 500) -> int:
+    """Пересчитать счётчики всех владельцев машин пачками. Возвращает число владельцев."""
+    total = 0
+    last_id = 0
+    while True:
+        owner_ids = [
+            owner_id for (owner_id,) in db.query(Car.author_id)
+            .filter(Car.author_id > last_id)
+            .distinct()
+            .order_by(Car.author_id.asc())
+            .limit(batch_size)
+        ]
+        if not owner_ids:
+            break
+        refresh_owner_inbox(db, owner_ids)
+        db.commit()
+        total += len(owner_ids)
+        last_id = owner_ids[-1]
+    logger.info(f"Owner inbox rebuilt: {total} owners")
+    return total
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _refresh_before_commit(session: Session) -> None:
+    owner_ids = session.info.pop(_CHANGED_KEY, None)
+    if owner_ids:
+        session.flush()
+        refresh_owner_inbox(session, owner_ids)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,108 @@
+"""
+Кеш готовых JSON-ответов для анонимных GET-запросов каталога.
+
+Ключ: пространство имён + его поколение + путь + отсортированные query-параметры + язык.
+Инвалидация — увеличение поколения пространства имён (старые ключи больше не читаются
+и вытесняются по TTL/LRU). С бэкендом memory у каждого воркера свой кеш и свои поколения,
+поэтому другие воркеры видят изменения не позже чем через RESPONSE_CACHE_TTL_SECONDS;
+для нескольких воркеров используйте RESPONSE_CACHE_BACKEND=redis.
+"""
+import threading
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+
+from app.core.cache import CacheBackend, MemoryCacheBackend, RedisCacheBackend
+from app.core.config import settings
+from app.core.logger import logger
+
+CARS = "cars"
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend | None, ttl: float):
+        self._backend = backend
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    def _count(self, namespace: str, field: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "errors": 0})
+            counters[field] += 1
+
+    def _key(self, namespace: str, request: Request) -> str:
+        generation = self._backend.get_counter(f"gen:{namespace}")
+        params = sorted((k, v.strip()) for k, v in request.query_params.multi_items())
+        lang = getattr(request.state, "lang", "kk")
+        return f"resp:{namespace}:{generation}:{request.url.path}?{urlencode(params)}|{lang}"
+
+    def get(self, namespace: str, request: Request) -> Response | None:
+        if not self.enabled:
+            return None
+        try:
+            body = self._backend.get(self._key(namespace, request))
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            self._count(namespace, "errors")
+            return None
+        if body is None:
+            self._count(namespace, "misses")
+            return None
+        self._count(namespace, "hits")
+        return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+    def store(self, namespace: str, request: Request, response: Response) -> Response:
+        """Сохранить успешный ответ. Возвращает тот же ответ с заголовком X-Cache."""
+        if not self.enabled or response.status_code != 200:
+            return response
+        try:
+            self._backend.set(self._key(namespace, request), bytes(response.body), self._ttl)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+            self._count(namespace, "errors")
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    def invalidate(self, namespace: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            self._backend.incr(f"gen:{namespace}")
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed: {e}")
+            self._count(namespace, "errors")
+
+    def stats(self) -> dict:
+        """Счётчики попаданий/промахов этого процесса по пространствам имён."""
+        with self._lock:
+            namespaces = {}
+            for namespace, counters in self._stats.items():
+                total = counters["hits"] + counters["misses"]
+                namespaces[namespace] = {
+                    **counters,
+                    "hit_ratio": round(counters["hits"] / total, 4) if total else None,
+                }
+        return {
+            "enabled": self.enabled,
+            "backend": settings.RESPONSE_CACHE_BACKEND if self.enabled else None,
+            "ttl_seconds": self._ttl,
+            "namespaces": namespaces,
+        }
+
+
+def _create_backend() -> CacheBackend | None:
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        if not settings.RESPONSE_CACHE_URL:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis требует RESPONSE_CACHE_URL")
+        return RedisCacheBackend(settings.RESPONSE_CACHE_URL)
+    return MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(_create_backend(), settings.RESPONSE_CACHE_TTL_SECONDS)
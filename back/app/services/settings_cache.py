@@ -0,0 +1,133 @@
+"""
+Настройки приложения (app_settings) в памяти процесса.
+
+Устроено как снимок справочников (dictionary_cache): снимок загружается одним запросом,
+при изменении через админку версия "app_settings" в cache_versions увеличивается в той же
+транзакции, локальный снимок сбрасывается после commit, а остальные воркеры подхватывают
+новую версию не позже чем через APP_SETTINGS_CACHE_CHECK_SECONDS.
+Значения типизируются по DEFAULTS; ключи без значения по умолчанию остаются строками.
+"""
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.session import SessionLocal
+from app.models import AppSetting
+from app.services.cache_versions import bump_version, get_version
+
+CACHE_NAME = "app_settings"
+_DIRTY_KEY = "app_settings_changed"
+
+# Известные настройки и значения, если строки в БД нет (тип значения задаёт тип настройки)
+DEFAULTS: dict[str, bool | int | str] = {
+    "subscriptions_enabled": True,
+}
+
+
+def serialize_value(value: Any) -> str:
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def parse_value(key: str, raw: str) -> Any:
+    default = DEFAULTS.get(key)
+    if isinstance(default, bool):
+        return raw.strip().lower() == "true"
+    if isinstance(default, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return default
+    return raw
+
+
+class AppSettingsSnapshot:
+    def __init__(self, version: int, raw: Mapping[str, str]):
+        self.version = version
+        self.raw: Mapping[str, str] = MappingProxyType(dict(raw))
+
+    def get(self, key: str) -> Any:
+        if key in self.raw:
+            return parse_value(key, self.raw[key])
+        return DEFAULTS.get(key)
+
+    @property
+    def subscriptions_enabled(self) -> bool:
+        return self.get("subscriptions_enabled")
+
+    def as_dict(self) -> dict[str, str]:
+        """Строковые значения для админки, включая не сохранённые настройки по умолчанию."""
+        return {**{k: serialize_value(v) for k, v in DEFAULTS.items()}, **self.raw}
+
+
+class SettingsCache:
+    def __init__(self, check_interval: int):
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: AppSettingsSnapshot | None = None
+        self._checked_at = 0.0
+
+    def snapshot(self) -> AppSettingsSnapshot:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self._check_interval:
+            return snap
+
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self._check_interval:
+                return self._snapshot
+            db = SessionLocal()
+            try:
+                version = get_version(db, CACHE_NAME)
+                if self._snapshot is None or version != self._snapshot.version:
+                    self._snapshot = AppSettingsSnapshot(version, dict(db.query(AppSetting.key, AppSetting.value)))
+                    logger.info(f"App settings loaded: {len(self._snapshot.raw)} keys, version {version}")
+            finally:
+                db.close()
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self, db: Session) -> None:
+        """Вызывать в транзакции, которая меняет app_settings (до commit)."""
+        bump_version(db, CACHE_NAME)
+        db.info[_DIRTY_KEY] = True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+settings_cache = SettingsCache(settings.APP_SETTINGS_CACHE_CHECK_SECONDS)
+
+
+def update_settings(db: Session, values: Mapping[str, Any]) -> None:
+    """Записать настройки одним INSERT ... ON CONFLICT DO UPDATE. Не делает commit."""
+    if not values:
+        return
+    now = datetime.utcnow()
+    stmt = insert(AppSetting).values(
+        [{"key": key, "value": serialize_value(value), "updated_at": now} for key, value in values.items()]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AppSetting.key],
+        set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt)
+    settings_cache.invalidate(db)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _reset_after_commit(session: Session) -> None:
+    if session.info.pop(_DIRTY_KEY, False):
+        settings_cache.reset()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
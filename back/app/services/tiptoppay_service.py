@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from app.models import PaymentAccount, PaymentTransaction, OwnerSubscription, SubscriptionPlan
 from app.core.logger import logger
+from app.services.entitlements import mark_entitlements_changed
 
 
 class TipTopPayError(Exception):
@@ -125,6 +126,7 @@ def handle_tiptoppay_callback(db: Session, payload: dict) -> bool:
                 subscription=sub,
                 is_first_subscription=not has_other,
             )
+            mark_entitlements_changed(db, [sub.owner_id])
     else:
         transaction.status = "failed"
         if transaction.subscription:
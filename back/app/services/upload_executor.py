@@ -0,0 +1,38 @@
+"""
+Загрузка изображений в хранилище (media_storage) вне event loop.
+
+Загрузка синхронная (HTTP-запрос в Cloudinary или запись на диск), поэтому
+async-обработчики отдают загрузки в общий ограниченный пул потоков: фото одного
+запроса грузятся параллельно, а суммарно по воркеру — не больше UPLOAD_MAX_WORKERS.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable
+
+from app.core.config import settings
+from app.services.media_storage import media_storage
+
+_executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_MAX_WORKERS, thread_name_prefix="upload")
+
+
+async def upload_image(file_obj: BinaryIO, folder: str) -> tuple[str, str] | tuple[None, None]:
+    """Как media_storage.upload, но не блокирует event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, media_storage.upload, file_obj, folder)
+
+
+async def upload_images(
+    file_objs: Iterable[BinaryIO], folder: str
+) -> list[tuple[str, str] | tuple[None, None]]:
+    """
+    Загрузить несколько файлов параллельно. Результаты — в порядке входных файлов;
+    для неудачных загрузок (None, None), как у upload_image.
+    """
+    return await asyncio.gather(*(upload_image(f, folder) for f in file_objs))
+
+
+def upload_images_blocking(
+    file_objs: Iterable[BinaryIO | str], folder: str
+) -> list[tuple[str, str] | tuple[None, None]]:
+    """Синхронный вариант upload_images для фоновых задач (не из event loop)."""
+    return list(_executor.map(lambda f: media_storage.upload(f, folder), file_objs))
@@ -0,0 +1,101 @@
+"""
+Буфер просмотров объявлений.
+
+POST /users/events/view/{car_id} только увеличивает счётчик в памяти процесса.
+Раз в VIEW_FLUSH_INTERVAL_SECONDS (и при штатной остановке приложения) накопленное
+записывается одной транзакцией:
+  - UPDATE cars SET views_count = views_count + v.n FROM (VALUES ...) v — пачками
+    до VIEW_FLUSH_BATCH_SIZE машин (так же для car_listings);
+  - события UserEvent — одним INSERT на пачку.
+Если запись не удалась, данные возвращаются в буфер и попадут в следующий сброс.
+"""
+import threading
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import Integer, column, func, insert, update, values
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.tasks import register_periodic_task
+from app.db.session import SessionLocal
+from app.models import Car, CarListing, UserEvent
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class ViewCounter:
+    def __init__(self, batch_size: int):
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self._counts: Counter[int] = Counter()
+        self._events: list[dict] = []
+
+    def record(self, car_id: int, user_id: int | None = None) -> None:
+        with self._lock:
+            self._counts[car_id] += 1
+            if user_id:
+                self._events.append(
+                    {"user_id": user_id, "car_id": car_id, "event_type": "view", "created_at": datetime.utcnow()}
+                )
+
+    def _take(self) -> tuple[Counter, list[dict]]:
+        with self._lock:
+            counts, events = self._counts, self._events
+            self._counts, self._events = Counter(), []
+        return counts, events
+
+    def _restore(self, counts: Counter, events: list[dict]) -> None:
+        with self._lock:
+            self._counts.update(counts)
+            self._events[:0] = events
+
+    def _write(self, counts: Counter, events: list[dict]) -> None:
+        db = SessionLocal()
+        try:
+            # Несуществующие id просто не обновятся, но для событий нужен FK на cars
+            existing: set[int] = set()
+            for chunk in _chunks(list(counts), self._batch_size):
+                existing.update(car_id for (car_id,) in db.query(Car.id).filter(Car.id.in_(chunk)))
+
+            for chunk in _chunks([(car_id, n) for car_id, n in counts.items() if car_id in existing], self._batch_size):
+                delta = values(column("car_id", Integer), column("n", Integer), name="delta").data(chunk)
+                db.execute(
+                    update(Car).where(Car.id == delta.c.car_id)
+                    .values(views_count=func.coalesce(Car.views_count, 0) + delta.c.n)
+                )
+                db.execute(
+                    update(CarListing).where(CarListing.car_id == delta.c.car_id)
+                    .values(views_count=func.coalesce(CarListing.views_count, 0) + delta.c.n)
+                )
+
+            rows = [e for e in events if e["car_id"] in existing]
+            for chunk in _chunks(rows, self._batch_size):
+                db.execute(insert(UserEvent), chunk)
+            db.commit()
+        finally:
+            db.close()
+
+    def flush(self) -> None:
+        counts, events = self._take()
+        if not counts:
+            return
+        try:
+            self._write(counts, events)
+        except Exception:
+            self._restore(counts, events)
+            raise
+        logger.info(f"Views flushed: {sum(counts.values())} views of {len(counts)} cars, {len(events)} events")
+
+
+view_counter = ViewCounter(settings.VIEW_FLUSH_BATCH_SIZE)
+
+register_periodic_task(
+    "flush_car_views",
+    settings.VIEW_FLUSH_INTERVAL_SECONDS,
+    view_counter.flush,
+    run_on_shutdown=True,
+)
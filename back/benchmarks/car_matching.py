@@ -0,0 +1,140 @@
+"""
+Бенчмарк подбора машин под заявку: индекс в памяти (app/services/car_match_index.py)
+против прежнего SQL-запроса по cars.
+
+Запуск из каталога back/:
+    python -m benchmarks.car_matching                  # только индекс, 100k машин
+    python -m benchmarks.car_matching --sql            # + SQL (временная таблица в БД из .env)
+    python -m benchmarks.car_matching --cars 300000 --queries 5000
+
+Синтетический парк: 20 городов (Алматы и Астана — половина машин), 12 категорий,
+60 марок по 15 моделей, 40k владельцев. Заявки — город + случайные категория/марка/модель.
+SQL-часть создаёт TEMP-таблицу с теми же индексами, что у cars, и реальные таблицы не трогает.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.services.car_match_index import CarMatchIndex, IndexedCar
+
+CITIES = 20
+CATEGORIES = 12
+MARKS = 60
+MODELS_PER_MARK = 15
+OWNERS = 40_000
+
+
+def synthetic_cars(count: int, seed: int = 1) -> dict[int, IndexedCar]:
+    rnd = random.Random(seed)
+    cars = {}
+    for car_id in range(1, count + 1):
+        city = 1 if rnd.random() < 0.3 else 2 if rnd.random() < 0.3 else rnd.randint(3, CITIES)
+        mark = rnd.randint(1, MARKS)
+        cars[car_id] = IndexedCar(
+            city_id=city,
+            category_id=100 + rnd.randint(1, CATEGORIES),
+            vehicle_mark_id=1000 + mark,
+            vehicle_model_id=10_000 + mark * MODELS_PER_MARK + rnd.randint(0, MODELS_PER_MARK - 1),
+            author_id=rnd.randint(1, OWNERS),
+        )
+    return cars
+
+
+def synthetic_applications(count: int, seed: int = 2) -> list[tuple]:
+    rnd = random.Random(seed)
+    apps = []
+    for _ in range(count):
+        city = rnd.choice([1, 1, 2, rnd.randint(3, CITIES)])
+        category = 100 + rnd.randint(1, CATEGORIES) if rnd.random() < 0.7 else None
+        mark = rnd.randint(1, MARKS) if rnd.random() < 0.5 else None
+        model = 10_000 + mark * MODELS_PER_MARK + rnd.randint(0, MODELS_PER_MARK - 1) if mark and rnd.random() < 0.5 else None
+        apps.append((city, category, 1000 + mark if mark else None, model, rnd.randint(1, OWNERS)))
+    return apps
+
+
+def report(name: str, timings: list[float], matched: int) -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(
+        f"{name:<8} mean {statistics.mean(timings) * 1e6:10.1f} us   median {statistics.median(timings) * 1e6:10.1f} us"
+        f"   p99 {p99 * 1e6:10.1f} us   matched cars total {matched}"
+    )
+
+
+def bench_index(cars: dict[int, IndexedCar], apps: list[tuple]) -> list[list[int]]:
+    started = time.perf_counter()
+    index = CarMatchIndex()
+    index.replace_all(cars, version=0)
+    print(f"index build: {time.perf_counter() - started:.2f} s for {len(cars)} cars")
+
+    results, timings = [], []
+    for city, category, mark, model, author in apps:
+        t = time.perf_counter()
+        car_ids, owners = index.match(city, category, mark, model, exclude_author_id=author)
+        timings.append(time.perf_counter() - t)
+        results.append(car_ids)
+    report("index", timings, sum(map(len, results)))
+    return results
+
+
+def bench_sql(cars: dict[int, IndexedCar], apps: list[tuple]) -> list[list[int]]:
+    from sqlalchemy import text
+
+    from app.db.session import engine
+
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE TEMP TABLE bench_cars (id int PRIMARY KEY, city_id int, category_id int, "
+            "vehicle_mark_id int, vehicle_model_id int, author_id int, status varchar(20), "
+            "delete_date timestamp)"
+        ))
+        rows = [
+            {"id": car_id, **car._asdict(), "status": "ACTIVE"} for car_id, car in cars.items()
+        ]
+        for i in range(0, len(rows), 10_000):
+            conn.execute(text(
+                "INSERT INTO bench_cars (id, city_id, category_id, vehicle_mark_id, vehicle_model_id, author_id, status) "
+                "VALUES (:id, :city_id, :category_id, :vehicle_mark_id, :vehicle_model_id, :author_id, :status)"
+            ), rows[i:i + 10_000])
+        conn.execute(text("CREATE INDEX ON bench_cars (status)"))
+        conn.execute(text("ANALYZE bench_cars"))
+
+        results, timings = [], []
+        for city, category, mark, model, author in apps:
+            sql = (
+                "SELECT c.id, c.author_id FROM bench_cars c WHERE c.status = 'ACTIVE' AND c.delete_date IS NULL "
+                "AND c.city_id = :city AND c.author_id != :author"
+            )
+            params = {"city": city, "author": author}
+            for column, value in (("category_id", category), ("vehicle_mark_id", mark), ("vehicle_model_id", model)):
+                if value is not None:
+                    sql += f" AND c.{column} = :{column}"
+                    params[column] = value
+            t = time.perf_counter()
+            found = conn.execute(text(sql + " ORDER BY c.id"), params).all()
+            timings.append(time.perf_counter() - t)
+            results.append([row[0] for row in found])
+        conn.rollback()
+    report("sql", timings, sum(map(len, results)))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Подбор машин под заявку: индекс в памяти vs SQL")
+    parser.add_argument("--cars", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--sql", action="store_true", help="сравнить с SQL (нужна БД из настроек)")
+    args = parser.parse_args()
+
+    cars = synthetic_cars(args.cars)
+    apps = synthetic_applications(args.queries)
+    index_results = bench_index(cars, apps)
+    if args.sql:
+        sql_results = bench_sql(cars, apps)
+        assert index_results == sql_results, "index and SQL results differ"
+        print("results identical")
+
+
+if __name__ == "__main__":
+    main()
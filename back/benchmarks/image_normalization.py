@@ -0,0 +1,83 @@
+"""
+Бенчмарк нормализации фото (app/services/image_normalizer.py).
+
+Запуск из каталога back/:
+    python -m benchmarks.image_normalization path/to/photos
+    python -m benchmarks.image_normalization            # синтетический набор 4000x3000
+
+Печатает размер до/после по каждому файлу и время: последовательно и в пуле процессов.
+"""
+import io
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.services.image_normalizer import normalize_image
+
+MAX_DIMENSION = 2048
+QUALITY = 82
+SYNTHETIC_COUNT = 8
+
+
+def synthetic_corpus() -> list[tuple[str, bytes]]:
+    """JPEG «с телефона»: 4000x3000, шум + градиент, EXIF с поворотом."""
+    import os
+
+    from PIL import Image
+
+    corpus = []
+    for i in range(SYNTHETIC_COUNT):
+        noise = Image.frombytes("RGB", (4000, 3000), os.urandom(4000 * 3000 * 3))
+        gradient = Image.linear_gradient("L").resize((4000, 3000)).convert("RGB")
+        img = Image.blend(noise, gradient, 0.7)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=95, exif=exif)
+        corpus.append((f"synthetic_{i}.jpg", out.getvalue()))
+    return corpus
+
+
+def load_corpus(directory: Path) -> list[tuple[str, bytes]]:
+    return [
+        (p.name, p.read_bytes())
+        for p in sorted(directory.iterdir())
+        if p.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp", ".heic"}
+    ]
+
+
+def run(corpus: list[tuple[str, bytes]], output_format: str) -> None:
+    print(f"\n== {output_format}, max {MAX_DIMENSION}px, quality {QUALITY} ==")
+    started = time.perf_counter()
+    results = [normalize_image(data, MAX_DIMENSION, output_format, QUALITY) for _, data in corpus]
+    serial = time.perf_counter() - started
+
+    before = after = 0
+    for (name, data), result in zip(corpus, results):
+        size = len(result) if result else len(data)
+        before += len(data)
+        after += size
+        print(f"{name:32} {len(data) / 1024:10.0f} KB -> {size / 1024:8.0f} KB")
+    print(f"total {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB "
+          f"(saved {100 * (before - after) / before:.0f}%)")
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        pool.submit(int).result()  # прогрев
+        started = time.perf_counter()
+        list(pool.map(normalize_image, [d for _, d in corpus], [MAX_DIMENSION] * len(corpus),
+                      [output_format] * len(corpus), [QUALITY] * len(corpus)))
+        pooled = time.perf_counter() - started
+    print(f"serial {serial:.2f}s, process pool (2) {pooled:.2f}s, {len(corpus)} files")
+
+
+def main() -> None:
+    corpus = load_corpus(Path(sys.argv[1])) if len(sys.argv) > 1 else synthetic_corpus()
+    if not corpus:
+        sys.exit("No images found")
+    for output_format in ("WEBP", "JPEG"):
+        run(corpus, output_format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Регрессия N+1 в каталоге: число SQL-запросов на страницу GET /cars не должно зависеть
+от числа машин на странице.
+
+Нужна отдельная (пустая) база PostgreSQL: TEST_DATABASE_URL=postgresql://... python -m pytest
+Таблицы создаются на время модуля и удаляются в конце. Без TEST_DATABASE_URL тест пропускается.
+"""
+import itertools
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL не задан", allow_module_level=True)
+os.environ["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.session import Base, SessionLocal, engine  # noqa: E402
+from app.db.upgrades import ensure_extensions  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Car, Image, User  # noqa: E402
+from app.services.car_events import mark_cars_changed  # noqa: E402
+from app.services.response_cache import CARS, response_cache  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client():
+    ensure_extensions(engine)
+    Base.metadata.create_all(bind=engine)
+    try:
+        # Без контекстного менеджера: lifespan (фоновые задачи) не запускается
+        yield TestClient(app)
+    finally:
+        Base.metadata.drop_all(bind=engine)
+
+
+_owners = itertools.count(1)
+
+
+def _add_cars(count: int) -> None:
+    db = SessionLocal()
+    try:
+        author = User(name="Owner", phone_number=f"+7700{next(_owners):07d}")
+        db.add(author)
+        db.flush()
+        cars = [Car(name=f"Car {i}", author_id=author.id, status="ACTIVE", price_per_day=1000 + i) for i in range(count)]
+        db.add_all(cars)
+        db.flush()
+        for car in cars:
+            db.add_all(
+                Image(entity_id=car.id, entity_type="CAR", url=f"https://example.com/{car.id}/{pos}.jpg", position=pos)
+                for pos in range(2)
+            )
+        mark_cars_changed(db, [car.id for car in cars])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _count_queries(client: TestClient, params: dict) -> tuple[int, int]:
+    """(число SQL-запросов, число карточек на странице)."""
+    response_cache.invalidate(CARS)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get(f"{settings.API_V1_STR}/cars", params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    return len(statements), len(response.json()["data"]["items"])
+
+
+@pytest.mark.parametrize("params", [{"limit": 50}, {"limit": 50, "cursor": ""}])
+def test_listing_query_count_does_not_grow_with_page_size(client, params):
+    _add_cars(2)
+    _count_queries(client, params)  # прогрев кешей (справочники и т.п.)
+    small, small_items = _count_queries(client, params)
+
+    _add_cars(20)
+    large, large_items = _count_queries(client, params)
+
+    assert large_items == small_items + 20
+    assert large == small
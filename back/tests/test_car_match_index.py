@@ -0,0 +1,105 @@
+"""Индекс подбора машин (без БД): результат совпадает с простым фильтром по тем же машинам."""
+import random
+from datetime import datetime
+
+import pytest
+
+from app.services.car_match_index import CarMatchIndex, IndexedCar
+
+CITIES = [1, 2, 3]
+CATEGORIES = [None, 10, 11]
+MARKS = [None, 20, 21, 22]
+MODELS = [None, 30, 31]
+AUTHORS = [100, 101, 102, 103]
+
+
+def _random_car(rnd: random.Random) -> IndexedCar:
+    return IndexedCar(
+        city_id=rnd.choice(CITIES),
+        category_id=rnd.choice(CATEGORIES),
+        vehicle_mark_id=rnd.choice(MARKS),
+        vehicle_model_id=rnd.choice(MODELS),
+        author_id=rnd.choice(AUTHORS),
+    )
+
+
+def _expected(cars: dict[int, IndexedCar], city_id, category_id, mark_id, model_id, exclude_author_id):
+    found = sorted(
+        car_id for car_id, car in cars.items()
+        if (city_id is None or car.city_id == city_id)
+        and (category_id is None or car.category_id == category_id)
+        and (mark_id is None or car.vehicle_mark_id == mark_id)
+        and (model_id is None or car.vehicle_model_id == model_id)
+        and car.author_id != exclude_author_id
+    )
+    return found, {cars[car_id].author_id for car_id in found}
+
+
+def _assert_matches_filter(index: CarMatchIndex, cars: dict[int, IndexedCar]) -> None:
+    assert len(index) == len(cars)
+    for city_id in [None, *CITIES]:
+        for category_id in CATEGORIES:
+            for mark_id in MARKS:
+                for model_id in MODELS:
+                    for exclude in (None, AUTHORS[0]):
+                        criteria = (city_id, category_id, mark_id, model_id, exclude)
+                        assert index.match(*criteria) == _expected(cars, *criteria), criteria
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_match_equals_plain_filter_through_updates(seed):
+    rnd = random.Random(seed)
+    cars = {car_id: _random_car(rnd) for car_id in range(1, 201)}
+    index = CarMatchIndex()
+    index.replace_all(dict(cars), datetime.utcnow())
+    _assert_matches_filter(index, cars)
+
+    for step in range(20):
+        changes: dict[int, IndexedCar | None] = {}
+        for car_id in rnd.sample(sorted(cars), 10):
+            action = rnd.random()
+            if action < 0.3:
+                changes[car_id] = None  # больше не ACTIVE или удалена
+            elif action < 0.6:
+                changes[car_id] = cars[car_id]._replace(city_id=rnd.choice(CITIES))  # переезд в другой город
+            else:
+                changes[car_id] = _random_car(rnd)
+        for _ in range(5):
+            changes[max(cars) + 1 + len(changes)] = _random_car(rnd)  # новые ACTIVE-машины
+
+        index.apply(changes)
+        for car_id, car in changes.items():
+            if car is None:
+                cars.pop(car_id, None)
+            else:
+                cars[car_id] = car
+        _assert_matches_filter(index, cars)
+
+
+def test_moving_car_to_another_city():
+    index = CarMatchIndex()
+    index.replace_all({1: IndexedCar(1, None, 20, None, 100)}, datetime.utcnow())
+    index.apply({1: IndexedCar(2, None, 20, None, 100)})
+    assert index.match(1, vehicle_mark_id=20) == ([], set())
+    assert index.match(2, vehicle_mark_id=20) == ([1], {100})
+
+
+def test_removed_car_is_not_matched_and_postings_are_dropped():
+    index = CarMatchIndex()
+    index.replace_all({1: IndexedCar(1, 10, 20, 30, 100), 2: IndexedCar(1, 10, 21, None, 101)}, datetime.utcnow())
+    index.apply({1: None, 3: None})  # 3 — машины не было в индексе
+    assert index.match(1) == ([2], {101})
+    assert index.match(1, vehicle_mark_id=20) == ([], set())
+    assert ("vehicle_mark_id", 20) not in index._postings
+
+
+def test_apply_sets_synced_at_only_when_given():
+    index = CarMatchIndex()
+    assert not index.loaded
+    synced_at = datetime(2026, 1, 1)
+    index.replace_all({}, synced_at)
+    index.apply({1: IndexedCar(1, None, None, None, 100)})
+    assert index.synced_at == synced_at
+    later = datetime(2026, 1, 2)
+    index.apply({}, later)
+    assert index.synced_at == later and index.loaded
@@ -0,0 +1,76 @@
+"""Пагинация каталога: проверка параметров запроса и курсоров keyset-пагинации (без БД)."""
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.car_listing_service import InvalidCursor, decode_cursor, encode_cursor
+
+client = TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "", "limit": 0},
+        {"limit": 0},
+        {"limit": -1},
+        {"limit": 101},
+        {"skip": -1},
+    ],
+)
+def test_invalid_page_params_are_rejected(params):
+    # Ответ 422 формируется до обращения к БД и кешу ответов
+    response = client.get(f"{settings.API_V1_STR}/cars", params=params)
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "sort, value",
+    [
+        ("new", datetime(2026, 3, 1, 12, 30, 15, 123456)),
+        ("cheap", 15000),
+        ("cheap", None),  # объявления без цены идут в конце
+    ],
+)
+def test_cursor_round_trip(sort, value):
+    cursor = encode_cursor(sort, value, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, sort) == (value, 42)
+
+
+def _raw_cursor(data) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "cursor, sort",
+    [
+        ("не base64", "new"),
+        ("!!!!", "new"),
+        ("abc", "new"),  # неполный base64
+        (base64.urlsafe_b64encode(b"\xff\xfe").decode(), "new"),  # не UTF-8
+        (_raw_cursor("text"), "new"),  # JSON, но не объект
+        (_raw_cursor([1, 2]), "new"),
+        (_raw_cursor(None), "new"),
+        (_raw_cursor({"s": "new", "id": 1}), "new"),  # нет значения
+        (_raw_cursor({"s": "new", "v": "2026-01-01T00:00:00"}), "new"),  # нет id
+        (_raw_cursor({"s": "new", "v": "2026-01-01T00:00:00", "id": "1"}), "new"),
+        (_raw_cursor({"s": "new", "v": "вчера", "id": 1}), "new"),
+        (_raw_cursor({"s": "new", "v": 5, "id": 1}), "new"),
+        (_raw_cursor({"s": "cheap", "v": "100", "id": 1}), "cheap"),
+        (encode_cursor("cheap", 100, 1), "new"),  # курсор другой сортировки
+    ],
+)
+def test_malformed_cursor_raises_invalid_cursor(cursor, sort):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, sort)
+
+
+def test_malformed_cursor_is_a_client_error():
+    response = client.get(f"{settings.API_V1_STR}/cars", params={"cursor": "!!!!"})
+    assert response.status_code == 400
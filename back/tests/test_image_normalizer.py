@@ -0,0 +1,39 @@
+"""Нормализация фото: обычные изображения пережимаются, неразбираемые и «бомбы» — None."""
+import io
+
+import pytest
+from PIL import Image
+
+from app.services.image_normalizer import normalize_image, render_variant
+
+
+def _png(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_normalize_image_resizes_and_converts():
+    result = normalize_image(_png(300, 200), max_dimension=100, output_format="WEBP", quality=80)
+    with Image.open(io.BytesIO(result)) as img:
+        assert img.format == "WEBP"
+        assert img.size == (100, 67)
+
+
+def test_not_an_image_is_skipped():
+    assert normalize_image(b"not an image", 100, "WEBP", 80) is None
+    assert render_variant(b"not an image", "fill", 50, 50, 80) is None
+
+
+@pytest.mark.parametrize(
+    "size",
+    [
+        (50, 50),  # больше MAX_IMAGE_PIXELS — DecompressionBombWarning
+        (100, 100),  # больше 2 * MAX_IMAGE_PIXELS — DecompressionBombError
+    ],
+)
+def test_decompression_bomb_is_skipped(monkeypatch, size):
+    data = _png(*size)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 2000)
+    assert normalize_image(data, 100, "WEBP", 80) is None
+    assert render_variant(data, "limit", 50, 50, 80) is None
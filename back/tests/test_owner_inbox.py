@@ -0,0 +1,137 @@
+"""
+Счётчики owner_inbox при параллельных транзакциях: две транзакции, меняющие связи одной
+заявки с машинами одного владельца, не должны сбивать счётчики относительно пересчёта.
+
+Нужна отдельная (пустая) база PostgreSQL: TEST_DATABASE_URL=postgresql://... python -m pytest
+Таблицы создаются на время модуля и удаляются в конце. Без TEST_DATABASE_URL тест пропускается.
+"""
+import itertools
+import os
+import threading
+import time
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL не задан", allow_module_level=True)
+os.environ["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+
+from sqlalchemy import text  # noqa: E402
+
+import app.main  # noqa: E402,F401
+from app.db.session import Base, SessionLocal, engine  # noqa: E402
+from app.db.upgrades import ensure_extensions  # noqa: E402
+from app.models import Application, Car, Dictionary, OwnerInbox, User  # noqa: E402
+from app.services.application_links import add_application_cars  # noqa: E402
+from app.services.owner_inbox import _counts, mark_owner_inbox_read, refresh_owner_inbox  # noqa: E402
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    ensure_extensions(engine)
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield
+    finally:
+        Base.metadata.drop_all(bind=engine)
+
+
+_phones = itertools.count(1)
+
+
+def _setup() -> tuple[int, int, int, int]:
+    """(owner_id, application_id, car_id, car_id): заявка и две подходящие машины одного владельца."""
+    db = SessionLocal()
+    try:
+        city = Dictionary(code=f"city-{next(_phones)}", name="City", type="CITY")
+        owner = User(name="Owner", phone_number=f"+7701{next(_phones):07d}")
+        renter = User(name="Renter", phone_number=f"+7702{next(_phones):07d}")
+        db.add_all([city, owner, renter])
+        db.flush()
+        cars = [Car(name=f"Car {i}", author_id=owner.id, status="ACTIVE", city_id=city.id) for i in range(2)]
+        application = Application(user_id=renter.id, city_id=city.id)
+        db.add_all([*cars, application])
+        db.flush()
+        refresh_owner_inbox(db, [owner.id])
+        db.commit()
+        return owner.id, application.id, cars[0].id, cars[1].id
+    finally:
+        db.close()
+
+
+def _inbox(owner_id: int) -> tuple[tuple[int, int], tuple[int, int]]:
+    """(счётчики owner_inbox, пересчёт агрегатом)."""
+    db = SessionLocal()
+    try:
+        row = db.query(OwnerInbox.unread_count, OwnerInbox.total_count).filter(OwnerInbox.owner_id == owner_id).one()
+        recount = db.execute(_counts([owner_id])).one()
+        return tuple(row), (recount[1], recount[2])
+    finally:
+        db.close()
+
+
+def _run_blocked(func) -> threading.Thread:
+    """Запустить func(db) с commit в отдельном потоке и дождаться, пока она встанет на блокировке."""
+    def target():
+        db = SessionLocal()
+        try:
+            func(db)
+            db.commit()
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    deadline = time.monotonic() + 5
+    with engine.connect() as conn:
+        while time.monotonic() < deadline:
+            waiting = conn.execute(
+                text("SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()")
+            ).scalar()
+            if waiting:
+                return thread
+            time.sleep(0.02)
+    thread.join()
+    pytest.fail("вторая транзакция не ждала первую")
+
+
+def test_overlapping_links_count_application_once():
+    owner_id, application_id, first_car, second_car = _setup()
+
+    db = SessionLocal()
+    try:
+        add_application_cars(db, application_id, [first_car])
+        # Вторая машина того же владельца в параллельной транзакции — до commit первой
+        thread = _run_blocked(lambda other: add_application_cars(other, application_id, [second_car]))
+        db.commit()
+    finally:
+        db.close()
+    thread.join()
+
+    counters, recount = _inbox(owner_id)
+    assert recount == (1, 1)
+    assert counters == recount
+
+
+def test_mark_read_waits_for_new_unread_link():
+    owner_id, application_id, first_car, second_car = _setup()
+    db = SessionLocal()
+    try:
+        add_application_cars(db, application_id, [first_car])
+        db.commit()
+    finally:
+        db.close()
+
+    db = SessionLocal()
+    try:
+        add_application_cars(db, application_id, [second_car])
+        thread = _run_blocked(lambda other: mark_owner_inbox_read(other, owner_id, application_id))
+        db.commit()
+    finally:
+        db.close()
+    thread.join()
+
+    counters, recount = _inbox(owner_id)
+    assert recount == (0, 1)
+    assert counters == recount
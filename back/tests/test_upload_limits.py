@@ -0,0 +1,106 @@
+"""
+Потоковая проверка multipart-загрузок без сервера и базы: сигнатуры форматов и лимиты
+_MultipartLimiter при подаче тела чанками любого размера.
+"""
+import pytest
+
+from app.core.upload_limits import SNIFF_BYTES, UploadRejected, _MultipartLimiter, sniff_image_type
+
+BOUNDARY = b"----autopro"
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+ALLOWED = {"jpeg", "png", "webp", "heic"}
+
+
+@pytest.mark.parametrize("head, expected", [
+    (JPEG[:SNIFF_BYTES], "jpeg"),
+    (PNG[:SNIFF_BYTES], "png"),
+    (b"GIF89a" + b"\x00" * 10, "gif"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "webp"),
+    (b"\x00\x00\x00\x18ftypheic\x00\x00\x00\x00", "heic"),
+    (b"\x00\x00\x00\x18ftypmif1\x00\x00\x00\x00", "heic"),
+    (b"\x00\x00\x00\x18ftypisom\x00\x00\x00\x00", None),
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", None),
+    (b"%PDF-1.7\n", None),
+    (b"", None),
+])
+def test_sniff_image_type(head, expected):
+    assert sniff_image_type(head) == expected
+
+
+def _body(*parts: tuple[str, str | None, bytes]) -> bytes:
+    """multipart/form-data из (имя поля, имя файла или None, содержимое)."""
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += b"--" + BOUNDARY + b"\r\nContent-Disposition: " + disposition.encode() + b"\r\n\r\n" + content + b"\r\n"
+    return body + b"--" + BOUNDARY + b"--\r\n"
+
+
+def _feed(body: bytes, chunk_size: int, max_file_bytes: int = 1000, max_request_bytes: int = 10_000) -> None:
+    limiter = _MultipartLimiter(BOUNDARY, max_file_bytes, max_request_bytes, ALLOWED)
+    for i in range(0, len(body), chunk_size):
+        limiter.feed(body[i:i + chunk_size])
+
+
+def _rejected(body: bytes, chunk_size: int, **limits) -> tuple[int, str]:
+    with pytest.raises(UploadRejected) as exc:
+        _feed(body, chunk_size, **limits)
+    return exc.value.status_code, exc.value.message_key
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_allowed_files_and_fields_pass(chunk_size):
+    body = _body(
+        ("title", None, b"not an image at all, but a plain form field"),
+        ("files", "a.jpg", JPEG),
+        ("files", "b.png", PNG),
+        # Пустое поле файла браузер присылает с filename=""
+        ("files", "", b""),
+    )
+    _feed(body, chunk_size)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_unsupported_type_is_rejected(chunk_size):
+    body = _body(("files", "a.jpg", JPEG), ("files", "doc.pdf", b"%PDF-1.7\n" + b"x" * 100))
+    assert _rejected(body, chunk_size) == (415, "unsupported_image_type")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4096])
+def test_short_unsupported_file_is_rejected_at_part_end(chunk_size):
+    # Файл короче SNIFF_BYTES проверяется по концу части
+    body = _body(("files", "x.txt", b"hello"))
+    assert _rejected(body, chunk_size) == (415, "unsupported_image_type")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4096])
+def test_gif_is_not_allowed_by_default_types(chunk_size):
+    body = _body(("files", "a.gif", b"GIF89a" + b"\x00" * 40))
+    assert _rejected(body, chunk_size) == (415, "unsupported_image_type")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_file_limit(chunk_size):
+    _feed(_body(("files", "a.jpg", JPEG[:20] + b"\x00" * 80)), chunk_size, max_file_bytes=100)
+    body = _body(("files", "a.jpg", JPEG[:20] + b"\x00" * 81))
+    assert _rejected(body, chunk_size, max_file_bytes=100) == (413, "file_too_large")
+
+
+def test_file_limit_applies_to_each_file_separately():
+    body = _body(*[("files", f"{i}.jpg", JPEG[:20] + b"\x00" * 80) for i in range(5)])
+    _feed(body, 4096, max_file_bytes=100)
+
+
+def test_form_fields_do_not_count_towards_file_limit():
+    body = _body(("description", None, b"x" * 500), ("files", "a.jpg", JPEG))
+    _feed(body, 4096, max_file_bytes=100)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_request_limit(chunk_size):
+    body = _body(("files", "a.jpg", JPEG), ("files", "b.png", PNG))
+    _feed(body, chunk_size, max_request_bytes=len(body))
+    assert _rejected(body, chunk_size, max_request_bytes=len(body) - 1) == (413, "request_too_large")